@@ -12,7 +12,7 @@ from sqlalchemy.dialects.postgresql import TSVECTOR
 
 # revision identifiers, used by Alembic.
 revision = '0002'
-down_revision = '0001'
+down_revision = '0001_init'
 branch_labels = None
 depends_on = None
 
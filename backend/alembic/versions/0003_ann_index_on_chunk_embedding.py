@@ -0,0 +1,51 @@
+"""ann index on chunks.embedding
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.config import settings
+from app.db.vector_index import INDEX_NAME, index_ddl
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    # 0001 created embedding as JSON; ANN indexes need the native pgvector type.
+    data_type = bind.execute(
+        sa.text(
+            "SELECT data_type FROM information_schema.columns "
+            "WHERE table_name = 'chunks' AND column_name = 'embedding'"
+        )
+    ).scalar()
+    if data_type and data_type.lower() in {"json", "jsonb"}:
+        op.execute(
+            f"ALTER TABLE chunks ALTER COLUMN embedding TYPE vector({int(settings.VECTOR_DIMENSION)}) "
+            "USING embedding::text::vector"
+        )
+
+    # Build without holding a write lock on chunks so ingestion keeps running.
+    method = getattr(settings, "ann_index_method", "hnsw") or "hnsw"
+    with op.get_context().autocommit_block():
+        op.execute(index_ddl(method, concurrently=True))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    with op.get_context().autocommit_block():
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}")
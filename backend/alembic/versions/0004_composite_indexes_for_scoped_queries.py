@@ -0,0 +1,49 @@
+"""composite indexes for tenant/kb scoped queries
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+# Mirrors the __table_args__ on the models; each index matches a query shape in routes.py / rag.py.
+INDEXES = [
+    ("ix_knowledge_bases_tenant_created", "knowledge_bases", "(tenant_id, created_at)", None),
+    ("ix_documents_kb_tenant_created", "documents", "(kb_id, tenant_id, created_at)", None),
+    ("ix_documents_tenant_created", "documents", "(tenant_id, created_at)", None),
+    (
+        "ix_documents_idempotency_key",
+        "documents",
+        "(tenant_id, kb_id, (metadata ->> 'idempotency_key'))",
+        "(metadata ->> 'idempotency_key') IS NOT NULL",
+    ),
+    ("ix_chunks_kb_tenant", "chunks", "(kb_id, tenant_id)", None),
+    ("ix_chunks_document_tenant_created", "chunks", "(document_id, tenant_id, created_at)", None),
+]
+
+
+def upgrade():
+    postgres = op.get_bind().dialect.name == "postgresql"
+    concurrently = "CONCURRENTLY " if postgres else ""
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            if where and not postgres:
+                continue
+            predicate = f" WHERE {where}" if where else ""
+            op.execute(f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {table} {columns}{predicate}")
+
+
+def downgrade():
+    postgres = op.get_bind().dialect.name == "postgresql"
+    concurrently = "CONCURRENTLY " if postgres else ""
+    with op.get_context().autocommit_block():
+        for name, _table, _columns, _where in reversed(INDEXES):
+            op.execute(f"DROP INDEX {concurrently}IF EXISTS {name}")
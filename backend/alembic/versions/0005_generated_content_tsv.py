@@ -0,0 +1,54 @@
+"""derive chunks.content_tsv as a generated column
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-16 11:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+TSVECTOR_EXPRESSION = "to_tsvector('english'::regconfig, content)"
+
+
+def upgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    # The plpgsql trigger from 0002 fired once per inserted row; a stored generated column is
+    # computed in the executor instead, which keeps COPY-based chunk loads cheap.
+    op.execute("DROP TRIGGER IF EXISTS tsvector_update_before_insert_or_update ON chunks")
+    op.execute("DROP FUNCTION IF EXISTS content_tsv_update_trigger()")
+    op.execute("DROP INDEX IF EXISTS ix_chunks_content_tsv")
+    op.execute("ALTER TABLE chunks DROP COLUMN IF EXISTS content_tsv")
+    op.execute(f"ALTER TABLE chunks ADD COLUMN content_tsv tsvector GENERATED ALWAYS AS ({TSVECTOR_EXPRESSION}) STORED")
+    op.execute("CREATE INDEX ix_chunks_content_tsv ON chunks USING gin (content_tsv)")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("DROP INDEX IF EXISTS ix_chunks_content_tsv")
+    op.execute("ALTER TABLE chunks DROP COLUMN content_tsv")
+    op.execute("ALTER TABLE chunks ADD COLUMN content_tsv tsvector")
+    op.execute(f"UPDATE chunks SET content_tsv = {TSVECTOR_EXPRESSION}")
+    op.execute("CREATE INDEX ix_chunks_content_tsv ON chunks USING gin (content_tsv)")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION content_tsv_update_trigger()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            NEW.content_tsv := to_tsvector('english', NEW.content);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER tsvector_update_before_insert_or_update
+        BEFORE INSERT OR UPDATE ON chunks
+        FOR EACH ROW EXECUTE PROCEDURE content_tsv_update_trigger();
+    """)
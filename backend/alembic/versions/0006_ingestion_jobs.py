@@ -0,0 +1,47 @@
+"""ingestion job queue
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Id columns match the String(36) keys created in 0001 so the document FK is valid.
+    uuid_type = sa.String(length=36)
+    op.create_table(
+        "ingestion_jobs",
+        sa.Column("id", uuid_type, primary_key=True),
+        sa.Column("tenant_id", uuid_type, nullable=False),
+        sa.Column("kb_id", uuid_type, nullable=False),
+        sa.Column("document_id", uuid_type, sa.ForeignKey("documents.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("kind", sa.String(length=20), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=True),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("max_attempts", sa.Integer(), nullable=False),
+        sa.Column("run_after", sa.DateTime(), nullable=False),
+        sa.Column("lease_owner", sa.String(length=255), nullable=True),
+        sa.Column("lease_expires_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_ingestion_jobs_status_run_after", "ingestion_jobs", ["status", "run_after"])
+    op.create_index("ix_ingestion_jobs_document_id", "ingestion_jobs", ["document_id"])
+
+
+def downgrade():
+    op.drop_index("ix_ingestion_jobs_document_id", table_name="ingestion_jobs")
+    op.drop_index("ix_ingestion_jobs_status_run_after", table_name="ingestion_jobs")
+    op.drop_table("ingestion_jobs")
@@ -0,0 +1,49 @@
+"""content hashes on documents and chunks
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-16 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.db import partitioning
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+# Mirrors the __table_args__ on the models.
+DOCUMENT_INDEX = "ix_documents_kb_tenant_content_hash"
+CHUNK_INDEX = "ix_chunks_kb_content_hash"
+
+
+def upgrade():
+    # Nullable, so existing rows need no rewrite; they are hashed on their next ingestion.
+    op.add_column("documents", sa.Column("content_hash", sa.String(length=64), nullable=True))
+    op.add_column("chunks", sa.Column("content_hash", sa.String(length=64), nullable=True))
+
+    bind = op.get_bind()
+    postgres = bind.dialect.name == "postgresql"
+    concurrently = "CONCURRENTLY " if postgres else ""
+    with op.get_context().autocommit_block():
+        op.execute(
+            f"CREATE INDEX {concurrently}IF NOT EXISTS {DOCUMENT_INDEX} ON documents (kb_id, tenant_id, content_hash)"
+            + (" WHERE content_hash IS NOT NULL" if postgres else "")
+        )
+        chunk_ddl = f"CREATE INDEX {concurrently}IF NOT EXISTS {CHUNK_INDEX} ON chunks (kb_id, content_hash)"
+        if postgres and partitioning.is_partitioned(bind):
+            partitioning.create_partitioned_index(bind, chunk_ddl, CHUNK_INDEX)
+        else:
+            op.execute(chunk_ddl)
+
+
+def downgrade():
+    op.execute(f"DROP INDEX IF EXISTS {CHUNK_INDEX}")
+    op.execute(f"DROP INDEX IF EXISTS {DOCUMENT_INDEX}")
+    op.drop_column("chunks", "content_hash")
+    op.drop_column("documents", "content_hash")
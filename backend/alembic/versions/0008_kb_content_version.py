@@ -0,0 +1,28 @@
+"""knowledge base content version
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A constant server default lets Postgres add the column without rewriting the table.
+    op.add_column(
+        "knowledge_bases",
+        sa.Column("content_version", sa.Integer(), nullable=False, server_default=sa.text("0")),
+    )
+
+
+def downgrade():
+    op.drop_column("knowledge_bases", "content_version")
@@ -0,0 +1,35 @@
+"""shared retrieval cache table
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-16 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # UNLOGGED: cache writes skip the WAL; the table is emptied after a crash, which only costs hits.
+    op.create_table(
+        "retrieval_cache",
+        sa.Column("key", sa.String(length=64), primary_key=True),
+        sa.Column("kb_id", sa.String(length=36), nullable=False),
+        sa.Column("content_version", sa.Integer(), nullable=False),
+        sa.Column("sources", sa.JSON(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        prefixes=["UNLOGGED"],
+    )
+    op.create_index("ix_retrieval_cache_expires_at", "retrieval_cache", ["expires_at"])
+
+
+def downgrade():
+    op.drop_index("ix_retrieval_cache_expires_at", table_name="retrieval_cache")
+    op.drop_table("retrieval_cache")
@@ -0,0 +1,30 @@
+"""shared rate limit table
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-16 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # UNLOGGED: one write per limited request; after a crash buckets simply start full again.
+    op.create_table(
+        "rate_limits",
+        sa.Column("key", sa.String(length=255), primary_key=True),
+        sa.Column("tat", sa.Float(), nullable=False),
+        prefixes=["UNLOGGED"],
+    )
+
+
+def downgrade():
+    op.drop_table("rate_limits")
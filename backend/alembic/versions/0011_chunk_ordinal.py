@@ -0,0 +1,46 @@
+"""chunk ordinal
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-16 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.db import partitioning
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+# Mirrors the __table_args__ on the models.
+NEW_INDEX = "ix_chunks_document_tenant_ordinal"
+OLD_INDEX = "ix_chunks_document_tenant_created"
+
+
+def upgrade():
+    # A constant server default lets Postgres add the column without rewriting the table. Existing
+    # rows all read 0 until their next ingestion; listings break ties on created_at, which is the
+    # order they were written in.
+    op.add_column("chunks", sa.Column("ordinal", sa.Integer(), nullable=False, server_default=sa.text("0")))
+
+    bind = op.get_bind()
+    postgres = bind.dialect.name == "postgresql"
+    concurrently = "CONCURRENTLY " if postgres else ""
+    with op.get_context().autocommit_block():
+        ddl = f"CREATE INDEX {concurrently}IF NOT EXISTS {NEW_INDEX} ON chunks (document_id, tenant_id, ordinal)"
+        if postgres and partitioning.is_partitioned(bind):
+            partitioning.create_partitioned_index(bind, ddl, NEW_INDEX)
+        else:
+            op.execute(ddl)
+        op.execute(f"DROP INDEX IF EXISTS {OLD_INDEX}")
+
+
+def downgrade():
+    op.execute(f"CREATE INDEX IF NOT EXISTS {OLD_INDEX} ON chunks (document_id, tenant_id, created_at)")
+    op.execute(f"DROP INDEX IF EXISTS {NEW_INDEX}")
+    op.drop_column("chunks", "ordinal")
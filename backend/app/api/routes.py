@@ -1,19 +1,28 @@
+import hashlib
 import json
+import os
 import time
 import uuid
 from datetime import datetime, timedelta
-from typing import Any
+from pathlib import Path
+from typing import Any, AsyncIterator
 
-from fastapi import APIRouter, Depends, File, Form, UploadFile, status, BackgroundTasks
-from fastapi.responses import PlainTextResponse
+from fastapi import APIRouter, Depends, File, Form, Request, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from jose import jwt
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
+from app import tracing
 from app.api.deps import get_db
+from app.auth.cache import get_kb_cache, get_tenant_cache
 from app.auth.deps import get_current_tenant
 from app.core.config import settings
-from app.core.exceptions import NotFoundError, ValidationError
+from app.core.exceptions import NotFoundError, PayloadTooLargeError, ValidationError
+from app.core.executors import executor_stats, run_db
+from app.db.partitioning import ensure_partition
+from app.db.session import SessionLocal
 from app.models.entities import Chunk, Document, KnowledgeBase, Tenant
 from app.observability import metrics
 from app.schemas.models import (
@@ -27,12 +36,15 @@ from app.schemas.models import (
     TokenRequest,
     TokenResponse,
 )
-from app.services.ingestion import IngestionPipeline
+from app.services import job_queue
+from app.services.answer_cache import get_answer_cache
+from app.services.embeddings import EmbeddingService
+from app.services.model_registry import model_registry
 from app.services.rag import RAGService
+from app.services.rerank import RerankingService
 
 router = APIRouter()
 
-
 @router.get("/healthz", tags=["health"])
 async def healthcheck() -> dict[str, str]:
     return {"status": "ok"}
@@ -44,12 +56,23 @@ async def liveness() -> dict[str, str]:
 
 
 @router.get("/health/ready", tags=["health"])
-async def readiness(db: Session = Depends(get_db)) -> dict[str, str]:
+async def readiness(db: Session = Depends(get_db)) -> JSONResponse:
     # DB connectivity
-    db.execute(text("SELECT 1"))
-    # Embedding availability
-    _ = EmbeddingService().model
-    return {"status": "ready"}
+    await run_db(db.execute, text("SELECT 1"))
+    # Models warm up in the background after startup; report their state without waiting or loading.
+    models = {"embedding": EmbeddingService().model_state(), "reranker": RerankingService().model_state()}
+    ready = not getattr(settings, "model_warmup", True) or all(state == "ready" for state in models.values())
+    return JSONResponse({"status": "ready" if ready else "not_ready", "models": models}, status_code=200 if ready else 503)
+
+
+@router.get("/health/models", tags=["health"])
+async def model_status() -> list[dict[str, object]]:
+    return model_registry.stats()
+
+
+@router.get("/health/ingestion", tags=["health"])
+async def ingestion_queue_status(db: Session = Depends(get_db)) -> dict[str, Any]:
+    return await run_db(job_queue.queue_stats, db)
 
 
 @router.get("/errors/recent", tags=["health"])
@@ -57,15 +80,34 @@ async def recent_errors() -> list[dict[str, object]]:
     return metrics.recent_errors()
 
 
+@router.get("/traces/recent", tags=["health"])
+async def recent_traces(limit: int = 20) -> list[list[dict[str, object]]]:
+    """Most recent traces, newest first, when `tracing_exporter = "memory"`."""
+    exporter = tracing.get_exporter()
+    if not isinstance(exporter, tracing.InMemoryExporter):
+        return []
+    return exporter.recent(limit)
+
+
 @router.get("/metrics/summary", tags=["health"])
 async def metrics_summary() -> dict[str, object]:
-    return metrics.snapshot()
+    answer_cache = get_answer_cache()
+    return {
+        **metrics.snapshot(),
+        "executors": executor_stats(),
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+    }
 
 
 @router.get("/metrics", response_class=PlainTextResponse, tags=["health"])
 async def metrics_endpoint() -> PlainTextResponse:
-    from prometheus_client import generate_latest
+    from prometheus_client import CollectorRegistry, generate_latest, multiprocess
 
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # Worker pools: combine the per-process files prometheus_client writes in this mode.
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return PlainTextResponse(generate_latest(registry), media_type="text/plain; version=0.0.4; charset=utf-8")
     return PlainTextResponse(generate_latest(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
@@ -74,7 +116,7 @@ async def issue_token(
     payload: TokenRequest,
     db: Session = Depends(get_db),
 ) -> TokenResponse:
-    tenant = _get_or_create_tenant_by_name(db, payload.tenant_name)
+    tenant = await run_db(_get_or_create_tenant_by_name, db, payload.tenant_name)
     expires_at = datetime.utcnow() + timedelta(hours=24)
     token = jwt.encode(
         {"tenant_id": str(tenant.id), "tenant_name": tenant.name, "exp": expires_at},
@@ -84,21 +126,41 @@ async def issue_token(
     return TokenResponse(token=token, tenant_id=tenant.id, tenant_name=tenant.name, expires_at=expires_at)
 
 
-def _get_or_create_tenant(db: Session, tenant_id: str) -> Tenant:
+def _ensure_tenant(db: Session, tenant_id: str) -> uuid.UUID:
+    """The tenant's id, creating the row on first use; known tenants need no query."""
     try:
         tenant_uuid = uuid.UUID(tenant_id)
     except ValueError:
         raise ValidationError(detail="tenant_id is not a valid UUID")
 
-    tenant = db.get(Tenant, tenant_uuid)
-    if tenant:
-        return tenant
+    tenant_cache = get_tenant_cache()
+    if tenant_cache is not None and tenant_cache.get(tenant_uuid):
+        return tenant_uuid
 
-    tenant = Tenant(id=tenant_uuid, name=f"tenant-{tenant_id}")
-    db.add(tenant)
-    db.commit()
-    db.refresh(tenant)
-    return tenant
+    if db.get(Tenant, tenant_uuid) is None:
+        db.add(Tenant(id=tenant_uuid, name=f"tenant-{tenant_id}"))
+        db.commit()
+    if tenant_cache is not None:
+        tenant_cache.put(tenant_uuid, True)
+    return tenant_uuid
+
+
+def _authorize_kb(db: Session, tenant_id: str, kb_uuid: uuid.UUID) -> tuple[uuid.UUID, int]:
+    """Tenant id and the KB's content_version, or NotFoundError if the tenant does not own it."""
+    tenant_uuid = _ensure_tenant(db, tenant_id)
+    kb_cache = get_kb_cache()
+    kb_version = kb_cache.get((tenant_uuid, kb_uuid)) if kb_cache is not None else None
+    if kb_version is None:
+        kb_version = (
+            db.query(KnowledgeBase.content_version)
+            .filter(KnowledgeBase.id == kb_uuid, KnowledgeBase.tenant_id == tenant_uuid)
+            .scalar()
+        )
+        if kb_version is None:
+            raise NotFoundError(detail="Knowledge base not found for tenant")
+        if kb_cache is not None:
+            kb_cache.put((tenant_uuid, kb_uuid), kb_version)
+    return tenant_uuid, kb_version
 
 
 def _get_or_create_tenant_by_name(db: Session, tenant_name: str) -> Tenant:
@@ -123,11 +185,17 @@ async def create_kb(
     db: Session = Depends(get_db),
     tenant_id: str = Depends(get_current_tenant),
 ) -> KnowledgeBaseRead:
-    tenant = _get_or_create_tenant(db, tenant_id)
-    kb = KnowledgeBase(tenant_id=tenant.id, name=payload.name, description=payload.description)
-    db.add(kb)
-    db.commit()
-    db.refresh(kb)
+    def _create() -> KnowledgeBase:
+        tenant_uuid = _ensure_tenant(db, tenant_id)
+        kb = KnowledgeBase(tenant_id=tenant_uuid, name=payload.name, description=payload.description)
+        db.add(kb)
+        db.flush()
+        ensure_partition(db, tenant_uuid, kb.id)
+        db.commit()
+        db.refresh(kb)
+        return kb
+
+    kb = await run_db(_create)
     metrics.inc("kb_created")
     return kb
 
@@ -137,9 +205,11 @@ async def list_kb(
     db: Session = Depends(get_db),
     tenant_id: str = Depends(get_current_tenant),
 ) -> list[KnowledgeBaseRead]:
-    tenant = _get_or_create_tenant(db, tenant_id)
-    results = db.query(KnowledgeBase).filter(KnowledgeBase.tenant_id == tenant.id).order_by(KnowledgeBase.created_at.desc()).all()
-    return results
+    def _list() -> list[KnowledgeBase]:
+        tenant_uuid = _ensure_tenant(db, tenant_id)
+        return db.query(KnowledgeBase).filter(KnowledgeBase.tenant_id == tenant_uuid).order_by(KnowledgeBase.created_at.desc()).all()
+
+    return await run_db(_list)
 
 
 @router.delete("/kb/{kb_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["knowledge_bases"])
@@ -148,18 +218,27 @@ async def delete_kb(
     db: Session = Depends(get_db),
     tenant_id: str = Depends(get_current_tenant),
 ) -> None:
-    tenant = _get_or_create_tenant(db, tenant_id)
     try:
         kb_uuid = uuid.UUID(kb_id)
     except ValueError:
         raise ValidationError(detail="kb_id is not a valid UUID")
 
-    kb = db.query(KnowledgeBase).filter(KnowledgeBase.id == kb_uuid, KnowledgeBase.tenant_id == tenant.id).first()
-    if not kb:
-        raise NotFoundError(detail="Knowledge base not found for tenant")
-
-    db.delete(kb)
-    db.commit()
+    def _delete() -> uuid.UUID:
+        tenant_uuid = _ensure_tenant(db, tenant_id)
+        kb = db.query(KnowledgeBase).filter(KnowledgeBase.id == kb_uuid, KnowledgeBase.tenant_id == tenant_uuid).first()
+        if not kb:
+            raise NotFoundError(detail="Knowledge base not found for tenant")
+        db.delete(kb)
+        db.commit()
+        return tenant_uuid
+
+    tenant_uuid = await run_db(_delete)
+    kb_cache = get_kb_cache()
+    if kb_cache is not None:
+        kb_cache.pop((tenant_uuid, kb_uuid))
+    answer_cache = get_answer_cache()
+    if answer_cache is not None:
+        answer_cache.invalidate(tenant_uuid, kb_uuid)
     metrics.inc("kb_deleted")
 
 
@@ -179,7 +258,7 @@ def _parse_metadata(metadata_json: str | None) -> dict[str, Any] | None:
 
 @router.post("/ingest", response_model=DocumentRead, tags=["ingestion"])
 async def ingest_document(
-    background_tasks: BackgroundTasks,
+    request: Request,
     file: UploadFile = File(...),
     kb_id: str = Form(...),
     metadata: str | None = Form(None),
@@ -187,7 +266,6 @@ async def ingest_document(
     db: Session = Depends(get_db),
     tenant_id: str = Depends(get_current_tenant),
 ) -> DocumentRead:
-    tenant = _get_or_create_tenant(db, tenant_id)
     metadata_dict = _parse_metadata(metadata)
 
     try:
@@ -195,80 +273,119 @@ async def ingest_document(
     except ValueError:
         raise ValidationError(detail="kb_id is not a valid UUID")
 
-    kb = db.query(KnowledgeBase).filter(KnowledgeBase.id == kb_uuid, KnowledgeBase.tenant_id == tenant.id).first()
-    if not kb:
-        raise NotFoundError(detail="Knowledge base not found for tenant")
-
-    # Idempotency: if key provided, reuse or retry the same document for this tenant/kb.
-    document: Document
-    if idempotency_key:
-        existing = (
-            db.query(Document)
-            .filter(
-                Document.tenant_id == tenant.id,
-                Document.kb_id == kb.id,
-                Document.doc_metadata["idempotency_key"].astext == idempotency_key,  # type: ignore[index]
+    max_bytes = job_queue.max_upload_bytes()
+    declared = request.headers.get("content-length")
+    if max_bytes and declared and declared.isdigit() and int(declared) > max_bytes + job_queue.MULTIPART_OVERHEAD_BYTES:
+        raise PayloadTooLargeError(detail=f"Upload exceeds the {max_bytes} byte limit")
+
+    # Workers run in other processes, so the upload is handed over through the spool directory.
+    # Spooling first means an oversized upload is rejected before any document row exists.
+    digest = hashlib.sha256()
+    spooled = await run_in_threadpool(job_queue.spool_upload, file.file, Path(file.filename or "").suffix, max_bytes, digest)
+    content_hash = digest.hexdigest()
+
+    def _prepare_document() -> tuple[Document, bool]:
+        tenant_uuid = _ensure_tenant(db, tenant_id)
+        kb = db.query(KnowledgeBase).filter(KnowledgeBase.id == kb_uuid, KnowledgeBase.tenant_id == tenant_uuid).first()
+        if not kb:
+            raise NotFoundError(detail="Knowledge base not found for tenant")
+
+        # An identical upload already indexed in this KB is returned as is; nothing is re-processed.
+        if getattr(settings, "ingest_dedup_uploads", True):
+            duplicate = (
+                db.query(Document)
+                .filter(
+                    Document.kb_id == kb.id,
+                    Document.tenant_id == tenant_uuid,
+                    Document.content_hash == content_hash,
+                    Document.status == "READY",
+                )
+                .order_by(Document.created_at.desc())
+                .first()
             )
-            .order_by(Document.created_at.desc())
-            .first()
-        )
-        if existing and existing.status == "READY":
-            return existing
-        if existing:
-            document = existing
-            document.filename = file.filename
-            document.status = "PROCESSING"
-            document.doc_metadata = (document.doc_metadata or {}) | {"idempotency_key": idempotency_key}
+            if duplicate:
+                return duplicate, True
+
+        # Idempotency: if key provided, reuse or retry the same document for this tenant/kb.
+        document: Document
+        if idempotency_key:
+            existing = (
+                db.query(Document)
+                .filter(
+                    Document.tenant_id == tenant_uuid,
+                    Document.kb_id == kb.id,
+                    Document.doc_metadata["idempotency_key"].astext == idempotency_key,  # type: ignore[index]
+                )
+                .order_by(Document.created_at.desc())
+                .first()
+            )
+            if existing and existing.status == "READY":
+                return existing, True
+            if existing:
+                document = existing
+                document.filename = file.filename
+                document.status = "PROCESSING"
+                document.doc_metadata = (document.doc_metadata or {}) | {"idempotency_key": idempotency_key}
+            else:
+                merged_meta = (metadata_dict or {}) | {"idempotency_key": idempotency_key, "ingestion_attempts": 0}
+                document = Document(tenant_id=tenant_uuid, kb_id=kb.id, filename=file.filename, status="PROCESSING", doc_metadata=merged_meta)
+                db.add(document)
+                db.commit()
+                db.refresh(document)
         else:
-            merged_meta = (metadata_dict or {}) | {"idempotency_key": idempotency_key, "ingestion_attempts": 0}
-            document = Document(tenant_id=tenant.id, kb_id=kb.id, filename=file.filename, status="PROCESSING", doc_metadata=merged_meta)
+            merged_meta = (metadata_dict or {}) | {"ingestion_attempts": 0}
+            document = Document(tenant_id=tenant_uuid, kb_id=kb.id, filename=file.filename, status="PROCESSING", doc_metadata=merged_meta)
             db.add(document)
             db.commit()
             db.refresh(document)
-    else:
-        merged_meta = (metadata_dict or {}) | {"ingestion_attempts": 0}
-        document = Document(tenant_id=tenant.id, kb_id=kb.id, filename=file.filename, status="PROCESSING", doc_metadata=merged_meta)
-        db.add(document)
+        return document, False
+
+    def _enqueue(document: Document) -> Document:
+        job_queue.enqueue(db, document, job_queue.KIND_FILE, {"path": str(spooled), "content_hash": content_hash})
         db.commit()
         db.refresh(document)
+        return document
 
-    ingestion = IngestionPipeline(db)
-    file_bytes = await file.read()
+    try:
+        document, already_ready = await run_db(_prepare_document)
+        if already_ready:
+            spooled.unlink(missing_ok=True)
+            return document
+        document = await run_db(_enqueue, document)
+    except BaseException:
+        spooled.unlink(missing_ok=True)
+        raise
     metrics.inc("ingest_requests")
-
-    background_tasks.add_task(ingestion.process_uploaded_file, document, file_bytes)
-
     return document
 
 
 @router.post("/ingest_url", response_model=DocumentRead, tags=["ingestion"])
 async def ingest_url(
     payload: URLIngestRequest,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     tenant_id: str = Depends(get_current_tenant),
 ) -> DocumentRead:
-    tenant = _get_or_create_tenant(db, tenant_id)
-
     try:
         kb_uuid = uuid.UUID(payload.kb_id)
     except ValueError:
         raise ValidationError(detail="kb_id is not a valid UUID")
 
-    kb = db.query(KnowledgeBase).filter(KnowledgeBase.id == kb_uuid, KnowledgeBase.tenant_id == tenant.id).first()
-    if not kb:
-        raise NotFoundError(detail="Knowledge base not found for tenant")
+    def _prepare_document() -> Document:
+        tenant_uuid = _ensure_tenant(db, tenant_id)
+        kb = db.query(KnowledgeBase).filter(KnowledgeBase.id == kb_uuid, KnowledgeBase.tenant_id == tenant_uuid).first()
+        if not kb:
+            raise NotFoundError(detail="Knowledge base not found for tenant")
 
-    document = Document(tenant_id=tenant.id, kb_id=kb.id, filename=payload.url, status="PROCESSING", doc_metadata=payload.metadata)
-    db.add(document)
-    db.commit()
-    db.refresh(document)
+        document = Document(tenant_id=tenant_uuid, kb_id=kb.id, filename=payload.url, status="PROCESSING", doc_metadata=payload.metadata)
+        db.add(document)
+        db.flush()
+        job_queue.enqueue(db, document, job_queue.KIND_URL)
+        db.commit()
+        db.refresh(document)
+        return document
 
-    ingestion = IngestionPipeline(db)
+    document = await run_db(_prepare_document)
     metrics.inc("ingest_requests")
-
-    background_tasks.add_task(ingestion.process_url, document)
-
     return document
 
 
@@ -278,15 +395,21 @@ async def list_documents(
     db: Session = Depends(get_db),
     tenant_id: str = Depends(get_current_tenant),
 ) -> list[DocumentRead]:
-    tenant = _get_or_create_tenant(db, tenant_id)
-    query = db.query(Document).filter(Document.tenant_id == tenant.id)
+    kb_uuid: uuid.UUID | None = None
     if kb_id:
         try:
             kb_uuid = uuid.UUID(kb_id)
         except ValueError:
             raise ValidationError(detail="kb_id is not a valid UUID")
-        query = query.filter(Document.kb_id == kb_uuid)
-    return query.order_by(Document.created_at.desc()).all()
+
+    def _list() -> list[Document]:
+        tenant_uuid = _ensure_tenant(db, tenant_id)
+        query = db.query(Document).filter(Document.tenant_id == tenant_uuid)
+        if kb_uuid:
+            query = query.filter(Document.kb_id == kb_uuid)
+        return query.order_by(Document.created_at.desc()).all()
+
+    return await run_db(_list)
 
 
 @router.get("/documents/{document_id}", response_model=DocumentRead, tags=["ingestion"])
@@ -295,20 +418,23 @@ async def get_document(
     db: Session = Depends(get_db),
     tenant_id: str = Depends(get_current_tenant),
 ) -> DocumentRead:
-    tenant = _get_or_create_tenant(db, tenant_id)
     try:
         doc_uuid = uuid.UUID(document_id)
     except ValueError:
         raise ValidationError(detail="document_id is not a valid UUID")
 
-    doc = (
-        db.query(Document)
-        .filter(Document.id == doc_uuid, Document.tenant_id == tenant.id)
-        .first()
-    )
-    if not doc:
-        raise NotFoundError(detail="Document not found for tenant")
-    return doc
+    def _get() -> Document:
+        tenant_uuid = _ensure_tenant(db, tenant_id)
+        doc = (
+            db.query(Document)
+            .filter(Document.id == doc_uuid, Document.tenant_id == tenant_uuid)
+            .first()
+        )
+        if not doc:
+            raise NotFoundError(detail="Document not found for tenant")
+        return doc
+
+    return await run_db(_get)
 
 
 @router.get("/documents/{document_id}/chunks", tags=["ingestion"])
@@ -317,26 +443,29 @@ async def list_document_chunks(
     db: Session = Depends(get_db),
     tenant_id: str = Depends(get_current_tenant),
 ) -> list[dict[str, str | dict | None]]:
-    tenant = _get_or_create_tenant(db, tenant_id)
     try:
         doc_uuid = uuid.UUID(document_id)
     except ValueError:
         raise ValidationError(detail="document_id is not a valid UUID")
 
-    doc = (
-        db.query(Document)
-        .filter(Document.id == doc_uuid, Document.tenant_id == tenant.id)
-        .first()
-    )
-    if not doc:
-        raise NotFoundError(detail="Document not found for tenant")
-
-    chunks = (
-        db.query(Chunk)
-        .filter(Chunk.document_id == doc_uuid, Chunk.tenant_id == tenant.id)
-        .order_by(Chunk.created_at.asc())
-        .all()
-    )
+    def _list() -> list[Chunk]:
+        tenant_uuid = _ensure_tenant(db, tenant_id)
+        doc = (
+            db.query(Document)
+            .filter(Document.id == doc_uuid, Document.tenant_id == tenant_uuid)
+            .first()
+        )
+        if not doc:
+            raise NotFoundError(detail="Document not found for tenant")
+
+        return (
+            db.query(Chunk)
+            .filter(Chunk.document_id == doc_uuid, Chunk.tenant_id == tenant_uuid)
+            .order_by(Chunk.ordinal.asc(), Chunk.created_at.asc())
+            .all()
+        )
+
+    chunks = await run_db(_list)
     return [
         {
             "id": str(ch.id),
@@ -355,37 +484,103 @@ async def rag_query(
     db: Session = Depends(get_db),
     tenant_id: str = Depends(get_current_tenant),
 ) -> RAGQueryResponse:
-    tenant = _get_or_create_tenant(db, tenant_id)
     try:
         kb_uuid = uuid.UUID(payload.kb_id)
     except ValueError:
         raise ValidationError(detail="kb_id is not a valid UUID")
 
-    kb_exists = db.query(KnowledgeBase.id).filter(KnowledgeBase.id == kb_uuid, KnowledgeBase.tenant_id == tenant.id).first()
-    if not kb_exists:
-        raise NotFoundError(detail="Knowledge base not found for tenant")
-
-    start_time = time.time()
-    request_start = start_time
-    rag_service = RAGService(db)
-    metrics.inc("rag_requests")
-    answer, sources = rag_service.answer(
-        tenant.id,
-        kb_uuid,
-        payload.query,
-        payload.top_k,
-        payload.max_tokens,
-        payload.use_rerank,
-        payload.search_type,
+    # Timings come from the request's trace; asking for them starts one even with tracing off.
+    with tracing.span("rag.query", root=payload.include_timings, kb_id=str(kb_uuid)):
+        tenant_uuid, kb_version = await run_db(_authorize_kb, db, tenant_id, kb_uuid)
+
+        start_time = time.time()
+        rag_service = RAGService(db)
+        metrics.inc("rag_requests")
+        answer, sources = await rag_service.aanswer(
+            tenant_uuid,
+            kb_uuid,
+            payload.query,
+            payload.top_k,
+            payload.max_tokens,
+            payload.use_rerank,
+            payload.search_type,
+            ef_search=payload.ef_search,
+            probes=payload.probes,
+            kb_version=kb_version,
+        )
+
+        latency_ms = int((time.time() - start_time) * 1000)
+        metrics.observe_latency("rag_total_ms", latency_ms)
+        timings = {**tracing.stage_timings(), "total": latency_ms} if payload.include_timings else None
+    return RAGQueryResponse(answer=answer, sources=sources, latency_ms=latency_ms, timings=timings)
+
+
+@router.post("/rag/query/stream", tags=["rag"])
+async def rag_query_stream(
+    payload: RAGQueryRequest,
+    db: Session = Depends(get_db),
+    tenant_id: str = Depends(get_current_tenant),
+) -> StreamingResponse:
+    """Server-sent events: one `sources` event, then `token` events as the LLM emits them, then `done`."""
+    try:
+        kb_uuid = uuid.UUID(payload.kb_id)
+    except ValueError:
+        raise ValidationError(detail="kb_id is not a valid UUID")
+
+    tenant_uuid, kb_version = await run_db(_authorize_kb, db, tenant_id, kb_uuid)
+    metrics.inc("rag_stream_requests")
+
+    async def _events() -> AsyncIterator[str]:
+        # The request's session is closed once the handler returns, before the body is sent.
+        stream_db = SessionLocal()
+        rag_service = RAGService(stream_db)
+        start_time = time.time()
+        first_token_ms: int | None = None
+        try:
+            async for event, data in rag_service.astream_answer(
+                tenant_uuid,
+                kb_uuid,
+                payload.query,
+                payload.top_k,
+                payload.max_tokens,
+                payload.use_rerank,
+                payload.search_type,
+                ef_search=payload.ef_search,
+                probes=payload.probes,
+                kb_version=kb_version,
+            ):
+                if event == "sources":
+                    body = [source.dict(by_alias=True) for source in data]
+                else:
+                    if first_token_ms is None:
+                        first_token_ms = int((time.time() - start_time) * 1000)
+                        metrics.observe_latency("rag_first_token_ms", first_token_ms)
+                    body = {"text": data}
+                yield _sse(event, body)
+        except Exception as exc:  # noqa: BLE001 - headers are already sent, report in-band
+            metrics.inc("rag_stream_errors")
+            yield _sse("error", {"detail": str(exc)})
+            return
+        finally:
+            # Not via run_db: after a client disconnect the await would be cancelled and leak the connection.
+            stream_db.close()
+        latency_ms = int((time.time() - start_time) * 1000)
+        metrics.observe_latency("rag_total_ms", latency_ms)
+        yield _sse("done", {"latency_ms": latency_ms, "first_token_ms": first_token_ms})
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    latency_ms = int((time.time() - start_time) * 1000)
-    metrics.observe_latency("rag_total_ms", latency_ms)
-    return RAGQueryResponse(answer=answer, sources=sources, latency_ms=latency_ms)
+
+def _sse(event: str, data: object) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 
 @router.get("/settings", tags=["debug"])
-async def read_settings() -> dict[str, str | int]:
+async def read_settings() -> dict[str, Any]:
     return {
         "app_name": settings.APP_NAME,
         "environment": settings.ENVIRONMENT,
@@ -0,0 +1,92 @@
+"""Per-process caches for resolving who a request is and what it may access.
+
+- Verified tokens: SHA-256 of the bearer token -> tenant_id, until the token's ``exp`` or
+  ``auth_token_cache_ttl_seconds``, whichever comes first. Saves the signature check.
+- Tenants: tenant ids known to exist, so authenticated routes skip the lookup (and the
+  get-or-create commit) for ``auth_tenant_cache_ttl_seconds``. Tenants are never deleted.
+- Knowledge bases: (tenant, KB) -> ``content_version`` for ``auth_kb_cache_ttl_seconds``,
+  dropped when the KB is deleted through this process. Another process' deletion, or an
+  ingestion bumping the version, is seen once the entry expires; keep the TTL short.
+
+All three are LRUs bounded by ``auth_cache_max_entries``; ``auth_cache_enabled = false`` or a
+TTL of 0 turns a cache off.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, Optional, TypeVar
+
+from app.core.config import settings
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: K, value: V, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_caches: dict[str, Optional[TTLCache]] = {}
+_caches_lock = threading.Lock()
+
+
+def _get(name: str, default_ttl: float) -> Optional[TTLCache]:
+    if name not in _caches:
+        with _caches_lock:
+            if name not in _caches:
+                ttl = float(getattr(settings, f"auth_{name}_cache_ttl_seconds", default_ttl))
+                enabled = getattr(settings, "auth_cache_enabled", True) and ttl > 0
+                _caches[name] = TTLCache(int(getattr(settings, "auth_cache_max_entries", 10000)), ttl) if enabled else None
+    return _caches[name]
+
+
+def get_token_cache() -> Optional[TTLCache]:
+    """token digest -> tenant_id, or None when disabled."""
+    return _get("token", 300)
+
+
+def get_tenant_cache() -> Optional[TTLCache]:
+    """tenant UUID -> True for tenants known to exist, or None when disabled."""
+    return _get("tenant", 300)
+
+
+def get_kb_cache() -> Optional[TTLCache]:
+    """(tenant UUID, KB UUID) -> content_version, or None when disabled."""
+    return _get("kb", 5)
@@ -1,7 +1,11 @@
+import hashlib
+import time
+
 from fastapi import Depends, Security, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
 
+from app.auth.cache import get_token_cache
 from app.core.config import settings
 from app.core.exceptions import UnauthorizedError
 
@@ -12,8 +16,18 @@ security = HTTPBearer(auto_error=False)
 def get_current_tenant(creds: HTTPAuthorizationCredentials | None = Security(security)) -> str:
     if creds is None:
         raise UnauthorizedError(detail="Authorization header missing")
+    return verify_token(creds.credentials)
+
+
+def verify_token(token: str) -> str:
+    """tenant_id of a valid token; verified tokens are cached until they expire."""
+    cache = get_token_cache()
+    digest = hashlib.sha256(token.encode("utf-8")).digest()
+    if cache is not None:
+        tenant_id = cache.get(digest)
+        if tenant_id is not None:
+            return tenant_id
 
-    token = creds.credentials
     try:
         payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
     except JWTError:
@@ -23,4 +37,15 @@ def get_current_tenant(creds: HTTPAuthorizationCredentials | None = Security(sec
     if not tenant_id:
         raise UnauthorizedError(detail="tenant_id missing in token")
 
+    if cache is not None:
+        expires = payload.get("exp")
+        cache.put(digest, str(tenant_id), float(expires) - time.time() if isinstance(expires, (int, float)) else None)
     return str(tenant_id)
+
+
+def tenant_id_from_token(token: str) -> str | None:
+    """tenant_id of a valid token, or None; for callers that must not fail the request."""
+    try:
+        return verify_token(token)
+    except UnauthorizedError:
+        return None
@@ -22,3 +22,15 @@ class UnauthorizedError(AppException):
     """Raised when the user is not authorized to perform an action."""
     def __init__(self, detail: str = "Unauthorized"):
         super().__init__(detail, status_code=401)
+
+
+class ServiceUnavailableError(AppException):
+    """Raised when the service is temporarily overloaded."""
+    def __init__(self, detail: str = "Service Unavailable"):
+        super().__init__(detail, status_code=503)
+
+
+class PayloadTooLargeError(AppException):
+    """Raised when an upload exceeds the configured size limit."""
+    def __init__(self, detail: str = "Payload Too Large"):
+        super().__init__(detail, status_code=413)
@@ -0,0 +1,128 @@
+"""Bounded execution pools that keep blocking work off the asyncio event loop.
+
+Three pools are kept separate so one class of work cannot starve another:
+- ``db``: synchronous SQLAlchemy sessions.
+- ``llm``: blocking network calls to LLM providers.
+- ``inference``: CPU-bound model work (embedding, cross-encoder reranking).
+"""
+
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from app.core.config import settings
+from app.core.exceptions import ServiceUnavailableError
+from app.observability import (
+    executor_active,
+    executor_queued,
+    executor_rejected_total,
+    executor_wait_ms,
+    executor_workers,
+)
+
+T = TypeVar("T")
+
+_DEFAULT_WORKERS = {"db": 16, "llm": 32, "inference": 4}
+
+
+class BoundedExecutor:
+    def __init__(self, name: str, max_workers: int, max_queue: int = 0) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"rag-{name}")
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queued = 0
+        executor_workers.labels(name).set(max_workers)
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        with self._lock:
+            if self.max_queue and self._queued >= self.max_queue:
+                executor_rejected_total.labels(self.name).inc()
+                raise ServiceUnavailableError(detail=f"Server busy ({self.name} pool saturated)")
+            self._queued += 1
+        executor_queued.labels(self.name).inc()
+        submitted = time.monotonic()
+        # Carry contextvars (correlation ids, trace spans) into the worker thread.
+        ctx = contextvars.copy_context()
+
+        queued = True
+
+        def leave_queue() -> None:
+            nonlocal queued
+            with self._lock:
+                if not queued:
+                    return
+                queued = False
+                self._queued -= 1
+            executor_queued.labels(self.name).dec()
+
+        def call() -> T:
+            leave_queue()
+            with self._lock:
+                self._active += 1
+            executor_active.labels(self.name).inc()
+            executor_wait_ms.labels(self.name).observe((time.monotonic() - submitted) * 1000)
+            try:
+                return ctx.run(functools.partial(fn, *args, **kwargs))
+            finally:
+                with self._lock:
+                    self._active -= 1
+                executor_active.labels(self.name).dec()
+
+        future = self._pool.submit(call)
+        # A task cancelled (or dropped at shutdown) before a worker picks it up never runs call().
+        future.add_done_callback(lambda _: leave_queue())
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict[str, int]:
+        return {"workers": self.max_workers, "active": self._active, "queued": self._queued, "max_queue": self.max_queue}
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_executors: dict[str, BoundedExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(name: str) -> BoundedExecutor:
+    executor = _executors.get(name)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(name)
+            if executor is None:
+                workers = int(getattr(settings, f"executor_{name}_workers", _DEFAULT_WORKERS.get(name, 8)))
+                max_queue = int(getattr(settings, "executor_max_queue", 0))
+                executor = BoundedExecutor(name, max_workers=workers, max_queue=max_queue)
+                _executors[name] = executor
+    return executor
+
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    return await get_executor("db").run(fn, *args, **kwargs)
+
+
+async def run_llm(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    return await get_executor("llm").run(fn, *args, **kwargs)
+
+
+async def run_inference(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    return await get_executor("inference").run(fn, *args, **kwargs)
+
+
+def executor_stats() -> dict[str, dict[str, int]]:
+    return {name: executor.stats() for name, executor in list(_executors.items())}
+
+
+def shutdown_executors() -> None:
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown()
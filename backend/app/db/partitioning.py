@@ -0,0 +1,264 @@
+"""Optional partitioning of the ``chunks`` table by knowledge base or tenant.
+
+With partitioning enabled each partition carries its own ANN, GIN and b-tree indexes
+(indexes defined on the parent cascade to every partition), so vacuum, index builds and
+ANN recall for one KB are no longer affected by the size of every other tenant.
+
+Strategies (``chunk_partition_strategy`` / ``chunk_partition_key``):
+
+* ``list``: one partition per ``kb_id`` (or ``tenant_id``) value, created when the KB is
+  created, plus a ``DEFAULT`` partition as a safety net. Queries are routed straight to
+  the partition table.
+* ``hash``: a fixed number of partitions (``chunk_hash_partitions``); queries rely on the
+  planner pruning partitions from the ``kb_id``/``tenant_id`` equality filter.
+
+Converting an existing table copies every row, so it is an offline maintenance operation;
+see ``scripts/manage_chunk_partitions.py``.
+"""
+
+import hashlib
+import logging
+import uuid
+from typing import Any
+
+from sqlalchemy import MetaData, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.schema import CreateIndex
+
+from app.core.config import settings
+from app.db import vector_index
+from app.models.entities import Chunk
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ("list", "hash")
+KEYS = ("kb_id", "tenant_id")
+DEFAULT_PARTITION = "chunks_default"
+
+# Partitions known to exist, so routing does not pay a catalog lookup per query.
+_known_partitions: set[str] = set()
+_partition_tables: dict[str, Any] = {}
+
+
+def configured_strategy() -> tuple[str | None, str]:
+    strategy = (getattr(settings, "chunk_partition_strategy", "") or "").lower() or None
+    key = (getattr(settings, "chunk_partition_key", "kb_id") or "kb_id").lower()
+    if strategy is not None and strategy not in STRATEGIES:
+        raise ValueError(f"Unsupported chunk partition strategy: {strategy}")
+    if key not in KEYS:
+        raise ValueError(f"Unsupported chunk partition key: {key}")
+    return strategy, key
+
+
+def partition_name(key: str, value: uuid.UUID | str) -> str:
+    prefix = "kb" if key == "kb_id" else "tenant"
+    return f"chunks_{prefix}_{uuid.UUID(str(value)).hex}"
+
+
+def _child_index_name(index_name: str, partition: str) -> str:
+    # Identifiers are capped at 63 bytes; a short digest keeps names unique and in bounds.
+    return f"{partition}_{hashlib.md5(index_name.encode()).hexdigest()[:8]}"
+
+
+def is_partitioned(conn: Connection) -> bool:
+    return bool(
+        conn.execute(
+            text("SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = 'chunks'")
+        ).scalar()
+    )
+
+
+def partitions(conn: Connection) -> list[str]:
+    return list(
+        conn.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = 'chunks' ORDER BY c.relname"
+            )
+        ).scalars()
+    )
+
+
+def status(conn: Connection) -> dict[str, Any]:
+    row = conn.execute(
+        text(
+            "SELECT pg_get_partkeydef(c.oid) FROM pg_partitioned_table p "
+            "JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = 'chunks'"
+        )
+    ).scalar()
+    if row is None:
+        return {"partitioned": False}
+    sizes = conn.execute(
+        text(
+            "SELECT c.relname AS name, c.reltuples::bigint AS estimated_rows, "
+            "pg_total_relation_size(c.oid) AS total_bytes FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = 'chunks' ORDER BY total_bytes DESC"
+        )
+    ).mappings()
+    return {"partitioned": True, "partition_key": row, "partitions": [dict(r) for r in sizes]}
+
+
+def _index_ddls() -> list[str]:
+    """Every index the chunks table should carry, as DDL against the (partitioned) parent."""
+    dialect = postgresql.dialect()
+    ddls = [str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect)) for index in Chunk.__table__.indexes]
+    ddls.append(vector_index.index_ddl(getattr(settings, "ann_index_method", "hnsw") or "hnsw"))
+    return ddls
+
+
+def _rebuild_chunks(conn: Connection, partition_clause: str, primary_key: str, partition_ddls: list[str]) -> None:
+    conn.execute(text("DROP TABLE IF EXISTS chunks_rebuild CASCADE"))
+    conn.execute(
+        text(f"CREATE TABLE chunks_rebuild (LIKE chunks INCLUDING DEFAULTS INCLUDING GENERATED){partition_clause}")
+    )
+    for ddl in partition_ddls:
+        conn.execute(text(ddl.format(parent="chunks_rebuild")))
+    # Generated columns (content_tsv) are recomputed on insert and cannot be copied.
+    columns = ", ".join(
+        conn.execute(
+            text(
+                "SELECT quote_ident(attname) FROM pg_attribute WHERE attrelid = 'chunks'::regclass "
+                "AND attnum > 0 AND NOT attisdropped AND attgenerated = '' ORDER BY attnum"
+            )
+        ).scalars()
+    )
+    conn.execute(text(f"INSERT INTO chunks_rebuild ({columns}) SELECT {columns} FROM chunks"))
+    conn.execute(text("DROP TABLE chunks"))
+    conn.execute(text("ALTER TABLE chunks_rebuild RENAME TO chunks"))
+    conn.execute(text(f"ALTER TABLE chunks ADD CONSTRAINT chunks_pkey PRIMARY KEY ({primary_key})"))
+    conn.execute(
+        text("ALTER TABLE chunks ADD FOREIGN KEY (kb_id) REFERENCES knowledge_bases (id) ON DELETE CASCADE")
+    )
+    conn.execute(text("ALTER TABLE chunks ADD FOREIGN KEY (document_id) REFERENCES documents (id) ON DELETE CASCADE"))
+    # Keep the content_tsv trigger from migration 0002 when the database has it.
+    if conn.execute(text("SELECT to_regprocedure('content_tsv_update_trigger()')")).scalar():
+        conn.execute(
+            text(
+                "CREATE TRIGGER tsvector_update_before_insert_or_update BEFORE INSERT OR UPDATE ON chunks "
+                "FOR EACH ROW EXECUTE PROCEDURE content_tsv_update_trigger()"
+            )
+        )
+    # Built after the copy (faster than maintaining them row by row); on a partitioned parent
+    # each statement creates a local index on every partition.
+    for ddl in _index_ddls():
+        conn.execute(text(ddl))
+    conn.execute(text("ANALYZE chunks"))
+    _known_partitions.clear()
+
+
+def convert(conn: Connection, strategy: str, key: str = "kb_id", hash_partitions: int | None = None) -> list[str]:
+    """Rewrite ``chunks`` as a partitioned table, moving existing rows. Runs in the caller's transaction."""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unsupported chunk partition strategy: {strategy}")
+    if key not in KEYS:
+        raise ValueError(f"Unsupported chunk partition key: {key}")
+    if is_partitioned(conn):
+        raise ValueError("chunks is already partitioned")
+
+    if strategy == "hash":
+        modulus = int(hash_partitions or getattr(settings, "chunk_hash_partitions", 16))
+        ddls = [
+            f"CREATE TABLE chunks_p{i} PARTITION OF {{parent}} FOR VALUES WITH (MODULUS {modulus}, REMAINDER {i})"
+            for i in range(modulus)
+        ]
+    else:
+        source = "SELECT id FROM knowledge_bases" if key == "kb_id" else "SELECT DISTINCT tenant_id FROM knowledge_bases"
+        values = [row[0] for row in conn.execute(text(source))]
+        ddls = [
+            f"CREATE TABLE {partition_name(key, value)} PARTITION OF {{parent}} FOR VALUES IN ('{uuid.UUID(str(value))}')"
+            for value in values
+        ]
+        ddls.append(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {{parent}} DEFAULT")
+
+    # A partitioned table's primary key must include the partition key.
+    _rebuild_chunks(conn, f" PARTITION BY {strategy.upper()} ({key})", f"id, {key}", ddls)
+    created = partitions(conn)
+    logger.info("Partitioned chunks by %s(%s) into %d partitions", strategy, key, len(created))
+    return created
+
+
+def revert(conn: Connection) -> None:
+    """Rewrite a partitioned ``chunks`` back into a single table."""
+    if not is_partitioned(conn):
+        raise ValueError("chunks is not partitioned")
+    _rebuild_chunks(conn, "", "id", [])
+
+
+def ensure_partition(db: Session, tenant_id: uuid.UUID, kb_id: uuid.UUID) -> str | None:
+    """Create the list partition for a new KB (or tenant) in the caller's transaction.
+
+    No-op for other strategies. Creating a partition briefly locks the parent, which is
+    acceptable on the KB-create path.
+    """
+    strategy, key = configured_strategy()
+    if strategy != "list" or db.get_bind().dialect.name != "postgresql":
+        return None
+    value = kb_id if key == "kb_id" else tenant_id
+    name = partition_name(key, value)
+    if name in _known_partitions:
+        return name
+    # DDL is transactional, so the partition commits (or rolls back) with the KB row.
+    db.execute(
+        text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF chunks FOR VALUES IN ('{uuid.UUID(str(value))}')")
+    )
+    _known_partitions.add(name)
+    return name
+
+
+def prune(conn: Connection) -> list[str]:
+    """Drop list partitions whose knowledge base (or tenant) no longer exists."""
+    _strategy, key = configured_strategy()
+    source = "SELECT id FROM knowledge_bases" if key == "kb_id" else "SELECT DISTINCT tenant_id FROM knowledge_bases"
+    live = {partition_name(key, row[0]) for row in conn.execute(text(source))}
+    prefix = partition_name(key, uuid.UUID(int=0))[: -32]
+    dropped = [name for name in partitions(conn) if name.startswith(prefix) and name not in live]
+    for name in dropped:
+        conn.execute(text(f"DROP TABLE {name}"))
+        _known_partitions.discard(name)
+    return dropped
+
+
+def chunk_source(db: Session, tenant_id: uuid.UUID, kb_id: uuid.UUID) -> Any:
+    """Entity to select chunks from: the KB's own partition under list partitioning, else ``Chunk``.
+
+    Hash partitions are left to planner pruning; the equality filters in every query let it
+    discard the other partitions at plan (or executor start-up) time.
+    """
+    strategy, key = configured_strategy()
+    if strategy != "list":
+        return Chunk
+    name = partition_name(key, kb_id if key == "kb_id" else tenant_id)
+    if name not in _known_partitions:
+        if db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is None:
+            return Chunk
+        _known_partitions.add(name)
+    table = _partition_tables.get(name)
+    if table is None:
+        table = _partition_tables[name] = Chunk.__table__.to_metadata(MetaData(), name=name)
+    return aliased(Chunk, table, adapt_on_names=True)
+
+
+def create_partitioned_index(conn: Connection, ddl: str, name: str) -> None:
+    """Build an index on a partitioned ``chunks`` without locking writes.
+
+    CREATE INDEX CONCURRENTLY is not allowed on a partitioned parent, so the parent index is
+    created ``ON ONLY`` (invalid), each partition is indexed concurrently and attached, which
+    makes the parent index valid once every partition is covered. ``conn`` must be AUTOCOMMIT.
+    """
+    parent_ddl = ddl.replace(" CONCURRENTLY", "").replace(" ON chunks ", " ON ONLY chunks ", 1)
+    conn.execute(text(parent_ddl))
+    for partition in partitions(conn):
+        child = _child_index_name(name, partition)
+        child_ddl = ddl.replace(f" {name} ON chunks ", f" {child} ON {partition} ", 1)
+        conn.execute(text(child_ddl))
+        attached = conn.execute(
+            text("SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(:child) AND inhparent = to_regclass(:parent)"),
+            {"child": child, "parent": name},
+        ).scalar()
+        if not attached:
+            conn.execute(text(f"ALTER INDEX {name} ATTACH PARTITION {child}"))
@@ -0,0 +1,153 @@
+"""pgvector ANN index management for ``chunks.embedding``.
+
+The index operator class must match the operator used at query time or Postgres falls
+back to a sequential scan. With ``normalize_embeddings`` enabled, vectors are unit length
+so inner product ranks identically to cosine and is cheaper to compute; we index with
+``vector_ip_ops`` and order by ``<#>``. Otherwise we index ``vector_cosine_ops`` and order
+by ``<=>``.
+"""
+
+import logging
+import math
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "ix_chunks_embedding_ann"
+METHODS = ("hnsw", "ivfflat")
+
+
+def uses_inner_product() -> bool:
+    return bool(getattr(settings, "normalize_embeddings", True))
+
+
+def operator_class() -> str:
+    return "vector_ip_ops" if uses_inner_product() else "vector_cosine_ops"
+
+
+def embedding_distance(column: Any, query_vec: Any) -> Any:
+    """Distance expression (smaller is closer) that can be served by the ANN index."""
+    if uses_inner_product():
+        return column.max_inner_product(query_vec)
+    return column.cosine_distance(query_vec)
+
+
+def index_ddl(
+    method: str = "hnsw",
+    *,
+    name: str = INDEX_NAME,
+    concurrently: bool = False,
+    m: int | None = None,
+    ef_construction: int | None = None,
+    lists: int | None = None,
+) -> str:
+    if method not in METHODS:
+        raise ValueError(f"Unsupported ANN index method: {method}")
+    if method == "hnsw":
+        m = int(m or getattr(settings, "hnsw_m", 16))
+        ef_construction = int(ef_construction or getattr(settings, "hnsw_ef_construction", 64))
+        options = f"m = {m}, ef_construction = {ef_construction}"
+    else:
+        options = f"lists = {int(lists or getattr(settings, 'ivfflat_lists', 100) or 100)}"
+    concurrent = "CONCURRENTLY " if concurrently else ""
+    return (
+        f"CREATE INDEX {concurrent}IF NOT EXISTS {name} ON chunks "
+        f"USING {method} (embedding {operator_class()}) WITH ({options})"
+    )
+
+
+def suggested_ivfflat_lists(row_count: int) -> int:
+    # pgvector guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond that.
+    if row_count <= 1_000_000:
+        return max(1, row_count // 1000)
+    return int(math.sqrt(row_count))
+
+
+def apply_search_params(db: Session, ef_search: int | None = None, probes: int | None = None) -> None:
+    """Set per-query ANN knobs for the current transaction (no-op when nothing is configured)."""
+    ef_search = ef_search or int(getattr(settings, "hnsw_ef_search", 0) or 0)
+    probes = probes or int(getattr(settings, "ivfflat_probes", 0) or 0)
+    iterative_scan = getattr(settings, "hnsw_iterative_scan", "") or ""
+    # set_config(..., is_local => true) scopes the value to this transaction, unlike plain SET.
+    if ef_search:
+        db.execute(text("SELECT set_config('hnsw.ef_search', :value, true)"), {"value": str(int(ef_search))})
+    if probes:
+        db.execute(text("SELECT set_config('ivfflat.probes', :value, true)"), {"value": str(int(probes))})
+    if iterative_scan:
+        db.execute(text("SELECT set_config('hnsw.iterative_scan', :value, true)"), {"value": iterative_scan})
+
+
+def index_status(conn: Connection, name: str = INDEX_NAME) -> dict[str, Any] | None:
+    row = conn.execute(
+        text(
+            """
+            SELECT c.relname AS name, am.amname AS method, pg_get_indexdef(c.oid) AS definition,
+                   pg_relation_size(c.oid) AS size_bytes, i.indisvalid AS valid
+            FROM pg_class c
+            JOIN pg_index i ON i.indexrelid = c.oid
+            JOIN pg_am am ON am.oid = c.relam
+            WHERE c.relname = :name
+            """
+        ),
+        {"name": name},
+    ).mappings().first()
+    return dict(row) if row else None
+
+
+def create_index(conn: Connection, method: str = "hnsw", concurrently: bool = True, **options: Any) -> None:
+    """Create the ANN index. ``conn`` must be in AUTOCOMMIT mode when ``concurrently`` is set."""
+    from app.db import partitioning
+
+    name = options.pop("name", INDEX_NAME)
+    ddl = index_ddl(method, name=name, concurrently=concurrently, **options)
+    logger.info("Creating ANN index: %s", ddl)
+    if concurrently and partitioning.is_partitioned(conn):
+        partitioning.create_partitioned_index(conn, ddl, name)
+        return
+    conn.execute(text(ddl))
+
+
+def drop_index(conn: Connection, name: str = INDEX_NAME, concurrently: bool = True) -> None:
+    from app.db import partitioning
+
+    # DROP INDEX CONCURRENTLY is not supported for indexes on a partitioned table.
+    concurrent = "CONCURRENTLY " if concurrently and not partitioning.is_partitioned(conn) else ""
+    conn.execute(text(f"DROP INDEX {concurrent}IF EXISTS {name}"))
+
+
+def rebuild_index(conn: Connection, method: str | None = None, concurrently: bool = True, **options: Any) -> None:
+    """Rebuild (optionally with new method/parameters) without blocking writers when concurrent.
+
+    A plain REINDEX keeps the existing definition. When a method or options are given, a new
+    index is built next to the old one and swapped in, so ingestion keeps writing throughout.
+    """
+    status = index_status(conn)
+    if status is None:
+        create_index(conn, method or "hnsw", concurrently=concurrently, **options)
+        return
+    if method is None and not options:
+        concurrent = "CONCURRENTLY " if concurrently else ""
+        conn.execute(text(f"REINDEX INDEX {concurrent}{INDEX_NAME}"))
+        return
+
+    method = method or status["method"]
+    staging = f"{INDEX_NAME}_new"
+    drop_index(conn, staging, concurrently=concurrently)
+    create_index(conn, method, concurrently=concurrently, name=staging, **options)
+    drop_index(conn, INDEX_NAME, concurrently=concurrently)
+    conn.execute(text(f"ALTER INDEX {staging} RENAME TO {INDEX_NAME}"))
+
+
+def tune_ivfflat(conn: Connection, concurrently: bool = True) -> int:
+    """Rebuild an IVFFlat index with a list count sized to the current table."""
+    row_count = int(conn.execute(text("SELECT count(*) FROM chunks WHERE embedding IS NOT NULL")).scalar() or 0)
+    lists = suggested_ivfflat_lists(row_count)
+    rebuild_index(conn, "ivfflat", concurrently=concurrently, lists=lists)
+    conn.execute(text("ANALYZE chunks"))
+    return lists
@@ -1,46 +1,128 @@
 import logging
+import math
 import os
+import threading
 import time
 import uuid
 from contextlib import asynccontextmanager
-from collections import deque
 from pathlib import Path
-from typing import Deque
 
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import Response, JSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from app import tracing
 from app.api import routes
+from app.auth.deps import tenant_id_from_token
 from app.core.config import settings
 from app.core.exceptions import AppException
+from app.core.executors import shutdown_executors
 from app.db.session import Base, engine
+from app.services import job_queue
 from app.services.embeddings import EmbeddingService
+from app.services.extraction_pool import shutdown_extraction_pool
+from app.services.llm import close_clients
+from app.services.rate_limit import RateLimitDecision, get_rate_limiter, route_class, rule_for
+from app.services.rerank import RerankingService
 from app.observability import http_request_latency_ms, http_requests_total, metrics
 
 logger = logging.getLogger("rag-app")
-_rate_limit_window_seconds = 60
-_rate_limit_buckets: dict[str, Deque[float]] = {}
+
+
+def _warm_models() -> None:
+    for label, service in (("Embedding", EmbeddingService), ("Reranker", RerankingService)):
+        try:
+            _ = service().model
+            logger.info("%s model warm-up complete", label)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("%s warm-up failed: %s", label, exc)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    try:
-        # Load embedding model once at startup to avoid first-request latency.
-        _ = EmbeddingService().model
-        logger.info("Embedding model warm-up complete")
-    except Exception as exc:  # noqa: BLE001
-        logger.warning("Embedding warm-up failed: %s", exc)
+    # Load models once, in the background so liveness answers right away; /health/ready
+    # reports 503 until they are in the shared registry.
+    if getattr(settings, "model_warmup", True):
+        threading.Thread(target=_warm_models, name="rag-model-warmup", daemon=True).start()
     # Create tables in dev/local; in production, prefer migrations. Skipped when SKIP_DB_INIT=1.
     if os.getenv("SKIP_DB_INIT") != "1":
         Base.metadata.create_all(bind=engine)
+    # Single-process deployments can run the ingestion worker in-process instead of `python -m app.worker`.
+    worker = None
+    if getattr(settings, "ingest_embedded_worker", False):
+        from app.worker import Worker
+
+        worker = Worker()
+        worker.start_background()
     yield
+    if worker is not None:
+        worker.stop()
+    await close_clients()
+    shutdown_executors()
+    tracing.shutdown_exporter()
+    metrics.flush()
+    shutdown_extraction_pool()
+
+
+def _rate_limit_identity(request: Request) -> str:
+    # Tenants are limited as a whole across their clients; anonymous callers per IP.
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        tenant_id = tenant_id_from_token(token)
+        if tenant_id:
+            return f"tenant:{tenant_id}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+async def _check_rate_limit(request: Request) -> RateLimitDecision | None:
+    """The limiter's decision for this request, or None when it is not limited."""
+    if not getattr(settings, "rate_limit_enabled", False):
+        return None
+    name = route_class(request.url.path)
+    rule = rule_for(name) if name else None
+    if rule is None:
+        return None
+    return await get_rate_limiter().acheck(f"{name}:{_rate_limit_identity(request)}", rule)
+
+
+class UploadLimitMiddleware:
+    """Cuts off ``POST /ingest`` bodies once they pass the upload limit.
+
+    Starlette parses the whole multipart body into temporary files before the route runs, so
+    a chunked upload without Content-Length would otherwise be received in full before the
+    handler could reject it. The 413 is raised from ``receive`` while the body streams in.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        max_bytes = job_queue.max_upload_bytes()
+        if scope["type"] != "http" or scope["path"] != "/ingest" or not max_bytes:
+            await self.app(scope, receive, send)
+            return
+        limit = max_bytes + job_queue.MULTIPART_OVERHEAD_BYTES
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPI re-raises HTTPException from body parsing, so the handler below answers it.
+                    raise HTTPException(status_code=413, detail=f"Upload exceeds the {max_bytes} byte limit")
+            return message
+
+        await self.app(scope, limited_receive, send)
 
 
 def create_app() -> FastAPI:
     app_title = getattr(settings, "app_name", "Enterprise RAG Platform")
     app = FastAPI(title=app_title, lifespan=lifespan)
     app.include_router(routes.router)
+    app.add_middleware(UploadLimitMiddleware)
 
     static_dir = Path(__file__).resolve().parent / "static"
     if static_dir.exists():
@@ -117,23 +199,37 @@ def create_app() -> FastAPI:
         request_id = incoming_id or str(uuid.uuid4())
         request.state.correlation_id = request_id
 
-        if getattr(settings, "rate_limit_enabled", False):
-            client_id = request.client.host if request.client else "unknown"
-            limit = int(getattr(settings, "rate_limit_per_minute", 60))
-            now = time.time()
-            bucket = _rate_limit_buckets.setdefault(client_id, deque())
-            while bucket and bucket[0] < now - _rate_limit_window_seconds:
-                bucket.popleft()
-            if len(bucket) >= limit:
-                raise HTTPException(status_code=429, detail="Rate limit exceeded")
-            bucket.append(now)
+        rate_limit = await _check_rate_limit(request)
 
         start_time = time.time()
-        response = await call_next(request)
+        if rate_limit is not None and not rate_limit.allowed:
+            # Answered here: exceptions raised in middleware bypass the exception handlers.
+            response = JSONResponse(
+                status_code=429,
+                content=_build_error_payload("Rate limit exceeded", request),
+                headers={"Retry-After": str(max(1, math.ceil(rate_limit.retry_after)))},
+            )
+        elif tracing.enabled():
+            with tracing.start_trace(
+                f"{request.method} {request.url.path}",
+                traceparent=request.headers.get("traceparent"),
+                **{"http.method": request.method, "http.target": request.url.path, "correlation_id": request_id},
+            ) as root:
+                response = await call_next(request)
+                route_path = getattr(request.scope.get("route"), "path", None)
+                if route_path:
+                    root.name = f"{request.method} {route_path}"
+                root.set_attribute("http.status_code", response.status_code)
+            response.headers["traceparent"] = root.traceparent
+        else:
+            response = await call_next(request)
         duration_ms = int((time.time() - start_time) * 1000)
         response.headers["X-Request-ID"] = request_id
         response.headers["X-Correlation-ID"] = request_id
         response.headers["X-Response-Time-ms"] = str(duration_ms)
+        if rate_limit is not None:
+            response.headers["X-RateLimit-Limit"] = str(rate_limit.limit)
+            response.headers["X-RateLimit-Remaining"] = str(rate_limit.remaining)
 
         route = request.scope.get("route")
         path_label = getattr(route, "path", None) or request.url.path
@@ -2,7 +2,7 @@ import uuid
 from datetime import datetime
 from typing import Any
 
-from sqlalchemy import Column, DateTime, ForeignKey, String, Text
+from sqlalchemy import Column, Computed, DateTime, Float, ForeignKey, Index, Integer, String, Text, text
 from sqlalchemy.dialects.postgresql import JSONB, UUID, TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -19,6 +19,7 @@ if IS_SQLITE:
     JSON_TYPE = JSON
     EMBEDDING_TYPE = JSON
     TSVECTOR_TYPE = String  # Use a simple string for SQLite
+    TSVECTOR_ARGS: tuple = ()
 else:
     from pgvector.sqlalchemy import Vector
 
@@ -26,6 +27,8 @@ else:
     JSON_TYPE = JSONB
     EMBEDDING_TYPE = Vector(dim=settings.VECTOR_DIMENSION)
     TSVECTOR_TYPE = TSVECTOR
+    # Derived by Postgres on write, so bulk loads (COPY) need no per-row trigger.
+    TSVECTOR_ARGS = (Computed("to_tsvector('english'::regconfig, content)", persisted=True),)
 
 
 class Tenant(Base):
@@ -41,11 +44,17 @@ class Tenant(Base):
 
 class KnowledgeBase(Base):
     __tablename__ = "knowledge_bases"
+    __table_args__ = (
+        # GET /kb: WHERE tenant_id = ? ORDER BY created_at DESC
+        Index("ix_knowledge_bases_tenant_created", "tenant_id", "created_at"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID_TYPE, primary_key=True, default=uuid.uuid4)
     tenant_id: Mapped[uuid.UUID] = mapped_column(UUID_TYPE, ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False)
     name: Mapped[str] = mapped_column(String(255), nullable=False)
     description: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # Bumped whenever a document in the KB becomes READY or FAILED; see app.services.kb_versions.
+    content_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default=text("0"))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
 
     tenant = relationship("Tenant", back_populates="knowledge_bases")
@@ -55,6 +64,34 @@ class KnowledgeBase(Base):
 
 class Document(Base):
     __tablename__ = "documents"
+    __table_args__ = (
+        # GET /documents?kb_id=: WHERE kb_id = ? AND tenant_id = ? ORDER BY created_at DESC (kb_id first also serves KB cascades)
+        Index("ix_documents_kb_tenant_created", "kb_id", "tenant_id", "created_at"),
+        # GET /documents: WHERE tenant_id = ? ORDER BY created_at DESC
+        Index("ix_documents_tenant_created", "tenant_id", "created_at"),
+        *(
+            ()
+            if IS_SQLITE
+            else (
+                # /ingest idempotency lookup; IS NOT NULL is implied by the equality filter so the partial index applies.
+                Index(
+                    "ix_documents_idempotency_key",
+                    "tenant_id",
+                    "kb_id",
+                    text("(metadata ->> 'idempotency_key')"),
+                    postgresql_where=text("(metadata ->> 'idempotency_key') IS NOT NULL"),
+                ),
+            )
+        ),
+        # /ingest duplicate upload lookup: WHERE kb_id = ? AND tenant_id = ? AND content_hash = ?
+        Index(
+            "ix_documents_kb_tenant_content_hash",
+            "kb_id",
+            "tenant_id",
+            "content_hash",
+            postgresql_where=text("content_hash IS NOT NULL"),
+        ),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID_TYPE, primary_key=True, default=uuid.uuid4)
     tenant_id: Mapped[uuid.UUID] = mapped_column(UUID_TYPE, ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False)
@@ -62,6 +99,8 @@ class Document(Base):
     filename: Mapped[str] = mapped_column(String(512), nullable=False)
     status: Mapped[str] = mapped_column(String(50), nullable=False, default="UPLOADED")
     doc_metadata: Mapped[dict | None] = mapped_column("metadata", JSON_TYPE, nullable=True)
+    # sha256 of the uploaded bytes, set once the document is READY.
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
 
     tenant = relationship("Tenant", back_populates="documents")
@@ -92,16 +131,81 @@ class Document(Base):
 
 class Chunk(Base):
     __tablename__ = "chunks"
+    __table_args__ = (
+        # Retrieval: WHERE kb_id = ? AND tenant_id = ? (kb_id first also serves KB delete cascades)
+        Index("ix_chunks_kb_tenant", "kb_id", "tenant_id"),
+        # GET /documents/{id}/chunks and re-ingest deletes: WHERE document_id = ? AND tenant_id = ? ORDER BY ordinal
+        Index("ix_chunks_document_tenant_ordinal", "document_id", "tenant_id", "ordinal"),
+        Index("ix_chunks_content_tsv", "content_tsv", postgresql_using="gin"),
+        # Embedding reuse at ingestion: WHERE kb_id = ? AND content_hash IN (...)
+        Index("ix_chunks_kb_content_hash", "kb_id", "content_hash"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID_TYPE, primary_key=True, default=uuid.uuid4)
     tenant_id: Mapped[uuid.UUID] = mapped_column(UUID_TYPE, nullable=False)
     kb_id: Mapped[uuid.UUID] = mapped_column(UUID_TYPE, ForeignKey("knowledge_bases.id", ondelete="CASCADE"), nullable=False)
     document_id: Mapped[uuid.UUID] = mapped_column(UUID_TYPE, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
     content: Mapped[str] = mapped_column(Text, nullable=False)
-    content_tsv: Mapped[Any] = mapped_column(TSVECTOR_TYPE, nullable=True)
+    content_tsv: Mapped[Any] = mapped_column(TSVECTOR_TYPE, *TSVECTOR_ARGS, nullable=True)
     embedding: Mapped[list[float] | None] = mapped_column(EMBEDDING_TYPE, nullable=True)
     chunk_metadata: Mapped[dict | None] = mapped_column("metadata", JSON_TYPE, nullable=True)
+    # See chunk_writer.chunk_hash: covers the embedding model as well as the text.
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    # Position in the document; rows kept across a re-ingestion are renumbered.
+    ordinal: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default=text("0"))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
 
     document = relationship("Document", back_populates="chunks")
     knowledge_base = relationship("KnowledgeBase", back_populates="chunks")
+
+
+class IngestionJob(Base):
+    """Durable unit of ingestion work, claimed by `python -m app.worker` processes."""
+
+    __tablename__ = "ingestion_jobs"
+    __table_args__ = (
+        # Claim query: WHERE status = 'QUEUED' AND run_after <= now() ORDER BY run_after ... SKIP LOCKED
+        Index("ix_ingestion_jobs_status_run_after", "status", "run_after"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID_TYPE, primary_key=True, default=uuid.uuid4)
+    tenant_id: Mapped[uuid.UUID] = mapped_column(UUID_TYPE, nullable=False)
+    kb_id: Mapped[uuid.UUID] = mapped_column(UUID_TYPE, nullable=False)
+    document_id: Mapped[uuid.UUID] = mapped_column(UUID_TYPE, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True)
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)
+    payload: Mapped[dict | None] = mapped_column(JSON_TYPE, nullable=True)
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="QUEUED")
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=5)
+    run_after: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    lease_owner: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class RetrievalCacheEntry(Base):
+    """Shared retrieval cache row; see app.services.retrieval_cache. UNLOGGED in Postgres (migration 0009)."""
+
+    __tablename__ = "retrieval_cache"
+    __table_args__ = (
+        # Purge: WHERE expires_at <= now() OR the KB moved past content_version
+        Index("ix_retrieval_cache_expires_at", "expires_at"),
+    )
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    kb_id: Mapped[uuid.UUID] = mapped_column(UUID_TYPE, nullable=False)
+    content_version: Mapped[int] = mapped_column(Integer, nullable=False)
+    sources: Mapped[list] = mapped_column(JSON_TYPE, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class RateLimitBucket(Base):
+    """GCRA state of one rate-limit key; see app.services.rate_limit. UNLOGGED in Postgres (migration 0010)."""
+
+    __tablename__ = "rate_limits"
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    # Theoretical arrival time, epoch seconds on the database clock.
+    tat: Mapped[float] = mapped_column(Float, nullable=False)
@@ -1,13 +1,21 @@
+import json
 import logging
+import math
+import os
+import threading
 import time
-from collections import Counter
+from collections import Counter, deque
 from contextlib import contextmanager
-from typing import Iterator
+from pathlib import Path
+from typing import Any, Iterator
 
 from prometheus_client import Counter as PromCounter
+from prometheus_client import Gauge
 from prometheus_client import Histogram
 from prometheus_client import generate_latest
 
+from app.core.config import settings
+
 logger = logging.getLogger("rag-app")
 RECENT_ERROR_LIMIT = 50
 
@@ -15,35 +23,260 @@ http_requests_total = PromCounter("rag_http_requests_total", "Total HTTP request
 http_request_latency_ms = Histogram("rag_http_request_latency_ms", "HTTP request latency (ms)", ["method", "path", "error_code"])
 ingest_latency_ms = Histogram("rag_ingest_latency_ms", "Ingestion latency (ms)")
 rag_latency_ms = Histogram("rag_rag_latency_ms", "RAG total latency (ms)")
+rag_stage_latency_ms = Histogram(
+    "rag_stage_latency_ms",
+    "Time per request stage (embedding, search, sql, rerank, prompt, llm, caches) from tracing spans (ms)",
+    ["stage"],
+    buckets=(1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+)
+model_load_latency_ms = Histogram(
+    "rag_model_load_latency_ms",
+    "Model load latency (ms)",
+    ["kind", "model"],
+    buckets=(100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000),
+)
+model_memory_bytes = Gauge("rag_model_memory_bytes", "Approximate parameter memory of loaded models (bytes)", ["kind", "model", "device"])
+model_loads_total = PromCounter("rag_model_loads_total", "Model load attempts", ["kind", "model", "outcome"])
+embedding_batch_size = Histogram(
+    "rag_embedding_batch_size",
+    "Query texts encoded per micro-batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+embedding_queue_depth = Histogram(
+    "rag_embedding_queue_depth",
+    "Pending query embeddings observed at submit time",
+    buckets=(0, 1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+embedding_cache_requests_total = PromCounter(
+    "rag_embedding_cache_requests_total", "Embedding cache lookups by tier and outcome", ["tier", "outcome"]
+)
+embedding_cache_evictions_total = PromCounter("rag_embedding_cache_evictions_total", "Embeddings evicted from the cache", ["tier"])
+embedding_cache_bytes = Gauge("rag_embedding_cache_bytes", "Bytes held by the in-process embedding cache", ["tier"])
+embedding_batch_wait_ms = Histogram(
+    "rag_embedding_batch_wait_ms",
+    "Time the oldest request in a micro-batch waited before encoding (ms)",
+    buckets=(0.5, 1, 2, 5, 10, 20, 50, 100),
+)
+chunk_write_rows_total = PromCounter("rag_chunk_write_rows_total", "Chunk rows bulk-written during ingestion", ["method"])
+chunk_write_rows_per_second = Histogram(
+    "rag_chunk_write_rows_per_second",
+    "Chunk write throughput per document (rows/s)",
+    ["method"],
+    buckets=(100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000),
+)
+ingest_chunks_total = PromCounter("rag_ingest_chunks_total", "Chunks ingested by how their row/embedding was obtained", ["outcome"])
+extraction_units_total = PromCounter("rag_extraction_units_total", "Pages, slides or paragraphs extracted", ["format"])
+extraction_bytes_total = PromCounter("rag_extraction_bytes_total", "Source bytes of extracted documents", ["format"])
+extraction_units_per_second = Histogram(
+    "rag_extraction_units_per_second",
+    "Extraction throughput per document (units/s)",
+    ["format"],
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000),
+)
+extraction_failures_total = PromCounter("rag_extraction_failures_total", "Failed extractions by reason", ["format", "reason"])
+ingest_queue_depth = Gauge("rag_ingest_queue_depth", "Ingestion jobs per status", ["status"])
+ingest_queue_oldest_seconds = Gauge("rag_ingest_queue_oldest_seconds", "Age of the oldest runnable queued ingestion job (s)")
+ingest_jobs_total = PromCounter("rag_ingest_jobs_total", "Ingestion job attempts by outcome", ["outcome"])
+answer_cache_requests_total = PromCounter("rag_answer_cache_requests_total", "Answer cache lookups by outcome (exact, semantic, miss)", ["outcome"])
+answer_cache_entries = Gauge("rag_answer_cache_entries", "Answers held by the answer cache")
+retrieval_cache_requests_total = PromCounter("rag_retrieval_cache_requests_total", "Retrieval cache lookups by backend and outcome", ["backend", "outcome"])
+rate_limit_requests_total = PromCounter("rag_rate_limit_requests_total", "Rate limit checks by backend and outcome", ["backend", "outcome"])
+rerank_pairs_total = PromCounter("rag_rerank_pairs_total", "Query/passage pairs by whether the reranker scored them in budget", ["outcome"])
+rerank_budget_exceeded_total = PromCounter("rag_rerank_budget_exceeded_total", "Rerank calls cut short by reranker_budget_ms")
+executor_workers = Gauge("rag_executor_workers", "Configured worker threads per execution pool", ["pool"])
+executor_active = Gauge("rag_executor_active", "Tasks currently running per execution pool", ["pool"])
+executor_queued = Gauge("rag_executor_queued", "Tasks waiting for a worker per execution pool", ["pool"])
+executor_wait_ms = Histogram(
+    "rag_executor_wait_ms",
+    "Time a task waited for a pool worker (ms)",
+    ["pool"],
+    buckets=(0.5, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000),
+)
+executor_rejected_total = PromCounter("rag_executor_rejected_total", "Tasks rejected because the pool queue was full", ["pool"])
+
+
+class QuantileSketch:
+    """DDSketch-style quantile sketch over non-negative values.
+
+    Values fall into logarithmic buckets, so every quantile is within ``relative_accuracy``
+    of the exact answer while memory stays bounded by the value range (about 1,200 buckets
+    from 1 µs to 3 hours at 1%) rather than the number of observations. Sketches with the
+    same accuracy merge exactly, which is how per-process series are combined.
+    """
+
+    __slots__ = ("relative_accuracy", "max_buckets", "_gamma", "_log_gamma", "_buckets", "zero_count", "count")
+
+    MIN_VALUE = 1e-3
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048) -> None:
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._buckets: dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        if value < self.MIN_VALUE:
+            self.zero_count += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self._buckets[key] = self._buckets.get(key, 0) + 1
+        if len(self._buckets) > self.max_buckets:
+            self._collapse()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for key, count in other._buckets.items():
+            self._buckets[key] = self._buckets.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if len(self._buckets) > self.max_buckets:
+            self._collapse()
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self._buckets):
+            seen += self._buckets[key]
+            if seen > rank:
+                return 2 * self._gamma**key / (self._gamma + 1)
+        return 2 * self._gamma ** max(self._buckets) / (self._gamma + 1)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "zero_count": self.zero_count,
+            "buckets": {str(key): count for key, count in self._buckets.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "QuantileSketch":
+        sketch = cls(relative_accuracy=data["relative_accuracy"])
+        sketch._buckets = {int(key): count for key, count in data["buckets"].items()}
+        sketch.zero_count = data["zero_count"]
+        sketch.count = sketch.zero_count + sum(sketch._buckets.values())
+        return sketch
+
+    def _collapse(self) -> None:
+        # Fold the lowest buckets together: high quantiles are the ones worth keeping exact.
+        keys = sorted(self._buckets)
+        excess = len(keys) - self.max_buckets
+        floor = keys[excess]
+        for key in keys[:excess]:
+            self._buckets[floor] += self._buckets.pop(key)
+
+
+class LatencySeries:
+    """Count, sum, max and quantile sketch of one named latency."""
+
+    __slots__ = ("count", "total", "max", "sketch")
+
+    def __init__(self, sketch: QuantileSketch | None = None) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.sketch = sketch or QuantileSketch()
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.sketch.add(value)
+
+    def merge(self, other: "LatencySeries") -> None:
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+
+    def summary(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "avg_ms": self.total / self.count if self.count else 0.0,
+            "p50_ms": self.sketch.quantile(0.5),
+            "p95_ms": self.sketch.quantile(0.95),
+            "p99_ms": self.sketch.quantile(0.99),
+            "max_ms": self.max,
+        }
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"count": self.count, "total": self.total, "max": self.max, "sketch": self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "LatencySeries":
+        series = cls(QuantileSketch.from_dict(data["sketch"]))
+        series.count, series.total, series.max = data["count"], data["total"], data["max"]
+        return series
 
 
 class Metrics:
-    def __init__(self) -> None:
-        self._counts = Counter()
-        self._latency_ms: list[int] = []
-        self._recent_errors: list[dict[str, object]] = []
+    """In-process counters, latency series and recent errors behind ``/metrics/summary``.
+
+    Memory is bounded: latencies go into per-name sketches and errors into a ring buffer.
+    With a ``multiprocess_dir`` (``metrics_multiprocess_dir``) every process - each
+    uvicorn/gunicorn worker and the ingestion worker - writes its state to
+    ``metrics-<pid>.json`` there every ``flush_interval`` seconds, and ``snapshot()`` /
+    ``recent_errors()`` report all processes combined. Files of exited processes are kept,
+    so counts stay cumulative; empty the directory when deploying, as with Prometheus'
+    ``PROMETHEUS_MULTIPROC_DIR``.
+    """
+
+    def __init__(self, multiprocess_dir: str | None = None, flush_interval: float = 5.0) -> None:
+        self._lock = threading.Lock()
+        self._counts: Counter[str] = Counter()
+        self._series: dict[str, LatencySeries] = {}
+        self._all = LatencySeries()
+        self._recent_errors: deque[dict[str, object]] = deque(maxlen=RECENT_ERROR_LIMIT)
+        self._dir = Path(multiprocess_dir) if multiprocess_dir else None
+        self._flush_interval = flush_interval
+        self._dirty = False
+        self._flusher_pid: int | None = None
 
     def inc(self, name: str) -> None:
-        self._counts[name] += 1
+        with self._lock:
+            self._counts[name] += 1
+            self._dirty = True
+        self._ensure_flusher()
 
     def observe_latency(self, name: str, value_ms: int) -> None:
-        self._counts[f"{name}_count"] += 1
-        self._latency_ms.append(value_ms)
-
-    def snapshot(self) -> dict[str, int | float]:
-        # Expose basic counts and simple latency stats for debugging.
-        if self._latency_ms:
-            avg_latency = sum(self._latency_ms) / len(self._latency_ms)
-            p95 = sorted(self._latency_ms)[max(int(len(self._latency_ms) * 0.95) - 1, 0)]
-        else:
-            avg_latency = 0.0
-            p95 = 0
-        return {
-            "counts": dict(self._counts),
-            "latency_avg_ms": avg_latency,
-            "latency_p95_ms": p95,
-            "error_recent_count": len(self._recent_errors),
+        with self._lock:
+            self._counts[f"{name}_count"] += 1
+            series = self._series.get(name)
+            if series is None:
+                series = self._series[name] = LatencySeries()
+            series.add(value_ms)
+            self._all.add(value_ms)
+            self._dirty = True
+        self._ensure_flusher()
+        if name == "ingest_ms":
+            ingest_latency_ms.observe(value_ms)
+        elif name == "rag_total_ms":
+            rag_latency_ms.observe(value_ms)
+
+    def snapshot(self) -> dict[str, object]:
+        # Expose basic counts and latency stats for debugging.
+        state = self._merged_state()
+        overall = state["all"].summary()
+        snapshot: dict[str, object] = {
+            "counts": dict(state["counts"]),
+            "latency_avg_ms": overall["avg_ms"],
+            "latency_p95_ms": overall["p95_ms"],
+            "latency": {name: series.summary() for name, series in sorted(state["series"].items())},
+            "error_recent_count": len(state["errors"]),
         }
+        if self._dir is not None:
+            snapshot["processes"] = state["processes"]
+        return snapshot
 
     def record_error(
         self,
@@ -64,12 +297,13 @@ class Metrics:
             "detail": detail,
             "correlation_id": correlation_id,
         }
-        self._recent_errors.append(record)
-        if len(self._recent_errors) > RECENT_ERROR_LIMIT:
-            self._recent_errors.pop(0)
+        with self._lock:
+            self._recent_errors.append(record)
+            self._dirty = True
+        self._ensure_flusher()
 
     def recent_errors(self) -> list[dict[str, object]]:
-        return list(self._recent_errors)
+        return self._merged_state()["errors"]
 
     @contextmanager
     def timeit(self, name: str) -> Iterator[None]:
@@ -77,12 +311,81 @@ class Metrics:
         try:
             yield
         finally:
-            ms = int((time.time() - start) * 1000)
-            self.observe_latency(name, ms)
-            if name == "ingest_ms":
-                ingest_latency_ms.observe(ms)
-            if name == "rag_total_ms":
-                rag_latency_ms.observe(ms)
+            self.observe_latency(name, int((time.time() - start) * 1000))
+
+    def flush(self) -> None:
+        """Write this process' state to the multiprocess directory (no-op without one)."""
+        if self._dir is None:
+            return
+        with self._lock:
+            state = self._state()
+            self._dirty = False
+        path = self._dir / f"metrics-{os.getpid()}.json"
+        tmp = path.with_suffix(".tmp")
+        try:
+            self._dir.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps(state), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError:
+            logger.warning("Could not write metrics to %s", path, exc_info=True)
+
+    def _state(self) -> dict[str, Any]:
+        return {
+            "counts": dict(self._counts),
+            "series": {name: series.to_dict() for name, series in self._series.items()},
+            "all": self._all.to_dict(),
+            "errors": list(self._recent_errors),
+        }
+
+    def _merged_state(self) -> dict[str, Any]:
+        with self._lock:
+            own = self._state()
+        states = [own]
+        if self._dir is not None:
+            own_file = f"metrics-{os.getpid()}.json"
+            for path in sorted(self._dir.glob("metrics-*.json")):
+                if path.name == own_file:
+                    continue
+                try:
+                    states.append(json.loads(path.read_text(encoding="utf-8")))
+                except (OSError, ValueError):
+                    logger.debug("Skipping unreadable metrics file %s", path)
+        counts: Counter[str] = Counter()
+        series: dict[str, LatencySeries] = {}
+        overall = LatencySeries()
+        errors: list[dict[str, object]] = []
+        for state in states:
+            counts.update(state["counts"])
+            for name, data in state["series"].items():
+                if name in series:
+                    series[name].merge(LatencySeries.from_dict(data))
+                else:
+                    series[name] = LatencySeries.from_dict(data)
+            overall.merge(LatencySeries.from_dict(state["all"]))
+            errors.extend(state["errors"])
+        if len(states) > 1:
+            errors = sorted(errors, key=lambda record: record["timestamp"])[-RECENT_ERROR_LIMIT:]
+        return {"counts": counts, "series": series, "all": overall, "errors": errors, "processes": len(states)}
+
+    def _ensure_flusher(self) -> None:
+        # One daemon thread per process; after a fork (gunicorn --preload) the child starts its own.
+        if self._dir is None or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name="rag-metrics-flush", daemon=True).start()
+
+    def _flush_loop(self) -> None:
+        pid = os.getpid()
+        while self._flusher_pid == pid:
+            time.sleep(self._flush_interval)
+            if self._dirty:
+                self.flush()
 
 
-metrics = Metrics()
+metrics = Metrics(
+    multiprocess_dir=getattr(settings, "metrics_multiprocess_dir", "") or None,
+    flush_interval=float(getattr(settings, "metrics_flush_interval_seconds", 5.0)),
+)
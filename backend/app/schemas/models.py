@@ -59,6 +59,11 @@ class RAGQueryRequest(BaseModel):
     max_tokens: int = 128
     use_rerank: bool = True
     search_type: SearchType = SearchType.hybrid
+    # ANN recall/latency knobs; unset falls back to settings.hnsw_ef_search / settings.ivfflat_probes.
+    ef_search: int | None = Field(None, ge=1, le=1000)
+    probes: int | None = Field(None, ge=1, le=10000)
+    # Adds a per-stage latency breakdown (`timings`) to the response.
+    include_timings: bool = False
 
 
 class RAGSource(BaseModel):
@@ -72,6 +77,9 @@ class RAGQueryResponse(BaseModel):
     answer: str
     sources: list[RAGSource]
     latency_ms: int
+    # Milliseconds per stage (embedding, retrieval_cache, search, sql, rerank, prompt, llm, ...)
+    # plus total; sql is part of search. Only set when the request asks for it.
+    timings: dict[str, float] | None = None
 
 
 class TokenRequest(BaseModel):
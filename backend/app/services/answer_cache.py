@@ -0,0 +1,186 @@
+"""Opt-in cache of /rag/query answers, scoped per tenant and knowledge base.
+
+A question is answered from the cache when a previous question to the same KB, with the
+same retrieval and generation parameters, matches either by normalized text or by query
+embedding cosine similarity of at least ``answer_cache_similarity_threshold``.
+
+Entries are keyed by the KB's ``content_version`` (see ``app.services.kb_versions``), so a
+document becoming READY or FAILED, or being deleted, invalidates the KB's answers in every
+API process on its next lookup. Entries also expire after ``answer_cache_ttl_seconds`` and
+the least recently used are evicted beyond ``answer_cache_max_entries``.
+"""
+
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+from app.observability import answer_cache_entries, answer_cache_requests_total
+from app.schemas.models import RAGSource
+
+Scope = tuple[uuid.UUID, uuid.UUID, int, Hashable]
+
+_PUNCTUATION_EDGES = re.compile(r"^[\W_]+|[\W_]+$")
+
+
+def normalize_query(text: str) -> str:
+    """Lowercased, whitespace-collapsed, without leading/trailing punctuation."""
+    return _PUNCTUATION_EDGES.sub("", " ".join(text.lower().split()))
+
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    sources: list[RAGSource]
+    vector: Optional[np.ndarray]
+    expires_at: float
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 3600, similarity_threshold: float = 0.95) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        # scope -> normalized query -> entry; scopes are LRU-ordered by their entries' use.
+        self._scopes: dict[Scope, OrderedDict[str, CachedAnswer]] = {}
+        self._lru: OrderedDict[tuple[Scope, str], None] = OrderedDict()
+        self._versions: dict[tuple[uuid.UUID, uuid.UUID], int] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        tenant_id: uuid.UUID,
+        kb_id: uuid.UUID,
+        version: int,
+        params: Hashable,
+        query: str,
+        query_vec: Optional[Sequence[float]] = None,
+    ) -> Optional[CachedAnswer]:
+        scope = (tenant_id, kb_id, version, params)
+        normalized = normalize_query(query)
+        now = time.monotonic()
+        with self._lock:
+            self._observe_version(tenant_id, kb_id, version)
+            entries = self._scopes.get(scope)
+            entry, outcome = None, "miss"
+            if entries:
+                entry = entries.get(normalized)
+                if entry is not None and entry.expires_at > now:
+                    outcome = "exact"
+                else:
+                    entry, normalized = self._nearest(entries, query_vec, now)
+                    if entry is not None:
+                        outcome = "semantic"
+            if entry is not None:
+                self._lru.move_to_end((scope, normalized))
+        answer_cache_requests_total.labels(outcome).inc()
+        return entry
+
+    def put(
+        self,
+        tenant_id: uuid.UUID,
+        kb_id: uuid.UUID,
+        version: int,
+        params: Hashable,
+        query: str,
+        answer: str,
+        sources: list[RAGSource],
+        query_vec: Optional[Sequence[float]] = None,
+    ) -> None:
+        scope = (tenant_id, kb_id, version, params)
+        normalized = normalize_query(query)
+        entry = CachedAnswer(answer, list(sources), _unit(query_vec), time.monotonic() + self.ttl_seconds)
+        with self._lock:
+            if self._observe_version(tenant_id, kb_id, version) > version:
+                return  # Answered from content that has changed since.
+            self._scopes.setdefault(scope, OrderedDict())[normalized] = entry
+            self._lru[(scope, normalized)] = None
+            self._lru.move_to_end((scope, normalized))
+            while len(self._lru) > self.max_entries:
+                (old_scope, old_query), _ = self._lru.popitem(last=False)
+                self._remove(old_scope, old_query)
+            size = len(self._lru)
+        answer_cache_entries.set(size)
+
+    def invalidate(self, tenant_id: uuid.UUID, kb_id: uuid.UUID) -> None:
+        with self._lock:
+            self._drop_kb(tenant_id, kb_id, keep_version=None)
+            self._versions.pop((tenant_id, kb_id), None)
+            size = len(self._lru)
+        answer_cache_entries.set(size)
+
+    def stats(self) -> dict[str, Any]:
+        return {"entries": len(self._lru), "scopes": len(self._scopes), "max_entries": self.max_entries}
+
+    def _nearest(
+        self, entries: OrderedDict[str, CachedAnswer], query_vec: Optional[Sequence[float]], now: float
+    ) -> tuple[Optional[CachedAnswer], str]:
+        target = _unit(query_vec)
+        if target is None:
+            return None, ""
+        candidates = [(query, entry) for query, entry in entries.items() if entry.vector is not None and entry.expires_at > now]
+        if not candidates:
+            return None, ""
+        similarities = np.stack([entry.vector for _, entry in candidates]) @ target
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None, ""
+        query, entry = candidates[best]
+        return entry, query
+
+    def _observe_version(self, tenant_id: uuid.UUID, kb_id: uuid.UUID, version: int) -> int:
+        # A newer version makes every older scope of the KB unreachable; free them right away.
+        latest = self._versions.get((tenant_id, kb_id))
+        if latest is None or version > latest:
+            self._versions[(tenant_id, kb_id)] = version
+            if latest is not None:
+                self._drop_kb(tenant_id, kb_id, keep_version=version)
+            return version
+        return latest
+
+    def _drop_kb(self, tenant_id: uuid.UUID, kb_id: uuid.UUID, keep_version: Optional[int]) -> None:
+        for scope in [s for s in self._scopes if s[0] == tenant_id and s[1] == kb_id and s[2] != keep_version]:
+            for query in self._scopes.pop(scope):
+                self._lru.pop((scope, query), None)
+
+    def _remove(self, scope: Scope, query: str) -> None:
+        entries = self._scopes.get(scope)
+        if entries is None:
+            return
+        entries.pop(query, None)
+        if not entries:
+            del self._scopes[scope]
+
+
+def _unit(vector: Optional[Sequence[float]]) -> Optional[np.ndarray]:
+    if vector is None:
+        return None
+    array = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(array))
+    return array / norm if norm else None
+
+
+_cache: Optional[AnswerCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """The process-wide cache, or None unless ``answer_cache_enabled`` is set."""
+    global _cache
+    if not getattr(settings, "answer_cache_enabled", False):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnswerCache(
+                    max_entries=int(getattr(settings, "answer_cache_max_entries", 10000)),
+                    ttl_seconds=float(getattr(settings, "answer_cache_ttl_seconds", 3600)),
+                    similarity_threshold=float(getattr(settings, "answer_cache_similarity_threshold", 0.95)),
+                )
+    return _cache
@@ -0,0 +1,80 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+from app.observability import embedding_batch_size, embedding_batch_wait_ms, embedding_queue_depth
+
+logger = logging.getLogger(__name__)
+
+EncodeFn = Callable[[list[str]], list[list[float]]]
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-text embedding calls into batched encode calls.
+
+    Callers submit one text and receive a Future. A daemon thread takes the first pending
+    request, then keeps collecting until either ``max_batch_size`` texts are queued or
+    ``max_wait_ms`` has passed since that first request, and encodes the batch in one call.
+    """
+
+    def __init__(self, encode: EncodeFn, max_batch_size: int = 32, max_wait_ms: float = 2.0) -> None:
+        self._encode = encode
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_s = max(0.0, float(max_wait_ms)) / 1000
+        self._queue: queue.Queue[tuple[str, Future, float]] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def submit(self, text: str) -> "Future[list[float]]":
+        future: Future[list[float]] = Future()
+        embedding_queue_depth.observe(self._queue.qsize())
+        self._queue.put((text, future, time.monotonic()))
+        self._ensure_worker()
+        return future
+
+    def embed(self, text: str, timeout: float | None = None) -> list[float]:
+        return self.submit(text).result(timeout=timeout)
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> list[tuple[str, Future, float]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            # Drop callers that gave up (cancelled futures) before spending compute on them.
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            embedding_batch_size.observe(len(batch))
+            embedding_batch_wait_ms.observe((time.monotonic() - batch[0][2]) * 1000)
+            try:
+                vectors = self._encode([text for text, _, _ in batch])
+                if len(vectors) != len(batch):
+                    raise RuntimeError(f"Embedding model returned {len(vectors)} vectors for {len(batch)} texts")
+            except Exception as exc:  # noqa: BLE001 - surfaced to every caller in the batch
+                logger.error("Embedding batch of %s failed: %s", len(batch), exc)
+                for _, future, _ in batch:
+                    future.set_exception(exc)
+                continue
+            for (_, future, _), vector in zip(batch, vectors):
+                future.set_result(vector)
@@ -0,0 +1,224 @@
+"""Two-tier cache of text embeddings.
+
+Keys are derived from the model name, the normalization flag and a hash of the
+whitespace-normalized text, so any change to how vectors are produced misses instead of
+returning stale vectors.
+
+- Memory tier: a per-process LRU bounded by ``embedding_cache_memory_mb``.
+- Disk tier (optional, ``embedding_cache_path``): a SQLite file in WAL mode that API and
+  ingestion worker processes on the same host can share. It is trimmed oldest-first once it
+  exceeds ``embedding_cache_disk_max_mb``. Keep it on a local disk; SQLite locking is not
+  reliable on network filesystems.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+from app.observability import embedding_cache_bytes, embedding_cache_evictions_total, embedding_cache_requests_total
+
+logger = logging.getLogger(__name__)
+
+# Rough per-entry overhead of the key, OrderedDict node and ndarray header.
+ENTRY_OVERHEAD_BYTES = 200
+# The disk tier checks its size every this many inserted rows.
+DISK_TRIM_INTERVAL = 1000
+# Fraction of the disk budget kept after a trim, so trims do not run on every check.
+DISK_TRIM_TARGET = 0.9
+
+
+def cache_key(model: str, normalize: bool, text: str) -> str:
+    normalized = " ".join(text.split())
+    return hashlib.sha256(f"{model}\0{int(normalize)}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+class MemoryTier:
+    """Thread-safe LRU of vectors with a byte budget."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+            return vector
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        size = vector.nbytes + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        evicted = 0
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes + ENTRY_OVERHEAD_BYTES
+            self._entries[key] = vector
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self._bytes -= old.nbytes + ENTRY_OVERHEAD_BYTES
+                evicted += 1
+            current = self._bytes
+        if evicted:
+            embedding_cache_evictions_total.labels("memory").inc(evicted)
+        embedding_cache_bytes.labels("memory").set(current)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        embedding_cache_bytes.labels("memory").set(0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DiskTier:
+    """SQLite-backed store shared by the processes of one host."""
+
+    def __init__(self, path: Path, max_bytes: int) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._inserted = 0
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, dtype TEXT NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_created_at ON embeddings (created_at)")
+
+    def get_many(self, keys: Sequence[str]) -> dict[str, np.ndarray]:
+        found: dict[str, np.ndarray] = {}
+        conn = self._connection()
+        # SQLite caps bound parameters (999 on older builds).
+        for start in range(0, len(keys), 500):
+            batch = keys[start : start + 500]
+            rows = conn.execute(
+                f"SELECT key, dtype, vector FROM embeddings WHERE key IN ({', '.join('?' * len(batch))})", batch
+            )
+            for key, dtype, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=dtype)
+        return found
+
+    def put_many(self, items: Iterable[tuple[str, np.ndarray]]) -> None:
+        now = time.time()
+        rows = [(key, vector.dtype.str, vector.tobytes(), now) for key, vector in items]
+        if not rows:
+            return
+        conn = self._connection()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO embeddings (key, dtype, vector, created_at) VALUES (?, ?, ?, ?)", rows)
+        with self._lock:
+            self._inserted += len(rows)
+            due = self._inserted >= DISK_TRIM_INTERVAL
+            if due:
+                self._inserted = 0
+        if due:
+            self.trim()
+
+    def trim(self) -> int:
+        """Delete the oldest rows until the stored vectors fit the budget; returns rows removed."""
+        conn = self._connection()
+        count, stored = conn.execute("SELECT count(*), coalesce(sum(length(vector)), 0) FROM embeddings").fetchone()
+        if stored <= self.max_bytes or not count:
+            return 0
+        excess = stored - int(self.max_bytes * DISK_TRIM_TARGET)
+        remove = min(count, int(excess / (stored / count)) + 1)
+        with conn:
+            conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY created_at, rowid LIMIT ?)", (remove,)
+            )
+        embedding_cache_evictions_total.labels("disk").inc(remove)
+        return remove
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+        # WAL lets readers in other processes proceed while one process writes.
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+
+class EmbeddingCache:
+    def __init__(self, memory: MemoryTier, disk: Optional[DiskTier] = None) -> None:
+        self.memory = memory
+        self.disk = disk
+
+    def get_many(self, keys: Sequence[str]) -> dict[str, np.ndarray]:
+        found: dict[str, np.ndarray] = {}
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is not None:
+                found[key] = vector
+        embedding_cache_requests_total.labels("memory", "hit").inc(len(found))
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        embedding_cache_requests_total.labels("memory", "miss").inc(len(missing))
+        if self.disk is not None and missing:
+            try:
+                from_disk = self.disk.get_many(missing)
+            except sqlite3.Error:
+                logger.warning("Embedding cache read from %s failed", self.disk.path, exc_info=True)
+                from_disk = {}
+            embedding_cache_requests_total.labels("disk", "hit").inc(len(from_disk))
+            embedding_cache_requests_total.labels("disk", "miss").inc(len(missing) - len(from_disk))
+            for key, vector in from_disk.items():
+                self.memory.put(key, vector)
+            found.update(from_disk)
+        return found
+
+    def put_many(self, items: Sequence[tuple[str, np.ndarray]]) -> None:
+        # Own copies: rows of a batch matrix would otherwise keep the whole matrix alive.
+        items = [(key, np.array(vector, dtype=np.float32)) for key, vector in items]
+        for key, vector in items:
+            self.memory.put(key, vector)
+        if self.disk is not None:
+            try:
+                self.disk.put_many(items)
+            except sqlite3.Error:
+                # A busy or unwritable store only costs future hits; the vectors are already computed.
+                logger.warning("Embedding cache write to %s failed", self.disk.path, exc_info=True)
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """The process-wide cache, or None when ``embedding_cache_enabled`` is false."""
+    global _cache
+    if not getattr(settings, "embedding_cache_enabled", True):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                memory = MemoryTier(int(float(getattr(settings, "embedding_cache_memory_mb", 64)) * 1024 * 1024))
+                path = getattr(settings, "embedding_cache_path", "") or ""
+                disk = None
+                if path:
+                    max_mb = float(getattr(settings, "embedding_cache_disk_max_mb", 1024))
+                    disk = DiskTier(Path(path), int(max_mb * 1024 * 1024))
+                _cache = EmbeddingCache(memory, disk)
+    return _cache
@@ -1,19 +1,72 @@
-from functools import cached_property
-from typing import Iterable
+import asyncio
+import threading
+from typing import TYPE_CHECKING, Iterable, Union
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
+from app import tracing
 from app.core.config import settings
+from app.core.executors import run_inference
+from app.services import inference_backends
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embedding_cache import cache_key, get_embedding_cache
+from app.services.model_registry import model_registry
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+    from app.services.inference_backends import OnnxEncoder
+
+# One micro-batcher per model so concurrent query embeddings share a forward pass.
+_batchers: dict[str, EmbeddingBatcher] = {}
+_batchers_lock = threading.Lock()
 
 
 class EmbeddingService:
     def __init__(self) -> None:
         self.settings = settings
 
-    @cached_property
-    def model(self) -> SentenceTransformer:
-        model = SentenceTransformer(self.settings.EMBEDDING_MODEL_NAME)
+    @property
+    def model_name(self) -> str:
+        return self.settings.EMBEDDING_MODEL_NAME
+
+    @property
+    def device(self) -> str | None:
+        return getattr(self.settings, "embedding_device", None) or None
+
+    @property
+    def backend(self) -> str:
+        return inference_backends.backend_for("embedding")
+
+    @property
+    def cache_model_id(self) -> str:
+        # Vectors differ between backends (quantized ONNX, stub); keep them apart in the cache.
+        if self.backend == "onnx":
+            return f"{self.model_name}@onnx{'-int8' if getattr(self.settings, 'onnx_quantize', True) else ''}"
+        if self.backend == "stub":
+            return f"{self.model_name}@stub"
+        return self.model_name
+
+    @property
+    def model(self) -> Union["SentenceTransformer", "OnnxEncoder"]:
+        # Shared across every EmbeddingService instance in the process; loaded once on first use.
+        return model_registry.get("embedding", self.model_name, self._load_model, device=self._registry_device)
+
+    def model_state(self) -> str:
+        return model_registry.state("embedding", self.model_name, device=self._registry_device)
+
+    @property
+    def _registry_device(self) -> str | None:
+        return self.device if self.backend == "torch" else self.backend
+
+    def _load_model(self) -> Union["SentenceTransformer", "OnnxEncoder"]:
+        if self.backend != "torch":
+            model = inference_backends.load_model("embedding", self.model_name)
+        else:
+            from sentence_transformers import SentenceTransformer
+
+            inference_backends.configure_torch_threads()
+            model = SentenceTransformer(self.model_name, device=self.device)
         # Validate embedding dimension to match PGVector column.
         dim = model.get_sentence_embedding_dimension()
         if dim != self.settings.VECTOR_DIMENSION:
@@ -23,6 +76,63 @@ class EmbeddingService:
             )
         return model
 
+    def embed_array(self, texts: Iterable[str]) -> np.ndarray:
+        """Embeddings as one float32 matrix; bulk writers encode rows straight from it.
+
+        Texts found in the embedding cache are not encoded again.
+        """
+        texts = list(texts)
+        with tracing.span("embedding.embed", stage="embedding", texts=len(texts)):
+            return self._embed_array(texts)
+
+    def _embed_array(self, texts: list[str]) -> np.ndarray:
+        cache = get_embedding_cache()
+        if cache is None or not texts:
+            return self._encode(texts)
+        normalize = bool(self.settings.NORMALIZE_EMBEDDINGS)
+        keys = [cache_key(self.cache_model_id, normalize, text) for text in texts]
+        known = cache.get_many(keys)
+        # Each distinct missing text is encoded once, even if it repeats within the batch.
+        missing = {key: text for key, text in zip(keys, texts) if key not in known}
+        if missing:
+            encoded = self._encode(list(missing.values()))
+            fresh = list(zip(missing, encoded))
+            cache.put_many(fresh)
+            known.update(fresh)
+        return np.stack([known[key] for key in keys]).astype(np.float32, copy=False)
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        embeddings = self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=self.settings.NORMALIZE_EMBEDDINGS)
+        return np.asarray(embeddings, dtype=np.float32)
+
     def embed_texts(self, texts: Iterable[str]) -> list[list[float]]:
-        embeddings = self.model.encode(list(texts), convert_to_numpy=True, normalize_embeddings=self.settings.NORMALIZE_EMBEDDINGS)
-        return np.asarray(embeddings, dtype=np.float32).tolist()
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embed a single query, coalesced with concurrent callers when batching is enabled."""
+        if not getattr(self.settings, "embedding_batching_enabled", True):
+            return self.embed_texts([text])[0]
+        # The batch is encoded on the batcher's thread; this span covers the wait for it.
+        with tracing.span("embedding.query", stage="embedding", batched=True):
+            return self._batcher().embed(text)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        """Awaitable `embed_query`; waits on the batcher without tying up a pool thread."""
+        if not getattr(self.settings, "embedding_batching_enabled", True):
+            return (await run_inference(self.embed_texts, [text]))[0]
+        with tracing.span("embedding.query", stage="embedding", batched=True):
+            return await asyncio.wrap_future(self._batcher().submit(text))
+
+    def _batcher(self) -> EmbeddingBatcher:
+        batcher = _batchers.get(self.model_name)
+        if batcher is None:
+            with _batchers_lock:
+                batcher = _batchers.get(self.model_name)
+                if batcher is None:
+                    batcher = EmbeddingBatcher(
+                        self.embed_texts,
+                        max_batch_size=int(getattr(self.settings, "embedding_batch_max_size", 32)),
+                        max_wait_ms=float(getattr(self.settings, "embedding_batch_max_wait_ms", 2)),
+                    )
+                    _batchers[self.model_name] = batcher
+        return batcher
@@ -0,0 +1,172 @@
+"""Process pool for CPU-bound document parsing.
+
+pypdf, python-docx, python-pptx and BeautifulSoup are pure Python, so parsing in the ingestion
+worker holds the GIL that embedding and database work also need. The pool parses in separate
+processes instead:
+- PDFs and PPTX files are split into ranges of ``ingest_extract_units_per_task`` pages or
+  slides, so one large file is parsed on several cores; results are still yielded in order.
+- Each file has a deadline (``ingest_extract_timeout_seconds``), enforced by an alarm inside
+  the task and, for a task stuck in C code, by killing the pool's processes.
+- Processes are capped at ``ingest_extract_memory_limit_mb`` of address space and replaced
+  after ``ingest_extract_max_tasks_per_child`` tasks to contain parser memory leaks.
+"""
+
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Iterator, Optional, TypeVar, Union
+
+from app.core.config import settings
+from app.observability import extraction_failures_total
+from app.services import extractors
+from app.services.extractors import Block, ExtractionTimeout
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Extra wait for a task to honour its in-process alarm before the pool is torn down.
+HARD_TIMEOUT_GRACE_SECONDS = 5.0
+
+
+class ExtractionPool:
+    def __init__(
+        self,
+        processes: int,
+        units_per_task: int = 16,
+        max_tasks_per_child: int = 100,
+        timeout_seconds: float = 300.0,
+        memory_limit_mb: int = 0,
+    ) -> None:
+        self.processes = processes
+        self.units_per_task = max(1, units_per_task)
+        self.max_tasks_per_child = max_tasks_per_child
+        self.timeout_seconds = timeout_seconds
+        self.memory_limit_mb = memory_limit_mb
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def iter_blocks(self, fmt: str, source: Union[bytes, os.PathLike]) -> Iterator[Block]:
+        """Blocks of ``source`` in document order, parsed in pool processes."""
+        deadline = time.monotonic() + self.timeout_seconds
+        payload = source if isinstance(source, (bytes, bytearray)) else os.fspath(source)
+        if fmt not in extractors.PAGED_FORMATS:
+            yield from self._result(fmt, self._submit(deadline, extractors.extract_range, fmt, payload), deadline)
+            return
+
+        total = self._result(fmt, self._submit(deadline, extractors.count_units, fmt, payload), deadline)
+        starts = iter(range(0, total, self.units_per_task))
+        # Only a few ranges ahead of the consumer are in flight, so parsed text stays bounded.
+        pending: deque[Future] = deque(
+            self._submit(deadline, extractors.extract_range, fmt, payload, start, start + self.units_per_task)
+            for start in itertools.islice(starts, self.processes * 2)
+        )
+        try:
+            while pending:
+                blocks = self._result(fmt, pending.popleft(), deadline)
+                for start in itertools.islice(starts, 1):
+                    pending.append(
+                        self._submit(deadline, extractors.extract_range, fmt, payload, start, start + self.units_per_task)
+                    )
+                yield from blocks
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, deadline: float, fn: Callable[..., T], *args: Any) -> "Future[T]":
+        # Tasks get the deadline in wall-clock time, the only clock shared with the pool processes.
+        wall_deadline = time.time() + (deadline - time.monotonic())
+        try:
+            return self._pool().submit(fn, *args, deadline=wall_deadline)
+        except BrokenProcessPool:
+            self._recycle()
+            return self._pool().submit(fn, *args, deadline=wall_deadline)
+
+    def _result(self, fmt: str, future: "Future[T]", deadline: float) -> T:
+        wait = max(deadline - time.monotonic(), 0) + HARD_TIMEOUT_GRACE_SECONDS
+        try:
+            return future.result(timeout=wait)
+        except ExtractionTimeout as exc:
+            extraction_failures_total.labels(fmt, "timeout").inc()
+            raise ValueError(f"Extraction timed out after {self.timeout_seconds:g}s") from exc
+        except TimeoutError as exc:
+            # The task ignored its alarm (stuck in C code); killing its process is the only way out.
+            extraction_failures_total.labels(fmt, "timeout").inc()
+            logger.warning("Extraction task for a %s file is unresponsive; restarting the extraction pool", fmt)
+            self._recycle(kill=True)
+            raise ValueError(f"Extraction timed out after {self.timeout_seconds:g}s") from exc
+        except MemoryError as exc:
+            extraction_failures_total.labels(fmt, "memory").inc()
+            raise ValueError(f"Extraction exceeded the {self.memory_limit_mb} MB memory limit") from exc
+        except BrokenProcessPool as exc:
+            extraction_failures_total.labels(fmt, "crash").inc()
+            self._recycle()
+            raise ValueError("Extraction process died (killed or out of memory)") from exc
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    # spawn: forked children would inherit the parent's threads, locks and loaded models.
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=extractors.init_worker,
+                    initargs=(self.memory_limit_mb,),
+                    max_tasks_per_child=self.max_tasks_per_child or None,
+                )
+            return self._executor
+
+    def _recycle(self, kill: bool = False) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        if kill:
+            # No public API terminates busy workers; tasks of other files running in the pool fail
+            # with BrokenProcessPool and their jobs are retried by the queue.
+            for process in list(getattr(executor, "_processes", {}).values()):
+                process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool: Optional[ExtractionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_extraction_pool() -> Optional[ExtractionPool]:
+    """The process-wide pool, or None when ``ingest_extract_processes`` is 0 (parse in-process)."""
+    global _pool
+    processes = int(getattr(settings, "ingest_extract_processes", 0) or 0)
+    if processes <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ExtractionPool(
+                    processes,
+                    units_per_task=int(getattr(settings, "ingest_extract_units_per_task", 16)),
+                    max_tasks_per_child=int(getattr(settings, "ingest_extract_max_tasks_per_child", 100)),
+                    timeout_seconds=float(getattr(settings, "ingest_extract_timeout_seconds", 300)),
+                    memory_limit_mb=int(getattr(settings, "ingest_extract_memory_limit_mb", 0)),
+                )
+    return _pool
+
+
+def shutdown_extraction_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
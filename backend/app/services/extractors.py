@@ -0,0 +1,165 @@
+"""Format parsers for ingestion, run in-process or inside the extraction pool.
+
+Kept free of app configuration, database and web imports so pool processes start quickly;
+each parser library is imported on first use of its format. Paged formats (PDF pages, PPTX slides) can be parsed a
+range of units at a time, which is what lets one large file spread across processes.
+"""
+
+import io
+import itertools
+import os
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from http import HTTPStatus
+from typing import BinaryIO, Dict, Iterator, Optional, Union
+
+from app.core.exceptions import AppException
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None  # type: ignore[assignment]
+
+# Upload content: raw bytes, a path to a spooled file, or an open binary file handle.
+Source = Union[bytes, os.PathLike, BinaryIO]
+# Extractors yield plain text segments (pages, slides, paragraphs), or for HTML structured
+# blocks of the form {"type": "h2", "content": "..."}.
+Block = Union[str, Dict[str, str]]
+
+HTML_BLOCK_TAGS = ["h1", "h2", "h3", "h4", "h5", "h6", "p", "li"]
+PAGED_FORMATS = {".pdf", ".pptx"}
+FORMATS = PAGED_FORMATS | {".docx", ".html", ".htm"}
+
+
+class ExtractionTimeout(ValueError):
+    """Raised inside a pool process when a file's extraction deadline passes."""
+
+
+def iter_blocks(fmt: str, handle: BinaryIO, start: int = 0, stop: Optional[int] = None) -> Iterator[Block]:
+    """Blocks of ``handle`` in document order; ``start``/``stop`` select pages or slides."""
+    if fmt == ".pdf":
+        reader = _pdf_reader(handle)
+        for index in range(start, len(reader.pages) if stop is None else min(stop, len(reader.pages))):
+            yield reader.pages[index].extract_text() or ""
+        return
+    if fmt == ".pptx":
+        for slide in itertools.islice(_presentation(handle).slides, start, stop):
+            text_runs = []
+            for shape in slide.shapes:
+                if not shape.has_text_frame:
+                    continue
+                for paragraph in shape.text_frame.paragraphs:
+                    for run in paragraph.runs:
+                        text_runs.append(run.text)
+            yield "\n".join(text_runs)
+        return
+    if fmt == ".docx":
+        try:
+            import docx
+        except ImportError as exc:  # pragma: no cover - runtime guard
+            raise AppException(detail="python-docx not installed", status_code=HTTPStatus.INTERNAL_SERVER_ERROR) from exc
+        for paragraph in docx.Document(handle).paragraphs:
+            yield paragraph.text
+        return
+    if fmt in {".html", ".htm"}:
+        try:
+            from bs4 import BeautifulSoup  # type: ignore[import-untyped]
+        except ImportError as exc:  # pragma: no cover - runtime guard
+            raise AppException(detail="beautifulsoup4 not installed", status_code=HTTPStatus.INTERNAL_SERVER_ERROR) from exc
+        soup = BeautifulSoup(handle, "html.parser")
+        for tag in soup(["script", "style", "head", "title", "meta", "link"]):
+            tag.decompose()
+
+        # Document order, so each paragraph is attributed to the heading above it.
+        for tag in soup.find_all(HTML_BLOCK_TAGS):
+            text = tag.get_text(separator=" ", strip=True)
+            if text:
+                yield {"type": tag.name, "content": text}
+        return
+    raise ValueError(f"Unsupported file type: {fmt or 'unknown'}")
+
+
+def unit_count(fmt: str, handle: BinaryIO) -> int:
+    """Pages or slides in a paged document."""
+    if fmt == ".pdf":
+        return len(_pdf_reader(handle).pages)
+    if fmt == ".pptx":
+        return len(_presentation(handle).slides)
+    raise ValueError(f"{fmt} is not a paged format")
+
+
+@contextmanager
+def open_source(data: Source) -> Iterator[BinaryIO]:
+    if isinstance(data, (bytes, bytearray)):
+        yield io.BytesIO(data)
+    elif isinstance(data, (str, os.PathLike)):
+        with open(data, "rb") as handle:
+            yield handle
+    else:
+        yield data
+
+
+# Entry points executed in extraction pool processes.
+
+
+def init_worker(memory_limit_mb: int) -> None:
+    # An address-space cap turns a runaway parser into a MemoryError instead of an OOM kill.
+    if memory_limit_mb and resource is not None:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def extract_range(
+    fmt: str, source: Union[bytes, str], start: int = 0, stop: Optional[int] = None, deadline: Optional[float] = None
+) -> list[Block]:
+    with _deadline(deadline), open_source(source) as handle:
+        return list(iter_blocks(fmt, handle, start, stop))
+
+
+def count_units(fmt: str, source: Union[bytes, str], deadline: Optional[float] = None) -> int:
+    with _deadline(deadline), open_source(source) as handle:
+        return unit_count(fmt, handle)
+
+
+@contextmanager
+def _deadline(deadline: Optional[float]) -> Iterator[None]:
+    """Interrupt the task at the ``time.time()`` ``deadline`` with ExtractionTimeout.
+
+    Pure-Python parsers check for signals between bytecodes, so the alarm stops them without
+    killing the process; the pool only terminates processes that ignore it.
+    """
+    if deadline is None or not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise ExtractionTimeout("Extraction deadline passed before the task started")
+
+    def expire(signum: int, frame: object) -> None:
+        raise ExtractionTimeout("Extraction deadline exceeded")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, remaining)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _pdf_reader(handle: BinaryIO):  # type: ignore[no-untyped-def]
+    try:
+        from pypdf import PdfReader
+    except ImportError as exc:  # pragma: no cover - runtime guard
+        raise AppException(detail="pypdf not installed", status_code=HTTPStatus.INTERNAL_SERVER_ERROR) from exc
+    return PdfReader(handle)
+
+
+def _presentation(handle: BinaryIO):  # type: ignore[no-untyped-def]
+    try:
+        import pptx
+    except ImportError as exc:  # pragma: no cover - runtime guard
+        raise AppException(detail="python-pptx not installed", status_code=HTTPStatus.INTERNAL_SERVER_ERROR) from exc
+    return pptx.Presentation(handle)
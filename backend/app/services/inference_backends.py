@@ -0,0 +1,302 @@
+"""Inference backends for the embedding and reranker models.
+
+``embedding_backend`` / ``reranker_backend`` select per model kind:
+- ``torch``: sentence-transformers on PyTorch (the default).
+- ``onnx``: ONNX Runtime on CPU. Models are exported once to ``onnx_model_dir`` (with int8
+  dynamic quantization when ``onnx_quantize`` is set) by ``scripts/export_onnx_models.py``
+  or, if torch is installed, on first load. Serving an exported model needs only
+  onnxruntime and the tokenizer, not torch.
+- ``stub``: deterministic hashed bag-of-words vectors and token-overlap scores. No model
+  is downloaded; meant for local runs and benchmarks, like the ``stub`` LLM provider.
+
+The ONNX and stub wrappers expose the subset of the SentenceTransformer / CrossEncoder API the
+services call (``encode``, ``predict``), so the rest of the code is backend-agnostic.
+Thread counts are set per backend: ``inference_torch_threads`` for the process-wide torch
+pool, ``inference_onnx_threads`` for each ONNX Runtime session.
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx", "stub")
+CONFIG_FILE = "rag_onnx.json"
+ONNX_OPSET = 14
+
+_torch_threads_lock = threading.Lock()
+_torch_threads_configured = False
+
+
+def backend_for(kind: str) -> str:
+    backend = (getattr(settings, f"{kind}_backend", "torch") or "torch").lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown {kind}_backend: {backend} (expected one of {', '.join(BACKENDS)})")
+    return backend
+
+
+def configure_torch_threads() -> None:
+    """Apply ``inference_torch_threads`` once per process, before the first torch model loads."""
+    global _torch_threads_configured
+    threads = int(getattr(settings, "inference_torch_threads", 0) or 0)
+    if threads <= 0 or _torch_threads_configured:
+        return
+    with _torch_threads_lock:
+        if not _torch_threads_configured:
+            import torch
+
+            torch.set_num_threads(threads)
+            _torch_threads_configured = True
+
+
+def onnx_model_dir(kind: str, model_name: str, quantize: bool) -> Path:
+    root = getattr(settings, "onnx_model_dir", "") or ""
+    base = Path(root) if root else Path(tempfile.gettempdir()) / "rag-onnx"
+    return base / kind / (model_name.replace("/", "__") + ("-int8" if quantize else ""))
+
+
+def load_model(kind: str, model_name: str) -> Any:
+    """The ``kind`` model ("embedding" or "reranker") for its configured non-torch backend."""
+    if backend_for(kind) == "stub":
+        return StubEncoder(int(settings.VECTOR_DIMENSION)) if kind == "embedding" else StubCrossEncoder()
+    return load_onnx_model(kind, model_name)
+
+
+def load_onnx_model(kind: str, model_name: str) -> "OnnxEncoder | OnnxCrossEncoder":
+    """The exported model for ``kind`` ("embedding" or "reranker"), exporting it if missing."""
+    quantize = bool(getattr(settings, "onnx_quantize", True))
+    directory = onnx_model_dir(kind, model_name, quantize)
+    if not (directory / CONFIG_FILE).exists():
+        logger.info("No ONNX export of %s in %s; exporting it now", model_name, directory)
+        export(kind, model_name, directory, quantize)
+    threads = int(getattr(settings, "inference_onnx_threads", 0) or 0)
+    if kind == "embedding":
+        return OnnxEncoder(directory, threads)
+    return OnnxCrossEncoder(directory, threads)
+
+
+class _OnnxModel:
+    def __init__(self, directory: Path, threads: int = 0) -> None:
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError as exc:
+            raise ImportError("The onnx backend needs onnxruntime and transformers: `pip install onnxruntime transformers`.") from exc
+
+        self.directory = directory
+        self.config = json.loads((directory / CONFIG_FILE).read_text())
+        self.max_length = int(self.config["max_length"])
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(directory / self.config["file"]), options, providers=["CPUExecutionProvider"])
+        self._input_names = [node.name for node in self.session.get_inputs()]
+
+    def _run(self, *texts: Sequence[str]) -> tuple[np.ndarray, np.ndarray]:
+        encoded = self.tokenizer(
+            *texts, padding=True, truncation="longest_first", max_length=self.max_length, return_tensors="np"
+        )
+        feed = {name: np.asarray(encoded[name], dtype=np.int64) for name in self._input_names}
+        return self.session.run(None, feed)[0], feed["attention_mask"]
+
+    @staticmethod
+    def _length_order(lengths: Sequence[int]) -> np.ndarray:
+        # Longest first, so each batch pads to similar lengths.
+        return np.argsort([-length for length in lengths], kind="stable")
+
+
+class OnnxEncoder(_OnnxModel):
+    """SentenceTransformer.encode on ONNX Runtime: transformer output, pooling, normalization."""
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self.config["dimension"])
+
+    def encode(
+        self,
+        sentences: Sequence[str],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False,
+        **_: Any,
+    ) -> np.ndarray:
+        sentences = list(sentences)
+        output = np.zeros((len(sentences), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        order = self._length_order([len(sentence) for sentence in sentences])
+        for start in range(0, len(order), batch_size):
+            batch = order[start : start + batch_size]
+            hidden, mask = self._run([sentences[i] for i in batch])
+            output[batch] = pool(hidden, mask, self.config["pooling"])
+        if normalize_embeddings or self.config.get("normalize"):
+            output = normalize(output)
+        return output
+
+
+class OnnxCrossEncoder(_OnnxModel):
+    """CrossEncoder.predict on ONNX Runtime, including its default sigmoid for single-label models."""
+
+    def predict(
+        self,
+        sentences: Sequence[Sequence[str]],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        show_progress_bar: bool = False,
+        **_: Any,
+    ) -> np.ndarray:
+        pairs = [tuple(pair) for pair in sentences]
+        num_labels = int(self.config.get("num_labels", 1))
+        scores = np.zeros((len(pairs), num_labels), dtype=np.float32)
+        order = self._length_order([len(query) + len(passage) for query, passage in pairs])
+        for start in range(0, len(order), batch_size):
+            batch = order[start : start + batch_size]
+            logits, _ = self._run([pairs[i][0] for i in batch], [pairs[i][1] for i in batch])
+            scores[batch] = logits
+        if num_labels == 1:
+            return 1.0 / (1.0 + np.exp(-scores[:, 0]))
+        return scores
+
+
+_TOKEN = re.compile(r"\w+")
+
+
+class StubEncoder:
+    """Sum of one fixed random vector per token: texts sharing words get similar embeddings."""
+
+    def __init__(self, dimension: int) -> None:
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, sentences: Sequence[str], convert_to_numpy: bool = True, normalize_embeddings: bool = False, **_: Any) -> np.ndarray:
+        output = np.zeros((len(sentences), self.dimension), dtype=np.float32)
+        for row, sentence in enumerate(sentences):
+            for token in _TOKEN.findall(sentence.lower()):
+                output[row] += _token_vector(token, self.dimension)
+        # Always unit length, so inner product and cosine rank the same.
+        return normalize(output)
+
+
+class StubCrossEncoder:
+    """Fraction of query tokens found in the passage."""
+
+    max_length = 512
+
+    def predict(self, sentences: Sequence[Sequence[str]], convert_to_numpy: bool = True, **_: Any) -> np.ndarray:
+        scores = np.zeros(len(sentences), dtype=np.float32)
+        for row, (query, passage) in enumerate(sentences):
+            query_tokens = set(_TOKEN.findall(query.lower()))
+            if query_tokens:
+                scores[row] = len(query_tokens & set(_TOKEN.findall(passage.lower()))) / len(query_tokens)
+        return scores
+
+
+@functools.lru_cache(maxsize=100_000)
+def _token_vector(token: str, dimension: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+    return np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+
+
+def pool(hidden: np.ndarray, mask: np.ndarray, mode: str) -> np.ndarray:
+    if mode == "cls":
+        return hidden[:, 0]
+    weights = mask[..., None].astype(np.float32)
+    if mode == "max":
+        return np.where(weights > 0, hidden, -1e9).max(axis=1)
+    return (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+
+def export(kind: str, model_name: str, directory: Path, quantize: bool = True) -> Path:
+    """Export the torch model to ONNX (needs torch and sentence-transformers), optionally int8."""
+    import torch
+
+    if kind == "embedding":
+        from sentence_transformers import SentenceTransformer
+
+        st_model = SentenceTransformer(model_name, device="cpu")
+        network, tokenizer = st_model[0].auto_model, st_model.tokenizer
+        config: dict[str, Any] = {
+            "max_length": st_model.max_seq_length,
+            "dimension": st_model.get_sentence_embedding_dimension(),
+            "pooling": _pooling_mode(st_model),
+            "normalize": any(type(module).__name__ == "Normalize" for module in st_model),
+        }
+        output_name, sample = "last_hidden_state", tokenizer(["sample text"], return_tensors="pt")
+    elif kind == "reranker":
+        from sentence_transformers.cross_encoder import CrossEncoder
+
+        cross_encoder = CrossEncoder(model_name, device="cpu")
+        network, tokenizer = cross_encoder.model, cross_encoder.tokenizer
+        config = {
+            "max_length": cross_encoder.max_length or tokenizer.model_max_length,
+            "num_labels": cross_encoder.config.num_labels,
+        }
+        output_name, sample = "logits", tokenizer(["query"], ["passage text"], return_tensors="pt")
+    else:
+        raise ValueError(f"Unknown model kind: {kind}")
+
+    # Write next to the target and swap it in, so concurrent loaders never see a partial export.
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{directory.name}-", dir=directory.parent))
+    try:
+        input_names = list(sample.keys())
+        network.eval()
+        with torch.no_grad():
+            torch.onnx.export(
+                network,
+                (dict(sample),),
+                str(staging / "model.onnx"),
+                input_names=input_names,
+                output_names=[output_name],
+                dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names} | {output_name: {0: "batch"}},
+                opset_version=ONNX_OPSET,
+            )
+        config["file"] = "model.onnx"
+        if quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            quantize_dynamic(str(staging / "model.onnx"), str(staging / "model.int8.onnx"), weight_type=QuantType.QInt8)
+            (staging / "model.onnx").unlink()
+            config["file"] = "model.int8.onnx"
+        tokenizer.save_pretrained(staging)
+        (staging / CONFIG_FILE).write_text(json.dumps({**config, "model_name": model_name}))
+        try:
+            os.rename(staging, directory)
+        except OSError:
+            if not (directory / CONFIG_FILE).exists():
+                raise
+            # Another process finished the same export first.
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return directory
+
+
+def _pooling_mode(st_model: Any) -> str:
+    for module in st_model:
+        if type(module).__name__ == "Pooling":
+            config = module.get_config_dict()
+            if config.get("pooling_mode_cls_token"):
+                return "cls"
+            if config.get("pooling_mode_max_tokens"):
+                return "max"
+            return "mean"
+    return "mean"
@@ -1,34 +1,42 @@
+import hashlib
 import io
+import itertools
 import logging
+import os
+import re
+import time
 from pathlib import Path
-from typing import Iterable, Optional, Union, List, Dict
-from uuid import UUID
+from typing import BinaryIO, Iterable, Iterator, Optional, Dict
+from uuid import UUID, uuid4
 
-import requests
-from fastapi import status
-from bs4 import BeautifulSoup  # type: ignore[import-untyped]
+import numpy as np
 from sqlalchemy.orm import Session
 
-from app.core.exceptions import AppException
-from app.models.entities import Chunk, Document
+from app.core.config import settings
+from app.models.entities import Document
+from app.observability import extraction_bytes_total, extraction_units_per_second, extraction_units_total, ingest_chunks_total
+from app.services import extractors, kb_versions
+from app.services.chunk_writer import ChunkWriter, chunk_hash
 from app.services.embeddings import EmbeddingService
+from app.services.extraction_pool import get_extraction_pool
+from app.services.extractors import Block, Source
 
 logger = logging.getLogger(__name__)
 
+TEXT_FORMATS = {".txt", ".md", ".text"}
+TEXT_READ_CHARS = 64 * 1024
+
 
 class IngestionPipeline:
     def __init__(self, db: Session) -> None:
         self.db = db
         self.embedder = EmbeddingService()
 
-    def process_uploaded_file(self, document: Document, file_bytes: bytes) -> None:
+    def process_uploaded_file(self, document: Document, source: Source, content_hash: Optional[str] = None) -> None:
         try:
-            extracted_content = self._extract_text(document.filename, file_bytes)
-            chunks = self._chunk_content(extracted_content)
-            if not chunks:
-                raise ValueError("No text found in document")
-            self._increment_attempt(document)
-            self.process_document(document, chunks)
+            if content_hash is None:
+                content_hash = file_hash(source)
+            self._ingest(document, self._iter_text(document.filename, source), content_hash)
         except Exception as e:
             logger.error(
                 f"Failed to process document {document.id} for tenant {document.tenant_id}: {e}",
@@ -38,12 +46,7 @@ class IngestionPipeline:
 
     def process_url(self, document: Document) -> None:
         try:
-            extracted_content = self._extract_text(document.filename)
-            chunks = self._chunk_content(extracted_content)
-            if not chunks:
-                raise ValueError("No text found in document")
-            self._increment_attempt(document)
-            self.process_document(document, chunks)
+            self._ingest(document, self._iter_text(document.filename))
         except Exception as e:
             logger.error(
                 f"Failed to process document {document.id} for tenant {document.tenant_id}: {e}",
@@ -51,38 +54,122 @@ class IngestionPipeline:
             )
             self.mark_failed(document.id, str(e))
 
-    def process_document(self, document: Document, chunks: list[str]) -> None:
-        embeddings = self.embedder.embed_texts(chunks)
-        with self.db.begin():
-            # If retrying, clear prior chunks for this document to avoid duplicates.
-            self.db.query(Chunk).filter(Chunk.document_id == document.id, Chunk.tenant_id == document.tenant_id).delete(synchronize_session=False)
-            chunk_records = []
-            for content, embedding in zip(chunks, embeddings):
-                chunk_records.append(
-                    Chunk(
-                        tenant_id=document.tenant_id,
-                        kb_id=document.kb_id,
-                        document_id=document.id,
-                        content=content,
-                        embedding=embedding,
-                    )
+    def _ingest(self, document: Document, blocks: Iterable[Block], content_hash: Optional[str] = None) -> None:
+        self._increment_attempt(document)
+        if not self.process_document(document, self._iter_chunks(blocks), content_hash):
+            raise ValueError("No text found in document")
+
+    def process_document(self, document: Document, chunks: Iterable[str], content_hash: Optional[str] = None) -> int:
+        """Embed and store ``chunks`` batch by batch; returns the document's chunk count.
+
+        Each batch is committed as soon as it is written, so memory stays bounded by the batch
+        size and the start of a large document is searchable while the rest is processed.
+        The document only becomes READY once every chunk is stored.
+
+        On re-ingestion, chunks whose hash matches one of the document's current rows keep
+        that row; new chunks reuse any embedding stored in the KB under the same hash, and
+        only the remainder is embedded. Kept rows that moved get their new ordinal in the same
+        transaction that marks the document READY. If the run fails, only the rows it inserted
+        are removed, so the previous generation stays in place.
+        """
+        batch_size = max(1, int(getattr(settings, "ingest_embed_batch_size", 64)))
+        writer = ChunkWriter(self.db)
+        model = self.embedder.model_name
+        total = reused = embedded = 0
+        written: list[UUID] = []
+        moved: list[tuple[UUID, int]] = []
+        # Commit explicitly: the session usually already has a transaction open from loading
+        # the document, so a nested `begin()` would be rejected.
+        try:
+            unmatched = writer.existing(document)
+            for batch in _batched(chunks, batch_size):
+                offset = total
+                total += len(batch)
+                hashes = [chunk_hash(chunk, model) for chunk in batch]
+                new = []
+                for i, h in enumerate(hashes):
+                    claimed = _claim(unmatched, h)
+                    if claimed is None:
+                        new.append(i)
+                    elif claimed[1] != offset + i:
+                        moved.append((claimed[0], offset + i))
+                if not new:
+                    continue
+                contents = [batch[i] for i in new]
+                new_hashes = [hashes[i] for i in new]
+                known = writer.stored_embeddings(document, new_hashes)
+                missing = {h: content for h, content in zip(new_hashes, contents) if h not in known}
+                if missing:
+                    known.update(zip(missing, self.embedder.embed_array(list(missing.values()))))
+                reused += len(new) - len(missing)
+                embedded += len(missing)
+                ids = [uuid4() for _ in new]
+                # Recorded before the write so a failed batch's rows are discarded as well.
+                written.extend(ids)
+                writer.write(
+                    document,
+                    contents,
+                    np.stack([known[h] for h in new_hashes]),
+                    hashes=new_hashes,
+                    ids=ids,
+                    ordinals=[offset + i for i in new],
                 )
-            self.db.add_all(chunk_records)
-            document.status = "READY"
-            self._merge_metadata(document, {"last_error": None})
-            self.db.add(document)
+                self.db.commit()
+            # Rows left unmatched hold text that is no longer in the document.
+            writer.delete_ids(document, [chunk_id for rows in unmatched.values() for chunk_id, _ in rows])
+            writer.renumber(document, moved)
+            if total:
+                document.status = "READY"
+                document.content_hash = content_hash
+                self._merge_metadata(document, {"last_error": None})
+                self.db.add(document)
+                kb_versions.bump(self.db, document.kb_id)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            self._discard_chunks(document, written)
+            raise
+        kept = total - reused - embedded
+        for outcome, count in (("kept", kept), ("reused", reused), ("embedded", embedded)):
+            ingest_chunks_total.labels(outcome).inc(count)
+        logger.info(
+            "Document %s: %d chunks (%d kept, %d embeddings reused, %d embedded)", document.id, total, kept, reused, embedded
+        )
+        return total
 
     def mark_failed(self, document_id: UUID, reason: str) -> None:
         doc = self.db.get(Document, document_id)
         if not doc:
             return
-        with self.db.begin():
-            doc.status = "FAILED"
-            self._merge_metadata(doc, {"last_error": reason})
-            self.db.add(doc)
+        doc.status = "FAILED"
+        self._merge_metadata(doc, {"last_error": reason})
+        self.db.add(doc)
+        kb_versions.bump(self.db, doc.kb_id)
+        self.db.commit()
 
-    def _extract_text(self, filename: str, data: Optional[bytes] = None) -> Union[str, List[Dict[str, str]]]:
+    def _discard_chunks(self, document: Document, ids: list[UUID]) -> None:
+        # Batches committed before a failure would otherwise stay searchable next to the rows
+        # they were meant to replace; the rows kept from the last run are left alone.
+        if not ids:
+            return
+        try:
+            ChunkWriter(self.db).delete_ids(document, ids)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            logger.warning("Could not remove partial chunks of document %s", document.id, exc_info=True)
+
+    def _extract_text(self, filename: str, data: Optional[Source] = None) -> str:
+        """The whole document as one string; ingestion itself streams via ``_iter_text``."""
+        blocks = list(self._iter_text(filename, data))
+        if blocks and isinstance(blocks[0], dict):
+            return " ".join(block["content"] for block in blocks)
+        return "\n".join(blocks)
+
+    def _iter_text(self, filename: str, data: Optional[Source] = None) -> Iterator[Block]:
         if filename.startswith("http"):
+            import requests
+
             try:
                 response = requests.get(filename, timeout=15)
                 response.raise_for_status()
@@ -95,117 +182,114 @@ class IngestionPipeline:
             raise ValueError("File content is missing for non-URL ingestion.")
 
         ext = Path(filename).suffix.lower()
-        if ext in {".txt", ".md", ".text"}:
-            return data.decode("utf-8", errors="ignore")
-        if ext == ".pdf":
-            try:
-                from pypdf import PdfReader
-            except ImportError as exc:  # pragma: no cover - runtime guard
-                raise AppException(detail="pypdf not installed", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR) from exc
-            reader = PdfReader(io.BytesIO(data))
-            return "\n".join(page.extract_text() or "" for page in reader.pages)
-        if ext == ".docx":
-            try:
-                import docx
-            except ImportError as exc:  # pragma: no cover - runtime guard
-                raise AppException(detail="python-docx not installed", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR) from exc
-            doc = docx.Document(io.BytesIO(data))
-            return "\n".join(p.text for p in doc.paragraphs)
-        if ext == ".pptx":
-            try:
-                import pptx
-            except ImportError as exc:  # pragma: no cover - runtime guard
-                raise AppException(detail="python-pptx not installed", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR) from exc
-            prs = pptx.Presentation(io.BytesIO(data))
-            text_runs = []
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if not shape.has_text_frame:
-                        continue
-                    for paragraph in shape.text_frame.paragraphs:
-                        for run in paragraph.runs:
-                            text_runs.append(run.text)
-            return "\n".join(text_runs)
-        if ext in {".html", ".htm"} or filename.startswith("http"): # Handle URL content as HTML
-            soup = BeautifulSoup(data, "html.parser")
-            for tag in soup(["script", "style", "head", "title", "meta", "link"]):
-                tag.decompose()
-            
-            structured_content: List[Dict[str, str]] = []
-            for tag_name in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'li']:
-                for tag in soup.find_all(tag_name):
-                    text = tag.get_text(separator=" ", strip=True)
-                    if text:
-                        structured_content.append({"type": tag_name, "content": text})
-            return structured_content
-        raise ValueError(f"Unsupported file type: {ext or 'unknown'}")
-
-    def _chunk_content(self, content: Union[str, List[Dict[str, str]]], max_words: int = 220, overlap: int = 40) -> list[str]:
-        if isinstance(content, str):
-            # Existing word-based chunking for flat strings
-            words = content.split()
-            if not words:
-                return []
-            chunks: list[str] = []
-            start = 0
-            step = max_words - overlap if max_words > overlap else max_words
-            while start < len(words):
-                end = start + max_words
-                slice_words = words[start:end]
-                if not slice_words:
-                    break
-                chunk = " ".join(slice_words).strip()
-                if chunk:
-                    chunks.append(chunk)
-                if len(slice_words) < overlap and start > 0:
-                    break
-                start += step
-            return chunks
-        elif isinstance(content, list):
-            # Hierarchy-aware chunking for structured content
-            chunks: list[str] = []
-            current_chunk_words: list[str] = []
-            current_heading = ""
-
-            for block in content:
-                block_type = block['type']
-                block_content = block['content']
-                block_words = block_content.split()
-
-                if block_type.startswith('h'):
-                    current_heading = block_content
-                    # Start a new chunk if current_chunk_words is not empty
-                    if current_chunk_words:
-                        chunks.append(" ".join(current_chunk_words).strip())
-                        current_chunk_words = []
-                    # Add heading itself as a chunk if it's long enough
-                    if len(block_words) > 5: # Arbitrary threshold for a meaningful heading chunk
-                        chunks.append(block_content)
-                    else: # If short, prepend to next content
-                        current_chunk_words.extend(block_words)
-                elif block_type in ['p', 'li']:
-                    # Prepend current heading to paragraph content for context
-                    prefixed_block = f"{current_heading}: {block_content}" if current_heading else block_content
-                    prefixed_block_words = prefixed_block.split()
-                    
-                    if len(current_chunk_words) + len(prefixed_block_words) <= max_words:
-                        current_chunk_words.extend(prefixed_block_words)
-                    else:
-                        if current_chunk_words:
-                            chunks.append(" ".join(current_chunk_words).strip())
-                        current_chunk_words = prefixed_block_words
-                        
-                        # Handle long individual blocks
-                        while len(current_chunk_words) > max_words:
-                            chunks.append(" ".join(current_chunk_words[:max_words]).strip())
-                            current_chunk_words = current_chunk_words[max_words - overlap:] # Add overlap
-
-            if current_chunk_words:
-                chunks.append(" ".join(current_chunk_words).strip())
+        if ext in TEXT_FORMATS:
+            with extractors.open_source(data) as handle:
+                yield from _iter_plain_text(handle)
+            return
+        fmt = ext
+        if ext not in extractors.FORMATS:
+            if not filename.startswith("http"):
+                raise ValueError(f"Unsupported file type: {ext or 'unknown'}")
+            fmt = ".html"  # Handle URL content as HTML
+        yield from _metered(fmt, self._iter_blocks(fmt, data), _source_size(data))
+
+    def _iter_blocks(self, fmt: str, data: Source) -> Iterator[Block]:
+        # Extractors yield one page, slide or paragraph at a time and read from the source
+        # (seeking where the format needs it), so the document is never held as a whole.
+        pool = get_extraction_pool()
+        # Open handles cannot be sent to another process; they are parsed here instead.
+        if pool is not None and isinstance(data, (bytes, bytearray, os.PathLike)):
+            yield from pool.iter_blocks(fmt, data)
+            return
+        with extractors.open_source(data) as handle:
+            yield from extractors.iter_blocks(fmt, handle)
+
+    def _chunk_text(self, text: str, max_words: int = 220, overlap: int = 40) -> list[str]:
+        return list(self._iter_word_chunks([text], max_words, overlap))
+
+    def _iter_chunks(self, blocks: Iterable[Block], max_words: int = 220, overlap: int = 40) -> Iterator[str]:
+        blocks = iter(blocks)
+        first = next(blocks, None)
+        if first is None:
+            return
+        blocks = itertools.chain([first], blocks)
+        if isinstance(first, dict):
+            yield from self._iter_structured_chunks(blocks, max_words, overlap)  # type: ignore[arg-type]
+        else:
+            yield from self._iter_word_chunks(blocks, max_words, overlap)  # type: ignore[arg-type]
+
+    def _iter_word_chunks(self, segments: Iterable[str], max_words: int = 220, overlap: int = 40) -> Iterator[str]:
+        """Sliding windows of ``max_words`` words over the concatenated segments.
 
+        Only the words of the current window are buffered; the ``overlap`` words shared by
+        adjacent windows carry over across segment (page, slide, paragraph) boundaries.
+        """
+        step = max_words - overlap if max_words > overlap else max_words
+        window: list[str] = []
+        emitted = False
+        for segment in segments:
+            window.extend(segment.split())
+            while len(window) >= max_words:
+                yield " ".join(window[:max_words])
+                if max_words < overlap and emitted:
+                    return
+                emitted = True
+                window = window[step:]
+        while window:
+            tail = window[:max_words]
+            yield " ".join(tail)
+            if len(tail) < overlap and emitted:
+                return
+            emitted = True
+            window = window[step:]
+
+    def _iter_structured_chunks(
+        self, blocks: Iterable[Dict[str, str]], max_words: int = 220, overlap: int = 40
+    ) -> Iterator[str]:
+        # Hierarchy-aware chunking for structured content
+        current_chunk_words: list[str] = []
+        current_heading = ""
+
+        def emit(words: list[str]) -> Iterator[str]:
             # Filter out empty chunks and ensure minimal length
-            return [chunk for chunk in chunks if chunk and len(chunk.split()) >= 5]
-        return []
+            if len(words) >= 5:
+                yield " ".join(words).strip()
+
+        for block in blocks:
+            block_type = block['type']
+            block_content = block['content']
+            block_words = block_content.split()
+
+            if block_type.startswith('h'):
+                current_heading = block_content
+                # Start a new chunk if current_chunk_words is not empty
+                if current_chunk_words:
+                    yield from emit(current_chunk_words)
+                    current_chunk_words = []
+                # Add heading itself as a chunk if it's long enough
+                if len(block_words) > 5: # Arbitrary threshold for a meaningful heading chunk
+                    yield from emit(block_words)
+                else: # If short, prepend to next content
+                    current_chunk_words.extend(block_words)
+            elif block_type in ['p', 'li']:
+                # Prepend current heading to paragraph content for context
+                prefixed_block = f"{current_heading}: {block_content}" if current_heading else block_content
+                prefixed_block_words = prefixed_block.split()
+
+                if len(current_chunk_words) + len(prefixed_block_words) <= max_words:
+                    current_chunk_words.extend(prefixed_block_words)
+                else:
+                    if current_chunk_words:
+                        yield from emit(current_chunk_words)
+                    current_chunk_words = prefixed_block_words
+
+                    # Handle long individual blocks
+                    while len(current_chunk_words) > max_words:
+                        yield from emit(current_chunk_words[:max_words])
+                        current_chunk_words = current_chunk_words[max_words - overlap:] # Add overlap
+
+        if current_chunk_words:
+            yield from emit(current_chunk_words)
 
     def _increment_attempt(self, document: Document) -> None:
         attempts = 0
@@ -223,3 +307,77 @@ class IngestionPipeline:
         meta = document.doc_metadata.copy() if document.doc_metadata else {}
         meta.update(updates)
         document.doc_metadata = meta
+
+
+def _iter_plain_text(handle: BinaryIO) -> Iterator[str]:
+    reader = io.TextIOWrapper(handle, encoding="utf-8", errors="ignore")
+    try:
+        carry = ""
+        piece = reader.read(TEXT_READ_CHARS)
+        while piece:
+            following = reader.read(TEXT_READ_CHARS)
+            text = carry + piece
+            carry = ""
+            if following:
+                # Hold back a trailing partial word so it is not split across two segments.
+                cut = re.search(r"\S*\Z", text).start()  # type: ignore[union-attr]
+                text, carry = text[:cut], text[cut:]
+            if text:
+                yield text
+            piece = following
+    finally:
+        reader.detach()
+
+
+def file_hash(source: Source) -> Optional[str]:
+    """sha256 of an upload's bytes, read in blocks; None for open handles."""
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.sha256(source).hexdigest()
+    if isinstance(source, os.PathLike):
+        digest = hashlib.sha256()
+        with open(source, "rb") as handle:
+            while block := handle.read(1024 * 1024):
+                digest.update(block)
+        return digest.hexdigest()
+    return None
+
+
+def _claim(unmatched: dict[Optional[str], list[tuple[UUID, int]]], content_hash: str) -> Optional[tuple[UUID, int]]:
+    # One existing row per occurrence, so repeated chunk text keeps its multiplicity.
+    rows = unmatched.get(content_hash)
+    if not rows:
+        return None
+    return rows.pop()
+
+
+def _batched(items: Iterable[str], size: int) -> Iterator[list[str]]:
+    iterator = iter(items)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def _metered(fmt: str, blocks: Iterator[Block], size: Optional[int]) -> Iterator[Block]:
+    # Only time spent producing blocks counts, not the chunking and embedding in between.
+    units = 0
+    busy = 0.0
+    while True:
+        start = time.perf_counter()
+        block = next(blocks, None)
+        busy += time.perf_counter() - start
+        if block is None:
+            break
+        units += 1
+        yield block
+    extraction_units_total.labels(fmt).inc(units)
+    if size:
+        extraction_bytes_total.labels(fmt).inc(size)
+    if units:
+        extraction_units_per_second.labels(fmt).observe(units / max(busy, 1e-9))
+
+
+def _source_size(data: Source) -> Optional[int]:
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    if isinstance(data, os.PathLike):
+        return os.path.getsize(data)
+    return None
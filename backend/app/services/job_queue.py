@@ -0,0 +1,240 @@
+"""Database-backed ingestion job queue.
+
+The API enqueues a job in the same transaction as its document row; ``python -m app.worker``
+processes claim jobs with ``SELECT ... FOR UPDATE SKIP LOCKED`` so any number of workers can
+poll the table without blocking each other. A claimed job holds a time-limited lease that
+the worker extends with heartbeats; if a worker dies, the lease expires and the job becomes
+claimable again, unless it has used up its attempts. Failed attempts are retried with
+jittered exponential backoff. Workers refresh the queue gauges and delete SUCCEEDED jobs older
+than ``ingest_job_retention_hours`` every ``ingest_queue_stats_interval_seconds``.
+"""
+
+import logging
+import random
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.exceptions import PayloadTooLargeError
+from app.models.entities import Document, IngestionJob
+from app.observability import ingest_jobs_total, ingest_queue_depth, ingest_queue_oldest_seconds
+from app.services import kb_versions
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "QUEUED"
+RUNNING = "RUNNING"
+SUCCEEDED = "SUCCEEDED"
+FAILED = "FAILED"
+
+KIND_FILE = "file"
+KIND_URL = "url"
+
+
+def lease_seconds() -> int:
+    return int(getattr(settings, "ingest_lease_seconds", 120))
+
+
+def spool_dir() -> Path:
+    path = Path(getattr(settings, "ingest_spool_dir", "") or Path(tempfile.gettempdir()) / "rag-spool")
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def enqueue(db: Session, document: Document, kind: str, payload: dict[str, Any] | None = None) -> IngestionJob:
+    """Add a job for ``document`` to the caller's transaction; it is visible to workers on commit."""
+    job = IngestionJob(
+        tenant_id=document.tenant_id,
+        kb_id=document.kb_id,
+        document_id=document.id,
+        kind=kind,
+        payload=payload,
+        status=QUEUED,
+        attempts=0,
+        max_attempts=int(getattr(settings, "ingest_max_attempts", 5)),
+        run_after=datetime.utcnow(),
+    )
+    db.add(job)
+    return job
+
+
+def claim(db: Session, worker_id: str, limit: int = 1) -> list[IngestionJob]:
+    """Lease up to ``limit`` runnable jobs to ``worker_id`` and commit the claim.
+
+    An expired lease on a job that has no attempts left fails the job instead; it is not
+    returned, so fewer than ``limit`` jobs may come back while others are still runnable.
+    """
+    now = datetime.utcnow()
+    runnable = or_(
+        and_(IngestionJob.status == QUEUED, IngestionJob.run_after <= now),
+        # A RUNNING job whose lease lapsed belongs to a worker that crashed or stalled.
+        and_(IngestionJob.status == RUNNING, IngestionJob.lease_expires_at < now),
+    )
+    jobs = list(
+        db.scalars(
+            select(IngestionJob)
+            .where(runnable)
+            .order_by(IngestionJob.run_after)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+    )
+    claimed, exhausted = [], []
+    for job in jobs:
+        if job.status == RUNNING:
+            if job.attempts >= job.max_attempts:
+                # The worker died on the last attempt; a crash loop must not retry forever.
+                _give_up(db, job, f"Lease held by {job.lease_owner} expired on attempt {job.attempts}")
+                exhausted.append(job)
+                continue
+            logger.warning("Reclaiming job %s from expired lease held by %s", job.id, job.lease_owner)
+        job.status = RUNNING
+        job.attempts += 1
+        job.lease_owner = worker_id
+        job.lease_expires_at = now + timedelta(seconds=lease_seconds())
+        claimed.append(job)
+    db.commit()
+    for job in exhausted:
+        discard_payload(job)
+        ingest_jobs_total.labels("failed").inc()
+        logger.warning("Ingestion job %s failed: %s", job.id, job.last_error)
+    return claimed
+
+
+def _give_up(db: Session, job: IngestionJob, error: str) -> None:
+    job.status = FAILED
+    job.lease_owner = None
+    job.lease_expires_at = None
+    job.last_error = error
+    # No pipeline is left running to record the failure on the document.
+    document = db.get(Document, job.document_id)
+    if document is not None:
+        document.status = "FAILED"
+        document.doc_metadata = (document.doc_metadata or {}) | {"last_error": error}
+        kb_versions.bump(db, document.kb_id)
+
+
+def heartbeat(db: Session, job_id: uuid.UUID, worker_id: str) -> bool:
+    """Extend the lease; False means the job was reclaimed by someone else and should stop."""
+    result = db.execute(
+        update(IngestionJob)
+        .where(IngestionJob.id == job_id, IngestionJob.lease_owner == worker_id, IngestionJob.status == RUNNING)
+        .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=lease_seconds()), updated_at=datetime.utcnow())
+    )
+    db.commit()
+    return result.rowcount > 0
+
+
+def complete(db: Session, job: IngestionJob) -> None:
+    job.status = SUCCEEDED
+    job.lease_owner = None
+    job.lease_expires_at = None
+    job.last_error = None
+    db.commit()
+    discard_payload(job)
+    ingest_jobs_total.labels("succeeded").inc()
+
+
+def fail(db: Session, job: IngestionJob, error: str) -> None:
+    """Record a failed attempt: requeue with backoff, or give up after ``max_attempts``."""
+    job.lease_owner = None
+    job.lease_expires_at = None
+    job.last_error = error[:2000]
+    if job.attempts >= job.max_attempts:
+        job.status = FAILED
+        outcome = "failed"
+    else:
+        job.status = QUEUED
+        job.run_after = datetime.utcnow() + timedelta(seconds=backoff_seconds(job.attempts))
+        document = db.get(Document, job.document_id)
+        if document is not None:
+            document.status = "PROCESSING"
+        outcome = "retried"
+    db.commit()
+    if job.status == FAILED:
+        discard_payload(job)
+    ingest_jobs_total.labels(outcome).inc()
+    logger.warning("Ingestion job %s attempt %d %s: %s", job.id, job.attempts, outcome, error)
+
+
+def backoff_seconds(attempt: int) -> float:
+    base = float(getattr(settings, "ingest_retry_base_seconds", 5))
+    cap = float(getattr(settings, "ingest_retry_max_seconds", 600))
+    # Full jitter, so a batch of jobs that failed together does not retry in lockstep.
+    return random.uniform(0, min(cap, base * (2 ** max(attempt - 1, 0))))
+
+
+# Headroom for multipart boundaries and form fields on top of the upload limit.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+def max_upload_bytes() -> int:
+    """Upload size limit; 0 disables it."""
+    return int(getattr(settings, "ingest_max_upload_bytes", 0) or 0)
+
+
+def spool_upload(source: BinaryIO, suffix: str = "", max_bytes: int | None = None, digest: Any = None) -> Path:
+    """Copy an upload into the spool directory shared with the workers.
+
+    The copy moves ``ingest_spool_chunk_bytes`` at a time, so memory use does not depend on
+    the upload size, and stops with ``PayloadTooLargeError`` as soon as ``max_bytes`` (default
+    ``ingest_max_upload_bytes``) is exceeded. A ``hashlib`` ``digest`` is fed the bytes on the way.
+    """
+    limit = max_upload_bytes() if max_bytes is None else max_bytes
+    chunk_size = int(getattr(settings, "ingest_spool_chunk_bytes", 1024 * 1024))
+    path = spool_dir() / f"{uuid.uuid4().hex}{suffix}"
+    written = 0
+    try:
+        with path.open("wb") as target:
+            while chunk := source.read(chunk_size):
+                written += len(chunk)
+                if limit and written > limit:
+                    raise PayloadTooLargeError(detail=f"Upload exceeds the {limit} byte limit")
+                target.write(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return path
+
+
+def discard_payload(job: IngestionJob) -> None:
+    path = (job.payload or {}).get("path")
+    if path:
+        Path(path).unlink(missing_ok=True)
+
+
+def purge_finished(db: Session) -> int:
+    """Delete SUCCEEDED jobs older than ``ingest_job_retention_hours`` (0 keeps them)."""
+    hours = float(getattr(settings, "ingest_job_retention_hours", 24) or 0)
+    if hours <= 0:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(hours=hours)
+    result = db.execute(
+        delete(IngestionJob)
+        .where(IngestionJob.status == SUCCEEDED, IngestionJob.updated_at < cutoff)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def queue_stats(db: Session) -> dict[str, Any]:
+    """Job counts per status plus the age of the oldest runnable job; also updates the gauges."""
+    counts = dict(db.execute(select(IngestionJob.status, func.count()).group_by(IngestionJob.status)).all())
+    oldest = db.execute(select(func.min(IngestionJob.run_after)).where(IngestionJob.status == QUEUED)).scalar()
+    oldest_seconds = max((datetime.utcnow() - oldest).total_seconds(), 0.0) if oldest else 0.0
+    for status in (QUEUED, RUNNING, SUCCEEDED, FAILED):
+        ingest_queue_depth.labels(status).set(counts.get(status, 0))
+    ingest_queue_oldest_seconds.set(oldest_seconds)
+    return {
+        "counts": {status: counts.get(status, 0) for status in (QUEUED, RUNNING, SUCCEEDED, FAILED)},
+        "oldest_queued_seconds": oldest_seconds,
+    }
@@ -0,0 +1,23 @@
+"""Knowledge base content versions.
+
+``knowledge_bases.content_version`` is bumped in the same transaction that moves one of the
+KB's documents to READY or FAILED. Caches key their entries by it, so every API process
+sees the change on its next lookup without any cross-process messaging.
+"""
+
+import uuid
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.models.entities import KnowledgeBase
+
+
+def bump(db: Session, kb_id: uuid.UUID) -> None:
+    """Increment the KB's version inside the caller's transaction."""
+    db.execute(
+        update(KnowledgeBase)
+        .where(KnowledgeBase.id == kb_id)
+        .values(content_version=KnowledgeBase.content_version + 1)
+        .execution_options(synchronize_session=False)
+    )
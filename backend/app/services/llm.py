@@ -1,42 +1,224 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import logging
-from typing import Any
+import random
+import threading
+import time
+from typing import Any, AsyncIterator
 
-import requests
+import httpx
 
+from app import tracing
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT = "You answer with concise, grounded responses using provided context."
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+PROVIDER_BASE_URLS = {
+    "openai": "https://api.openai.com/v1",
+    "groq": "https://api.groq.com/openai/v1",
+}
+
+# Connection pools are shared per process (and per event loop for the async client) so
+# calls reuse keep-alive connections instead of paying a TCP/TLS handshake every time.
+_sync_client: httpx.Client | None = None
+_async_clients: dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+_clients_lock = threading.Lock()
+_closing: set[asyncio.Task] = set()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _client_options() -> dict[str, Any]:
+    timeout = float(getattr(settings, "llm_timeout_seconds", 30))
+    connect_timeout = float(getattr(settings, "llm_connect_timeout_seconds", 5))
+    max_connections = int(getattr(settings, "llm_max_connections", 100))
+    return {
+        "timeout": httpx.Timeout(timeout, connect=connect_timeout),
+        "limits": httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        # HTTP/2 is negotiated via ALPN, so providers without it transparently fall back to HTTP/1.1.
+        "http2": _http2_available(),
+    }
+
+
+def get_sync_client() -> httpx.Client:
+    global _sync_client
+    if _sync_client is None:
+        with _clients_lock:
+            if _sync_client is None:
+                _sync_client = httpx.Client(**_client_options())
+    return _sync_client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        with _clients_lock:
+            # Loops that have finished (asyncio.run in scripts and tests) leave their client behind.
+            stale = [key for key in _async_clients if key.is_closed()]
+            evicted = [_async_clients.pop(key) for key in stale]
+            client = _async_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(**_client_options())
+                _async_clients[loop] = client
+        for old in evicted:
+            task = loop.create_task(_close_stale(old))
+            _closing.add(task)
+            task.add_done_callback(_closing.discard)
+    return client
+
+
+async def _close_stale(client: httpx.AsyncClient) -> None:
+    try:
+        await client.aclose()
+    except Exception:  # noqa: BLE001 - its connections belong to a closed loop
+        logger.debug("Could not close an HTTP client left by a closed event loop", exc_info=True)
+
+
+async def close_clients() -> None:
+    global _sync_client
+    with _clients_lock:
+        sync_client, _sync_client = _sync_client, None
+        async_clients = list(_async_clients.values())
+        _async_clients.clear()
+    if sync_client is not None:
+        sync_client.close()
+    for client in async_clients:
+        await client.aclose()
+
 
 class LLMClient:
-    def __init__(self) -> None:
+    def __init__(self, async_client: httpx.AsyncClient | None = None, sync_client: httpx.Client | None = None) -> None:
         self.settings = settings
+        self._async_client = async_client
+        self._sync_client = sync_client
+
+    @property
+    def provider(self) -> str:
+        return (self.settings.LLM_PROVIDER or "stub").lower()
 
     def generate(self, prompt: str, max_tokens: int = 128) -> str:
-        provider = (self.settings.LLM_PROVIDER or "stub").lower()
-        if provider == "stub":
-            return f"[stubbed llm reply]\nPrompt was:\n{prompt[:500]}"
+        with tracing.span("llm.generate", stage="llm", provider=self.provider, max_tokens=max_tokens):
+            return self._generate(prompt, max_tokens)
+
+    def _generate(self, prompt: str, max_tokens: int) -> str:
+        if self.provider == "stub":
+            return self._stub_reply(prompt)
+
+        client = self._sync_client or get_sync_client()
+        url, headers, payload = self._request(prompt, max_tokens)
+        for attempt in range(self._max_retries() + 1):
+            try:
+                response = client.post(url, headers=headers, json=payload)
+            except httpx.TransportError as exc:
+                if attempt >= self._max_retries():
+                    raise RuntimeError(f"LLM provider request failed: {exc}") from exc
+                time.sleep(self._backoff(attempt))
+                continue
+            if response.status_code in RETRYABLE_STATUS and attempt < self._max_retries():
+                time.sleep(self._backoff(attempt, response.headers.get("retry-after")))
+                continue
+            return self._parse_completion(response)
+        raise RuntimeError("LLM provider retries exhausted")  # pragma: no cover - loop always returns or raises
+
+    async def agenerate(self, prompt: str, max_tokens: int = 128) -> str:
+        with tracing.span("llm.generate", stage="llm", provider=self.provider, max_tokens=max_tokens):
+            return await self._agenerate(prompt, max_tokens)
+
+    async def _agenerate(self, prompt: str, max_tokens: int) -> str:
+        if self.provider == "stub":
+            return self._stub_reply(prompt)
 
+        client = self._async_client or get_async_client()
+        url, headers, payload = self._request(prompt, max_tokens)
+        for attempt in range(self._max_retries() + 1):
+            try:
+                response = await client.post(url, headers=headers, json=payload)
+            except httpx.TransportError as exc:
+                if attempt >= self._max_retries():
+                    raise RuntimeError(f"LLM provider request failed: {exc}") from exc
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            if response.status_code in RETRYABLE_STATUS and attempt < self._max_retries():
+                await asyncio.sleep(self._backoff(attempt, response.headers.get("retry-after")))
+                continue
+            return self._parse_completion(response)
+        raise RuntimeError("LLM provider retries exhausted")  # pragma: no cover - loop always returns or raises
+
+    async def astream(self, prompt: str, max_tokens: int = 128) -> AsyncIterator[str]:
+        """Yield completion text deltas as the provider emits them (OpenAI-compatible SSE)."""
+        if self.provider == "stub":
+            for piece in self._stub_reply(prompt).split(" "):
+                yield piece + " "
+            return
+
+        client = self._async_client or get_async_client()
+        url, headers, payload = self._request(prompt, max_tokens, stream=True)
+        # Retries are only safe before the first delta reaches the caller; after that a retry
+        # would send the same tokens again.
+        yielded = False
+        for attempt in range(self._max_retries() + 1):
+            try:
+                async with client.stream("POST", url, headers=headers, json=payload) as response:
+                    if response.status_code in RETRYABLE_STATUS and not yielded and attempt < self._max_retries():
+                        retry_after = response.headers.get("retry-after")
+                        await response.aclose()
+                        await asyncio.sleep(self._backoff(attempt, retry_after))
+                        continue
+                    if response.status_code >= 400:
+                        body = (await response.aread()).decode("utf-8", errors="ignore")
+                        logger.error("LLM provider error status=%s body=%s", response.status_code, body)
+                        raise RuntimeError(f"LLM provider returned status {response.status_code}")
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            return
+                        delta = ((json.loads(data).get("choices") or [{}])[0].get("delta") or {}).get("content")
+                        if delta:
+                            yielded = True
+                            yield delta
+                    return
+            except httpx.TransportError as exc:
+                if yielded or attempt >= self._max_retries():
+                    raise RuntimeError(f"LLM provider request failed: {exc}") from exc
+                await asyncio.sleep(self._backoff(attempt))
+
+    def _stub_reply(self, prompt: str) -> str:
+        return f"[stubbed llm reply]\nPrompt was:\n{prompt[:500]}"
+
+    def _request(self, prompt: str, max_tokens: int, stream: bool = False) -> tuple[str, dict[str, str], dict[str, Any]]:
         api_key = self.settings.LLM_API_KEY
         if not api_key:
             raise ValueError("LLM API key is not configured")
 
-        url = self._provider_url(provider)
         headers = {"Authorization": f"Bearer {api_key}"}
-        payload = {
+        payload: dict[str, Any] = {
             "model": self.settings.LLM_MODEL,
             "messages": [
-                {"role": "system", "content": "You answer with concise, grounded responses using provided context."},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt},
             ],
             "max_tokens": max_tokens,
             "temperature": 0.2,
         }
+        if stream:
+            payload["stream"] = True
+        return self._provider_url(self.provider), headers, payload
 
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
-        if not response.ok:
+    def _parse_completion(self, response: httpx.Response) -> str:
+        if not response.is_success:
             logger.error("LLM provider error status=%s body=%s", response.status_code, response.text)
             raise RuntimeError(f"LLM provider returned status {response.status_code}")
 
@@ -49,9 +231,22 @@ class LLMClient:
             raise RuntimeError("LLM provider response missing content")
         return str(content)
 
+    def _max_retries(self) -> int:
+        return int(getattr(self.settings, "llm_max_retries", 3))
+
+    def _backoff(self, attempt: int, retry_after: str | None = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), float(getattr(self.settings, "llm_retry_max_seconds", 10)))
+            except ValueError:
+                pass
+        base = float(getattr(self.settings, "llm_retry_base_seconds", 0.5))
+        cap = float(getattr(self.settings, "llm_retry_max_seconds", 10))
+        # Full jitter: spreads retries from many workers instead of synchronising them.
+        return random.uniform(0, min(cap, base * (2**attempt)))
+
     def _provider_url(self, provider: str) -> str:
-        if provider == "openai":
-            return "https://api.openai.com/v1/chat/completions"
-        if provider == "groq":
-            return "https://api.groq.com/openai/v1/chat/completions"
-        raise ValueError(f"Unsupported LLM provider: {provider}")
+        base_url = getattr(self.settings, "llm_base_url", None) or PROVIDER_BASE_URLS.get(provider)
+        if not base_url:
+            raise ValueError(f"Unsupported LLM provider: {provider}")
+        return f"{base_url.rstrip('/')}/chat/completions"
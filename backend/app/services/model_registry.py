@@ -0,0 +1,152 @@
+import gc
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from app.observability import model_load_latency_ms, model_loads_total, model_memory_bytes
+
+logger = logging.getLogger(__name__)
+
+ModelKey = tuple[str, str, str]
+
+
+@dataclass
+class _Entry:
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    model: Any = None
+    load_ms: int | None = None
+    memory_bytes: int = 0
+    loaded_at: float | None = None
+    last_error: str | None = None
+    loading: bool = False
+
+    @property
+    def state(self) -> str:
+        if self.model is not None:
+            return "ready"
+        if self.loading:
+            return "loading"
+        return "failed" if self.last_error else "not_loaded"
+
+
+def _estimate_model_bytes(model: Any) -> int:
+    """Best-effort parameter + buffer size for torch-backed models (SentenceTransformer, CrossEncoder)."""
+    module = model if hasattr(model, "parameters") else getattr(model, "model", None)
+    if module is None or not hasattr(module, "parameters"):
+        return 0
+    try:
+        total = sum(p.numel() * p.element_size() for p in module.parameters())
+        total += sum(b.numel() * b.element_size() for b in module.buffers())
+        return int(total)
+    except Exception:  # noqa: BLE001 - metrics must never break model loading
+        return 0
+
+
+class ModelRegistry:
+    """Process-wide cache of loaded models keyed by (kind, model name, device).
+
+    Lookups after the first load are lock-free. Concurrent first use of the same key
+    blocks on a per-key lock so the model is constructed exactly once; different keys
+    load independently.
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[ModelKey, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, name: str, loader: Callable[[], Any], device: str | None = None) -> Any:
+        key = (kind, name, device or "auto")
+        entry = self._entries.get(key)
+        if entry is not None and entry.model is not None:
+            return entry.model
+        if entry is None:
+            with self._lock:
+                entry = self._entries.setdefault(key, _Entry())
+        with entry.lock:
+            if entry.model is None:
+                self._load(key, entry, loader)
+            return entry.model
+
+    def warm(self, kind: str, name: str, loader: Callable[[], Any], device: str | None = None) -> None:
+        self.get(kind, name, loader, device=device)
+
+    def is_loaded(self, kind: str, name: str, device: str | None = None) -> bool:
+        entry = self._entries.get((kind, name, device or "auto"))
+        return entry is not None and entry.model is not None
+
+    def state(self, kind: str, name: str, device: str | None = None) -> str:
+        """"ready", "loading", "failed" or "not_loaded"; never triggers a load."""
+        entry = self._entries.get((kind, name, device or "auto"))
+        return "not_loaded" if entry is None else entry.state
+
+    def unload(self, kind: str | None = None, name: str | None = None) -> int:
+        """Drop matching models so their memory can be reclaimed. Returns how many were unloaded."""
+        with self._lock:
+            keys = [
+                key
+                for key in self._entries
+                if (kind is None or key[0] == kind) and (name is None or key[1] == name)
+            ]
+            removed = [(key, self._entries.pop(key)) for key in keys]
+        unloaded = 0
+        for key, entry in removed:
+            with entry.lock:
+                if entry.model is not None:
+                    unloaded += 1
+                entry.model = None
+            model_memory_bytes.labels(*key).set(0)
+            logger.info("Unloaded model kind=%s name=%s device=%s", *key)
+        if unloaded:
+            gc.collect()
+        return unloaded
+
+    def stats(self) -> list[dict[str, object]]:
+        return [
+            {
+                "kind": kind,
+                "model": name,
+                "device": device,
+                "loaded": entry.model is not None,
+                "state": entry.state,
+                "load_ms": entry.load_ms,
+                "memory_bytes": entry.memory_bytes,
+                "loaded_at": entry.loaded_at,
+                "last_error": entry.last_error,
+            }
+            for (kind, name, device), entry in list(self._entries.items())
+        ]
+
+    def _load(self, key: ModelKey, entry: _Entry, loader: Callable[[], Any]) -> None:
+        kind, name, device = key
+        start = time.time()
+        entry.loading = True
+        try:
+            model = loader()
+        except Exception as exc:
+            entry.last_error = str(exc)
+            entry.loading = False
+            model_loads_total.labels(kind, name, "error").inc()
+            logger.error("Failed to load model kind=%s name=%s device=%s: %s", kind, name, device, exc)
+            raise
+        entry.load_ms = int((time.time() - start) * 1000)
+        entry.memory_bytes = _estimate_model_bytes(model)
+        entry.loaded_at = time.time()
+        entry.last_error = None
+        entry.model = model
+        entry.loading = False
+        model_loads_total.labels(kind, name, "ok").inc()
+        model_load_latency_ms.labels(kind, name).observe(entry.load_ms)
+        model_memory_bytes.labels(kind, name, device).set(entry.memory_bytes)
+        logger.info(
+            "Loaded model kind=%s name=%s device=%s load_ms=%s memory_bytes=%s",
+            kind,
+            name,
+            device,
+            entry.load_ms,
+            entry.memory_bytes,
+        )
+
+
+model_registry = ModelRegistry()
@@ -1,14 +1,21 @@
+import time
 import uuid
-from collections import defaultdict
-from typing import Optional
+from typing import Any, AsyncIterator, Hashable, Optional
 
-from sqlalchemy import union_all
-from sqlalchemy.orm import Session
+from sqlalchemy import literal, literal_column, select, union_all
+from sqlalchemy.orm import Query, Session
 from sqlalchemy.sql import func
 
+from app import tracing
+from app.core.config import settings
+from app.core.executors import run_db, run_inference
+from app.db.partitioning import chunk_source
+from app.db.vector_index import apply_search_params, embedding_distance
+from app.services.answer_cache import AnswerCache, get_answer_cache
 from app.services.embeddings import EmbeddingService
 from app.services.llm import LLMClient
 from app.services.rerank import RerankingService
+from app.services.retrieval_cache import get_retrieval_cache, retrieval_key
 from app.models.entities import Chunk
 from app.schemas.models import RAGSource, SearchType
 
@@ -19,13 +26,22 @@ class RAGService:
         self.llm = LLMClient()
         self.reranker = RerankingService()
 
-    def _vector_search(self, tenant_id: uuid.UUID, kb_id: uuid.UUID, query_text: str, top_k: int) -> list[RAGSource]:
-        query_vec = self.embedder.embed_texts([query_text])[0]
-        distance = Chunk.embedding.cosine_distance(query_vec)
+    def _vector_search(
+        self,
+        tenant_id: uuid.UUID,
+        kb_id: uuid.UUID,
+        query_text: str,
+        top_k: int,
+        query_vec: Optional[list[float]] = None,
+    ) -> list[RAGSource]:
+        if query_vec is None:
+            query_vec = self.embedder.embed_query(query_text)
+        chunks = chunk_source(self.db, tenant_id, kb_id)
+        distance = embedding_distance(chunks.embedding, query_vec)
 
         results = (
-            self.db.query(Chunk, distance.label("score"))
-            .filter(Chunk.tenant_id == tenant_id, Chunk.kb_id == kb_id)
+            self.db.query(chunks, distance.label("score"))
+            .filter(chunks.tenant_id == tenant_id, chunks.kb_id == kb_id)
             .order_by(distance)
             .limit(top_k)
             .all()
@@ -42,14 +58,15 @@ class RAGService:
         ]
 
     def _full_text_search(self, tenant_id: uuid.UUID, kb_id: uuid.UUID, query_text: str, top_k: int) -> list[RAGSource]:
+        chunks = chunk_source(self.db, tenant_id, kb_id)
+        # plainto_tsquery accepts free text; to_tsquery rejects multi-word queries without operators.
+        tsquery = func.plainto_tsquery(literal_column("'english'"), query_text)
+        score = func.ts_rank_cd(chunks.content_tsv, tsquery)
         fulltext_query = (
-            self.db.query(
-                Chunk,
-                func.ts_rank_cd(Chunk.content_tsv, func.to_tsquery(query_text)).label("score"),
-            )
-            .filter(Chunk.content_tsv.match(query_text, postgresql_regconfig="english"))
-            .filter(Chunk.tenant_id == tenant_id, Chunk.kb_id == kb_id)
-            .order_by(func.ts_rank_cd(Chunk.content_tsv, func.to_tsquery(query_text)).desc())
+            self.db.query(chunks, score.label("score"))
+            .filter(chunks.content_tsv.op("@@")(tsquery))
+            .filter(chunks.tenant_id == tenant_id, chunks.kb_id == kb_id)
+            .order_by(score.desc())
             .limit(top_k)
             .all()
         )
@@ -64,85 +81,130 @@ class RAGService:
             for chunk, _score in fulltext_query
         ]
 
-    def _hybrid_search(self, tenant_id: uuid.UUID, kb_id: uuid.UUID, query_text: str, top_k: int) -> list[RAGSource]:
-        query_vec = self.embedder.embed_texts([query_text])[0]
+    def _hybrid_search(
+        self,
+        tenant_id: uuid.UUID,
+        kb_id: uuid.UUID,
+        query_text: str,
+        top_k: int,
+        query_vec: Optional[list[float]] = None,
+    ) -> list[RAGSource]:
+        if query_vec is None:
+            query_vec = self.embedder.embed_query(query_text)
 
-        # Vector search query
-        vector_query = (
-            self.db.query(
-                Chunk.id.label("id"),
-                func.rank().over(order_by=Chunk.embedding.cosine_distance(query_vec)).label("rank"),
+        # Candidate generation, RRF fusion and the row fetch all happen in one statement.
+        results = self._hybrid_query(tenant_id, kb_id, query_text, top_k, query_vec).all()
+
+        return [
+            RAGSource(
+                document_id=str(chunk.document_id),
+                chunk_id=str(chunk.id),
+                content=chunk.content,
+                metadata=chunk.chunk_metadata,
             )
-            .filter(Chunk.tenant_id == tenant_id, Chunk.kb_id == kb_id)
-            .limit(top_k)
-            .subquery()
+            for chunk, _score in results
+        ]
+
+    def _hybrid_query(
+        self,
+        tenant_id: uuid.UUID,
+        kb_id: uuid.UUID,
+        query_text: str,
+        top_k: int,
+        query_vec: list[float],
+    ) -> Query:
+        """Build the CTE-based dense + sparse + RRF statement.
+
+        Each branch only ranks its own top candidates (ORDER BY ... LIMIT, which the ANN and
+        GIN indexes can serve) instead of ranking the whole knowledge base.
+        """
+        rrf_k = int(getattr(settings, "hybrid_rrf_k", 60))
+        dense_weight = float(getattr(settings, "hybrid_dense_weight", 1.0))
+        sparse_weight = float(getattr(settings, "hybrid_sparse_weight", 1.0))
+        candidates = top_k * max(1, int(getattr(settings, "hybrid_candidate_multiplier", 2)))
+
+        chunks = chunk_source(self.db, tenant_id, kb_id)
+        distance = embedding_distance(chunks.embedding, query_vec)
+        dense_candidates = (
+            select(chunks.id.label("id"), distance.label("distance"))
+            .where(chunks.tenant_id == tenant_id, chunks.kb_id == kb_id)
+            .order_by(distance)
+            .limit(candidates)
+            .cte("dense_candidates")
         )
+        dense = select(
+            dense_candidates.c.id,
+            func.row_number().over(order_by=dense_candidates.c.distance).label("rank"),
+        ).cte("dense")
 
-        # Full-text search query
-        fulltext_query = (
-            self.db.query(
-                Chunk.id.label("id"),
-                func.rank().over(order_by=func.ts_rank_cd(Chunk.content_tsv, func.to_tsquery(query_text)).desc()).label("rank"),
-            )
-            .filter(Chunk.content_tsv.match(query_text, postgresql_regconfig="english"))
-            .filter(Chunk.tenant_id == tenant_id, Chunk.kb_id == kb_id)
+        tsquery = func.plainto_tsquery(literal_column("'english'"), query_text)
+        sparse_score = func.ts_rank_cd(chunks.content_tsv, tsquery)
+        sparse_candidates = (
+            select(chunks.id.label("id"), sparse_score.label("score"))
+            .where(chunks.content_tsv.op("@@")(tsquery))
+            .where(chunks.tenant_id == tenant_id, chunks.kb_id == kb_id)
+            .order_by(sparse_score.desc())
+            .limit(candidates)
+            .cte("sparse_candidates")
+        )
+        sparse = select(
+            sparse_candidates.c.id,
+            func.row_number().over(order_by=sparse_candidates.c.score.desc()).label("rank"),
+        ).cte("sparse")
+
+        contributions = union_all(
+            select(dense.c.id.label("id"), (literal(dense_weight) / (rrf_k + dense.c.rank)).label("rrf")),
+            select(sparse.c.id.label("id"), (literal(sparse_weight) / (rrf_k + sparse.c.rank)).label("rrf")),
+        ).subquery("contributions")
+        fused_score = func.sum(contributions.c.rrf).label("score")
+        fused = (
+            select(contributions.c.id, fused_score)
+            .group_by(contributions.c.id)
+            .order_by(fused_score.desc())
             .limit(top_k)
-            .subquery()
+            .cte("fused")
         )
-        
-        # Combine the results
-        combined_query = union_all(vector_query.select(), fulltext_query.select()).alias("combined_query")
-        
-        ranked_chunks = self.db.query(combined_query).all()
-        
-        # Calculate RRF scores
-        rrf_scores = defaultdict(float)
-        k = 60  # RRF constant
-        for id, rank in ranked_chunks:
-            rrf_scores[id] += 1 / (k + rank)
-
-        # Sort by RRF score
-        sorted_chunk_ids = sorted(rrf_scores.keys(), key=lambda id: rrf_scores[id], reverse=True)
-
-        # Fetch the actual Chunk objects for the unique IDs
-        chunks = self.db.query(Chunk).filter(Chunk.id.in_(sorted_chunk_ids)).all()
-        
-        # Create a dictionary for quick lookup
-        chunk_map = {chunk.id: chunk for chunk in chunks}
-        
-        # Create the final list of RAGSource objects, sorted by RRF score
-        results = [
-            RAGSource(
-                document_id=str(chunk_map[chunk_id].document_id),
-                chunk_id=str(chunk_id),
-                content=chunk_map[chunk_id].content,
-                metadata=chunk_map[chunk_id].chunk_metadata,
-            )
-            for chunk_id in sorted_chunk_ids
-        ]
 
-        return results[:top_k]
+        return (
+            self.db.query(chunks, fused.c.score)
+            .join(fused, chunks.id == fused.c.id)
+            .order_by(fused.c.score.desc(), chunks.id)
+        )
 
-    def search(self, tenant_id: uuid.UUID, kb_id: uuid.UUID, query_text: str, top_k: int, search_type: SearchType) -> list[RAGSource]:
-        if search_type == SearchType.vector:
-            return self._vector_search(tenant_id, kb_id, query_text, top_k)
-        elif search_type == SearchType.full_text:
-            return self._full_text_search(tenant_id, kb_id, query_text, top_k)
-        elif search_type == SearchType.hybrid:
-            return self._hybrid_search(tenant_id, kb_id, query_text, top_k)
-        else:
-            raise ValueError(f"Unknown search type: {search_type}")
+    def search(
+        self,
+        tenant_id: uuid.UUID,
+        kb_id: uuid.UUID,
+        query_text: str,
+        top_k: int,
+        search_type: SearchType,
+        query_vec: Optional[list[float]] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+    ) -> list[RAGSource]:
+        # Hybrid candidate generation and RRF fusion run in one SQL statement, so they share this span.
+        with tracing.span("rag.search", stage="search", search_type=search_type.value, top_k=top_k):
+            if search_type != SearchType.full_text:
+                apply_search_params(self.db, ef_search=ef_search, probes=probes)
+            if search_type == SearchType.vector:
+                return self._vector_search(tenant_id, kb_id, query_text, top_k, query_vec=query_vec)
+            elif search_type == SearchType.full_text:
+                return self._full_text_search(tenant_id, kb_id, query_text, top_k)
+            elif search_type == SearchType.hybrid:
+                return self._hybrid_search(tenant_id, kb_id, query_text, top_k, query_vec=query_vec)
+            else:
+                raise ValueError(f"Unknown search type: {search_type}")
 
     def rerank(self, query_text: str, sources: list[RAGSource], top_k: int) -> list[RAGSource]:
         if not sources:
             return []
 
         contents = [source.content for source in sources]
-        sorted_indices = self.reranker.score_and_sort(query_text, contents)
+        with tracing.span("rag.rerank", stage="rerank", candidates=len(contents), top_k=top_k):
+            sorted_indices = self.reranker.score_and_sort(query_text, contents, top_k=top_k)
 
         # Reorder the original sources based on the reranked indices
-        reranked_sources = [sources[i] for i in sorted_indices]
-        return reranked_sources[:top_k]
+        return [sources[i] for i in sorted_indices]
 
     def answer(
         self,
@@ -154,16 +216,181 @@ class RAGService:
         use_rerank: bool = True,
         search_type: SearchType = SearchType.hybrid,
     ) -> tuple[str, list[RAGSource]]:
-        # Initial retrieval gets more documents than required
+        with tracing.span("rag.answer", search_type=search_type.value, top_k=top_k, rerank=use_rerank):
+            # Initial retrieval gets more documents than required
+            retrieval_k = top_k * 5
+            sources = self.search(tenant_id, kb_id, query_text, retrieval_k, search_type)
+
+            if use_rerank and self.reranker.model:
+                final_sources = self.rerank(query_text, sources, top_k)
+            else:
+                final_sources = sources[:top_k]
+
+            prompt = self._build_prompt(query_text, final_sources)
+            answer = self.llm.generate(prompt, max_tokens=max_tokens)
+            return answer, final_sources
+
+    async def aanswer(
+        self,
+        tenant_id: uuid.UUID,
+        kb_id: uuid.UUID,
+        query_text: str,
+        top_k: int,
+        max_tokens: int = 128,
+        use_rerank: bool = True,
+        search_type: SearchType = SearchType.hybrid,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        kb_version: Optional[int] = None,
+    ) -> tuple[str, list[RAGSource]]:
+        """Async variant of `answer` that keeps every blocking stage off the event loop.
+
+        With ``kb_version`` (the KB's content_version) the answer cache is consulted first.
+        """
+        params = (top_k, max_tokens, use_rerank, search_type.value, ef_search, probes)
+        with tracing.span("rag.answer", search_type=search_type.value, top_k=top_k, rerank=use_rerank) as span:
+            cache, query_vec, cached = await self._cached_answer(tenant_id, kb_id, kb_version, params, query_text, search_type)
+            if cached is not None:
+                if span is not None:
+                    span.set_attribute("answer_cache.hit", True)
+                return cached.answer, cached.sources
+            final_sources = await self._aretrieve(
+                tenant_id,
+                kb_id,
+                query_text,
+                top_k,
+                use_rerank,
+                search_type,
+                ef_search=ef_search,
+                probes=probes,
+                query_vec=query_vec,
+                kb_version=kb_version,
+            )
+            prompt = self._build_prompt(query_text, final_sources)
+            answer = await self.llm.agenerate(prompt, max_tokens=max_tokens)
+            if cache is not None:
+                cache.put(tenant_id, kb_id, kb_version, params, query_text, answer, final_sources, query_vec)
+            return answer, final_sources
+
+    async def astream_answer(
+        self,
+        tenant_id: uuid.UUID,
+        kb_id: uuid.UUID,
+        query_text: str,
+        top_k: int,
+        max_tokens: int = 128,
+        use_rerank: bool = True,
+        search_type: SearchType = SearchType.hybrid,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        kb_version: Optional[int] = None,
+    ) -> AsyncIterator[tuple[str, Any]]:
+        """Yield ("sources", [...]) once retrieval finishes, then ("token", str) per LLM delta.
+
+        A cached answer is sent as a single token event.
+        """
+        params = (top_k, max_tokens, use_rerank, search_type.value, ef_search, probes)
+        cache, query_vec, cached = await self._cached_answer(tenant_id, kb_id, kb_version, params, query_text, search_type)
+        if cached is not None:
+            yield "sources", cached.sources
+            yield "token", cached.answer
+            return
+        final_sources = await self._aretrieve(
+            tenant_id,
+            kb_id,
+            query_text,
+            top_k,
+            use_rerank,
+            search_type,
+            ef_search=ef_search,
+            probes=probes,
+            query_vec=query_vec,
+            kb_version=kb_version,
+        )
+        yield "sources", final_sources
+        prompt = self._build_prompt(query_text, final_sources)
+        deltas: list[str] = []
+        started = time.time_ns()
+        async for delta in self.llm.astream(prompt, max_tokens=max_tokens):
+            deltas.append(delta)
+            yield "token", delta
+        tracing.record_span("llm.stream", started, stage="llm", provider=self.llm.provider, deltas=len(deltas))
+        # Only a stream that ran to completion is cached.
+        if cache is not None:
+            cache.put(tenant_id, kb_id, kb_version, params, query_text, "".join(deltas), final_sources, query_vec)
+
+    async def _cached_answer(
+        self,
+        tenant_id: uuid.UUID,
+        kb_id: uuid.UUID,
+        kb_version: Optional[int],
+        params: Hashable,
+        query_text: str,
+        search_type: SearchType,
+    ) -> tuple[Optional[AnswerCache], Optional[list[float]], Any]:
+        """Look the question up in the answer cache; returns (cache, query vector, hit or None).
+
+        The query vector is computed here for similarity lookups and handed on to retrieval,
+        so a miss does not embed the query twice.
+        """
+        cache = get_answer_cache() if kb_version is not None else None
+        if cache is None:
+            return None, None, None
+        query_vec = None
+        if search_type != SearchType.full_text:
+            query_vec = await self.embedder.aembed_query(query_text)
+        with tracing.span("answer_cache.get", stage="answer_cache") as span:
+            cached = cache.get(tenant_id, kb_id, kb_version, params, query_text, query_vec)
+            if span is not None:
+                span.set_attribute("hit", cached is not None)
+        return cache, query_vec, cached
+
+    async def _aretrieve(
+        self,
+        tenant_id: uuid.UUID,
+        kb_id: uuid.UUID,
+        query_text: str,
+        top_k: int,
+        use_rerank: bool,
+        search_type: SearchType,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        query_vec: Optional[list[float]] = None,
+        kb_version: Optional[int] = None,
+    ) -> list[RAGSource]:
         retrieval_k = top_k * 5
-        sources = self.search(tenant_id, kb_id, query_text, retrieval_k, search_type)
+        # Cached candidates are keyed by the KB's content_version, so ingestion retires them.
+        cache = get_retrieval_cache() if kb_version is not None else None
+        key = ""
+        sources = None
+        if cache is not None:
+            key = retrieval_key(tenant_id, kb_id, kb_version, query_text, search_type.value, retrieval_k, ef_search, probes)
+            with tracing.span("retrieval_cache.get", stage="retrieval_cache") as span:
+                sources = await cache.aget(key)
+                if span is not None:
+                    span.set_attribute("hit", sources is not None)
+        if sources is None:
+            if query_vec is None and search_type != SearchType.full_text:
+                query_vec = await self.embedder.aembed_query(query_text)
+            sources = await run_db(
+                self.search,
+                tenant_id,
+                kb_id,
+                query_text,
+                retrieval_k,
+                search_type,
+                query_vec=query_vec,
+                ef_search=ef_search,
+                probes=probes,
+            )
+            if cache is not None:
+                await cache.aput(key, kb_id, kb_version, sources)
 
-        if use_rerank and self.reranker.model:
-            final_sources = self.rerank(query_text, sources, top_k)
-        else:
-            final_sources = sources[:top_k]
+        if use_rerank and sources:
+            return await run_inference(self.rerank, query_text, sources, top_k)
+        return sources[:top_k]
 
-        context = "\n\n".join(f"- {src.content}" for src in final_sources)
-        prompt = f"Answer the question using the context.\n\nContext:\n{context}\n\nQuestion: {query_text}\nAnswer:"
-        answer = self.llm.generate(prompt, max_tokens=max_tokens)
-        return answer, final_sources
+    def _build_prompt(self, query_text: str, sources: list[RAGSource]) -> str:
+        with tracing.span("rag.prompt", stage="prompt", sources=len(sources)):
+            context = "\n\n".join(f"- {src.content}" for src in sources)
+            return f"Answer the question using the context.\n\nContext:\n{context}\n\nQuestion: {query_text}\nAnswer:"
@@ -0,0 +1,226 @@
+"""Request rate limiting with GCRA (the generic cell rate algorithm, a token bucket in one number).
+
+Each key stores only its theoretical arrival time (TAT): the moment its bucket would be full
+again. A request is allowed while ``TAT - now`` stays within ``burst`` emission intervals
+(``period / limit``), and each allowed request pushes the TAT one interval further. A key
+whose TAT has passed is indistinguishable from a new one, so idle keys can be dropped.
+
+Keys are ``<route class>:<identity>``: the route class (``query`` for ``/rag/...``,
+``ingest`` for ``/ingest`` and ``/ingest_url``, ``default`` otherwise) selects the limit, and
+the identity is the tenant of a valid bearer token, or the client IP.
+
+Backends (``rate_limit_backend``):
+- ``memory``: per process, so the effective limit scales with the number of processes.
+  Refilled keys are swept every minute and at most ``rate_limit_max_keys`` are kept.
+- ``postgres``: the UNLOGGED ``rate_limits`` table (migration 0010), one atomic upsert per
+  request using the database clock, so limits hold across processes and replicas. Refilled
+  rows are deleted every ``rate_limit_purge_interval`` checks. Database errors let the
+  request through.
+"""
+
+import logging
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from sqlalchemy import Float, cast, delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.executors import run_db
+from app.db.session import SessionLocal
+from app.models.entities import RateLimitBucket
+from app.observability import rate_limit_requests_total
+
+logger = logging.getLogger(__name__)
+
+# Probes, scrapes and static files are never limited.
+EXEMPT_PREFIXES = ("/health", "/metrics", "/ui", "/docs", "/redoc", "/openapi.json")
+ROUTE_CLASSES = (("query", ("/rag/",)), ("ingest", ("/ingest",)))
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    limit: int
+    period: float = 60.0
+    burst: int = 0  # 0 = limit
+
+    @property
+    def interval(self) -> float:
+        return self.period / self.limit
+
+    @property
+    def window(self) -> float:
+        return (self.burst or self.limit) * self.interval
+
+
+@dataclass(frozen=True)
+class RateLimitDecision:
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float = 0.0
+
+
+def route_class(path: str) -> Optional[str]:
+    """Which limit applies to ``path``; None for exempt routes and the UI index."""
+    if path == "/" or path.startswith(EXEMPT_PREFIXES):
+        return None
+    for name, prefixes in ROUTE_CLASSES:
+        if path.startswith(prefixes):
+            return name
+    return "default"
+
+
+def rule_for(name: str) -> Optional[RateLimitRule]:
+    """The configured rule for a route class, or None when it is unlimited (limit 0)."""
+    default = int(getattr(settings, "rate_limit_per_minute", 60))
+    limit = default if name == "default" else int(getattr(settings, f"rate_limit_{name}_per_minute", default))
+    if limit <= 0:
+        return None
+    return RateLimitRule(limit=limit, burst=int(getattr(settings, "rate_limit_burst", 0)))
+
+
+def decide(tat: float, now: float, rule: RateLimitRule) -> tuple[RateLimitDecision, float]:
+    """GCRA step: the decision and the key's new TAT (unchanged when denied)."""
+    new_tat = max(tat, now) + rule.interval
+    backlog = new_tat - now
+    if backlog > rule.window + 1e-9:
+        return RateLimitDecision(False, rule.limit, 0, backlog - rule.window), tat
+    return RateLimitDecision(True, rule.limit, _remaining(backlog, rule)), new_tat
+
+
+def _remaining(backlog: float, rule: RateLimitRule) -> int:
+    return max(int(math.floor((rule.window - backlog) / rule.interval + 1e-9)), 0)
+
+
+class RateLimiter(ABC):
+    backend = ""
+
+    @abstractmethod
+    def check(self, key: str, rule: RateLimitRule) -> RateLimitDecision:
+        ...
+
+    async def acheck(self, key: str, rule: RateLimitRule) -> RateLimitDecision:
+        return self.check(key, rule)
+
+
+class MemoryRateLimiter(RateLimiter):
+    backend = "memory"
+
+    def __init__(self, max_keys: int = 100000, sweep_interval: float = 60.0) -> None:
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        self._tats: OrderedDict[str, float] = OrderedDict()
+        self._next_sweep = time.monotonic() + sweep_interval
+        self._lock = threading.Lock()
+
+    def check(self, key: str, rule: RateLimitRule) -> RateLimitDecision:
+        now = time.monotonic()
+        with self._lock:
+            decision, tat = decide(self._tats.get(key, now), now, rule)
+            if decision.allowed:
+                self._tats[key] = tat
+                self._tats.move_to_end(key)
+                while len(self._tats) > self.max_keys:
+                    # Least recently allowed first; losing it only refills that key early.
+                    self._tats.popitem(last=False)
+            if now >= self._next_sweep:
+                self._next_sweep = now + self.sweep_interval
+                for idle in [k for k, k_tat in self._tats.items() if k_tat <= now]:
+                    del self._tats[idle]
+        rate_limit_requests_total.labels(self.backend, "allowed" if decision.allowed else "limited").inc()
+        return decision
+
+    def __len__(self) -> int:
+        return len(self._tats)
+
+
+class PostgresRateLimiter(RateLimiter):
+    backend = "postgres"
+
+    def __init__(self, session_factory: Callable[[], Session], purge_interval: int = 1000) -> None:
+        self.session_factory = session_factory
+        self.purge_interval = purge_interval
+        self._checks = 0
+        self._lock = threading.Lock()
+
+    def check(self, key: str, rule: RateLimitRule) -> RateLimitDecision:
+        # The database clock, not each replica's, decides; one statement keeps it atomic.
+        now = cast(func.extract("epoch", func.statement_timestamp()), Float)
+        table = RateLimitBucket.__table__
+        new_tat = func.greatest(table.c.tat, now) + rule.interval
+        statement = insert(table).values(key=key, tat=now + rule.interval)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_={"tat": new_tat},
+            where=new_tat - now <= rule.window + 1e-9,
+        ).returning(table.c.tat, now)
+        try:
+            with self.session_factory() as db:
+                row = db.execute(statement).one_or_none()
+                if row is None:
+                    # Denied: the row was left as is; read it back for Retry-After.
+                    row = db.execute(select(table.c.tat, now).where(table.c.key == key)).one()
+                    decision, _ = decide(row[0], row[1], rule)
+                else:
+                    decision = RateLimitDecision(True, rule.limit, _remaining(row[0] - row[1], rule))
+                db.commit()
+        except SQLAlchemyError:
+            logger.warning("Rate limit check failed; allowing the request", exc_info=True)
+            rate_limit_requests_total.labels(self.backend, "error").inc()
+            return RateLimitDecision(True, rule.limit, rule.burst or rule.limit)
+        rate_limit_requests_total.labels(self.backend, "allowed" if decision.allowed else "limited").inc()
+        with self._lock:
+            self._checks += 1
+            due = self.purge_interval > 0 and self._checks >= self.purge_interval
+            if due:
+                self._checks = 0
+        if due:
+            self.purge()
+        return decision
+
+    def purge(self) -> int:
+        """Delete rows whose bucket has refilled; they carry no state."""
+        now = cast(func.extract("epoch", func.statement_timestamp()), Float)
+        try:
+            with self.session_factory() as db:
+                result = db.execute(
+                    delete(RateLimitBucket).where(RateLimitBucket.tat <= now).execution_options(synchronize_session=False)
+                )
+                db.commit()
+        except SQLAlchemyError:
+            logger.warning("Rate limit purge failed", exc_info=True)
+            return 0
+        return result.rowcount
+
+    async def acheck(self, key: str, rule: RateLimitRule) -> RateLimitDecision:
+        return await run_db(self.check, key, rule)
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """The process-wide limiter for ``rate_limit_backend``."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                backend = (getattr(settings, "rate_limit_backend", "memory") or "memory").lower()
+                if backend == "memory":
+                    _limiter = MemoryRateLimiter(int(getattr(settings, "rate_limit_max_keys", 100000)))
+                elif backend == "postgres":
+                    _limiter = PostgresRateLimiter(
+                        SessionLocal, purge_interval=int(getattr(settings, "rate_limit_purge_interval", 1000))
+                    )
+                else:
+                    raise ValueError(f"Unknown rate_limit_backend: {backend}")
+    return _limiter
@@ -0,0 +1,223 @@
+"""Cache of retrieval results (the candidates returned by `RAGService.search`).
+
+Keys cover the KB's ``content_version`` (see ``app.services.kb_versions``) along with the
+query and search parameters. Ingestion bumps the version, so results cached before a
+document became READY or FAILED are never looked up again. Stale entries are not scanned
+for; they age out of the memory LRU or are purged from the shared table.
+
+Backends (``retrieval_cache_backend``):
+- ``memory``: a per-process LRU bounded by ``retrieval_cache_max_entries``.
+- ``postgres``: the UNLOGGED ``retrieval_cache`` table (migration 0009), shared by every API
+  process and replica. Expired rows, and rows of replaced versions or deleted KBs, are
+  deleted every ``retrieval_cache_purge_interval`` writes.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import and_, delete, exists, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.executors import run_db
+from app.db.session import SessionLocal
+from app.models.entities import KnowledgeBase, RetrievalCacheEntry
+from app.observability import retrieval_cache_requests_total
+from app.schemas.models import RAGSource
+from app.services.embeddings import EmbeddingService
+
+logger = logging.getLogger(__name__)
+
+
+def retrieval_key(
+    tenant_id: uuid.UUID,
+    kb_id: uuid.UUID,
+    version: int,
+    query_text: str,
+    search_type: str,
+    top_k: int,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+) -> str:
+    # The embedding model and backend are part of the key: vector results depend on both.
+    parts = [
+        tenant_id,
+        kb_id,
+        version,
+        EmbeddingService().cache_model_id,
+        search_type,
+        top_k,
+        ef_search,
+        probes,
+        " ".join(query_text.split()),
+    ]
+    return hashlib.sha256("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+class RetrievalCache(ABC):
+    backend = ""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[list[RAGSource]]:
+        ...
+
+    @abstractmethod
+    def put(self, key: str, kb_id: uuid.UUID, version: int, sources: list[RAGSource]) -> None:
+        ...
+
+    async def aget(self, key: str) -> Optional[list[RAGSource]]:
+        return self.get(key)
+
+    async def aput(self, key: str, kb_id: uuid.UUID, version: int, sources: list[RAGSource]) -> None:
+        self.put(key, kb_id, version, sources)
+
+
+class MemoryRetrievalCache(RetrievalCache):
+    backend = "memory"
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 3600) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, tuple[RAGSource, ...]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[list[RAGSource]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        retrieval_cache_requests_total.labels(self.backend, "miss" if entry is None else "hit").inc()
+        return None if entry is None else list(entry[1])
+
+    def put(self, key: str, kb_id: uuid.UUID, version: int, sources: list[RAGSource]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, tuple(sources))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class PostgresRetrievalCache(RetrievalCache):
+    backend = "postgres"
+
+    def __init__(self, session_factory: Callable[[], Session], ttl_seconds: float = 3600, purge_interval: int = 1000) -> None:
+        self.session_factory = session_factory
+        self.ttl_seconds = ttl_seconds
+        self.purge_interval = purge_interval
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[list[RAGSource]]:
+        try:
+            with self.session_factory() as db:
+                payload = db.scalar(
+                    select(RetrievalCacheEntry.sources).where(
+                        RetrievalCacheEntry.key == key, RetrievalCacheEntry.expires_at > datetime.utcnow()
+                    )
+                )
+        except SQLAlchemyError:
+            logger.warning("Retrieval cache read failed", exc_info=True)
+            payload = None
+        retrieval_cache_requests_total.labels(self.backend, "miss" if payload is None else "hit").inc()
+        if payload is None:
+            return None
+        return [RAGSource(**source) for source in payload]
+
+    def put(self, key: str, kb_id: uuid.UUID, version: int, sources: list[RAGSource]) -> None:
+        # default=str: chunk metadata may hold values (dates, UUIDs) that JSONB cannot take as-is.
+        payload = json.loads(json.dumps([source.dict(by_alias=True) for source in sources], default=str))
+        values = {
+            "key": key,
+            "kb_id": kb_id,
+            "content_version": version,
+            "sources": payload,
+            "expires_at": datetime.utcnow() + timedelta(seconds=self.ttl_seconds),
+        }
+        statement = insert(RetrievalCacheEntry).values(**values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[RetrievalCacheEntry.key],
+            set_={"sources": statement.excluded.sources, "expires_at": statement.excluded.expires_at},
+        )
+        try:
+            with self.session_factory() as db:
+                db.execute(statement)
+                db.commit()
+        except SQLAlchemyError:
+            # Only costs a future hit; the results are already computed.
+            logger.warning("Retrieval cache write failed", exc_info=True)
+            return
+        with self._lock:
+            self._writes += 1
+            due = self.purge_interval > 0 and self._writes >= self.purge_interval
+            if due:
+                self._writes = 0
+        if due:
+            self.purge()
+
+    def purge(self) -> int:
+        """Delete expired rows and rows whose KB has moved to a newer version or is gone."""
+        current = exists().where(
+            and_(
+                KnowledgeBase.id == RetrievalCacheEntry.kb_id,
+                KnowledgeBase.content_version == RetrievalCacheEntry.content_version,
+            )
+        )
+        try:
+            with self.session_factory() as db:
+                result = db.execute(
+                    delete(RetrievalCacheEntry)
+                    .where((RetrievalCacheEntry.expires_at <= datetime.utcnow()) | ~current)
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+        except SQLAlchemyError:
+            logger.warning("Retrieval cache purge failed", exc_info=True)
+            return 0
+        return result.rowcount
+
+    async def aget(self, key: str) -> Optional[list[RAGSource]]:
+        return await run_db(self.get, key)
+
+    async def aput(self, key: str, kb_id: uuid.UUID, version: int, sources: list[RAGSource]) -> None:
+        await run_db(self.put, key, kb_id, version, sources)
+
+
+_cache: Optional[RetrievalCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_retrieval_cache() -> Optional[RetrievalCache]:
+    """The process-wide cache, or None when ``retrieval_cache_backend`` is empty."""
+    global _cache
+    backend = (getattr(settings, "retrieval_cache_backend", "memory") or "").lower()
+    if not backend:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                ttl = float(getattr(settings, "retrieval_cache_ttl_seconds", 3600))
+                if backend == "memory":
+                    _cache = MemoryRetrievalCache(int(getattr(settings, "retrieval_cache_max_entries", 10000)), ttl)
+                elif backend == "postgres":
+                    _cache = PostgresRetrievalCache(
+                        SessionLocal, ttl, purge_interval=int(getattr(settings, "retrieval_cache_purge_interval", 1000))
+                    )
+                else:
+                    raise ValueError(f"Unknown retrieval_cache_backend: {backend}")
+    return _cache
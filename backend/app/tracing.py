@@ -0,0 +1,437 @@
+"""Span tracing for the request path, modelled on OpenTelemetry.
+
+A trace starts per HTTP request (``tracing_enabled``; an incoming W3C ``traceparent`` header
+is continued) and spans nest through a contextvar, which the bounded executors already
+carry into their worker threads. ``span()`` outside a trace is a no-op, so instrumented
+code costs nothing on untraced paths such as the ingestion worker.
+
+Spans may carry a ``stage`` (embedding, search, sql, rerank, prompt, llm, ...). The
+outermost span of each stage is added to the trace's per-stage totals, which back the
+``timings`` block of ``/rag/query`` and the ``rag_stage_latency_ms`` histogram; nested
+spans of the same stage (an encode inside a query embedding) are not counted twice.
+
+Finished traces go to the ``tracing_exporter``:
+- ``""``: not exported.
+- ``memory``: the last ``tracing_memory_traces`` traces, served by ``GET /traces/recent``.
+- ``otlp``: batched to ``tracing_otlp_endpoint`` as OTLP/HTTP JSON, for an OpenTelemetry
+  Collector or ``scripts/otlp_sink.py`` locally.
+"""
+
+import contextvars
+import logging
+import queue
+import re
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, ContextManager, Iterator, Optional
+
+from app.core.config import settings
+from app.observability import rag_stage_latency_ms
+
+logger = logging.getLogger(__name__)
+
+MAX_SPANS_PER_TRACE = 1000
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("rag_current_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "trace", "span_id", "parent", "parent_id", "stage", "attributes", "start_ns", "end_ns", "status", "_counted")
+
+    def __init__(
+        self,
+        name: str,
+        trace: "_Trace",
+        parent: Optional["Span"],
+        stage: Optional[str] = None,
+        attributes: Optional[dict[str, Any]] = None,
+        parent_id: Optional[str] = None,
+    ) -> None:
+        self.name = name
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent = parent
+        self.parent_id = parent.span_id if parent is not None else parent_id
+        self.stage = stage
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = "OK"
+        # Only the outermost span of a stage adds to the stage totals.
+        self._counted = stage is not None and not any(ancestor.stage == stage for ancestor in self._ancestors())
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return None if self.end_ns is None else (self.end_ns - self.start_ns) / 1e6
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self.end_ns is not None:
+            return
+        if error is not None:
+            self.status = "ERROR"
+            self.attributes["error.type"] = type(error).__name__
+        self.end_ns = time.time_ns()
+        self.trace.finish(self)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "stage": self.stage,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+    def _ancestors(self) -> Iterator["Span"]:
+        node = self.parent
+        while node is not None:
+            yield node
+            node = node.parent
+
+
+class _Trace:
+    """Spans of one trace; shared by every thread working on the request."""
+
+    def __init__(self, trace_id: str) -> None:
+        self.trace_id = trace_id
+        self.root: Optional[Span] = None
+        self.spans: list[Span] = []
+        self.stage_ms: dict[str, float] = {}
+        self.dropped = 0
+        self.exported = False
+        self._lock = threading.Lock()
+
+    def finish(self, span: Span) -> None:
+        duration = span.duration_ms or 0.0
+        if span._counted:
+            rag_stage_latency_ms.labels(span.stage).observe(duration)
+        with self._lock:
+            if span._counted:
+                self.stage_ms[span.stage] = self.stage_ms.get(span.stage, 0.0) + duration
+            if len(self.spans) < MAX_SPANS_PER_TRACE:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+            late = self.exported
+            finished = list(self.spans) if span is self.root else None
+            if finished is not None:
+                self.exported = True
+        if late:
+            # Ended after its trace was exported (e.g. a streamed response body); send it alone.
+            _export([span])
+        elif finished is not None:
+            _export(finished)
+
+
+def start_trace(name: str, traceparent: Optional[str] = None, **attributes: Any) -> ContextManager[Span]:
+    """Begin a new trace (continuing a remote parent from a W3C ``traceparent``) with a root span."""
+    return _activate(_root_span(name, traceparent, attributes))
+
+
+@contextmanager
+def span(name: str, stage: Optional[str] = None, root: bool = False, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Child span of the current one. Outside a trace it does nothing, unless ``root`` starts one."""
+    parent = _current.get()
+    if parent is None:
+        if not root:
+            yield None
+            return
+        new = _root_span(name, None, attributes)
+        new.stage = stage
+        new._counted = stage is not None
+    else:
+        new = Span(name, parent.trace, parent, stage, attributes)
+    with _activate(new) as active:
+        yield active
+
+
+def record_span(name: str, start_ns: int, stage: Optional[str] = None, **attributes: Any) -> Optional[Span]:
+    """Record a child span that ended now, for work that cannot run inside a ``with`` block
+    (an async generator must not hold the current span across ``yield``)."""
+    parent = _current.get()
+    if parent is None:
+        return None
+    recorded = Span(name, parent.trace, parent, stage, attributes)
+    recorded.start_ns = start_ns
+    recorded.end()
+    return recorded
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def stage_timings() -> dict[str, float]:
+    """Milliseconds per stage so far in the current trace (empty outside a trace)."""
+    current = _current.get()
+    if current is None:
+        return {}
+    with current.trace._lock:
+        return {stage: round(ms, 3) for stage, ms in current.trace.stage_ms.items()}
+
+
+def enabled() -> bool:
+    return bool(getattr(settings, "tracing_enabled", True))
+
+
+@contextmanager
+def _activate(new: Span) -> Iterator[Span]:
+    token = _current.set(new)
+    try:
+        yield new
+    except BaseException as exc:
+        new.end(error=exc)
+        raise
+    finally:
+        _current.reset(token)
+        new.end()
+
+
+def _root_span(name: str, traceparent: Optional[str], attributes: dict[str, Any]) -> Span:
+    match = _TRACEPARENT.match((traceparent or "").strip().lower())
+    if match and set(match.group(1)) != {"0"}:
+        trace, parent_id = _Trace(match.group(1)), match.group(2)
+    else:
+        trace, parent_id = _Trace(secrets.token_hex(16)), None
+    root = Span(name, trace, None, attributes=attributes, parent_id=parent_id)
+    trace.root = root
+    return root
+
+
+# --- SQLAlchemy ---------------------------------------------------------------------------
+
+
+def instrument_engine(engine: Any) -> None:
+    """Record a ``db.query`` span (stage ``sql``) per statement executed inside a trace."""
+    from sqlalchemy import event
+
+    statement_chars = int(getattr(settings, "tracing_sql_statement_chars", 200) or 0)
+
+    def before(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+        parent = _current.get()
+        if parent is None or context is None:
+            return
+        attributes = {"db.system": conn.dialect.name}
+        if statement_chars:
+            attributes["db.statement"] = " ".join(statement.split())[:statement_chars]
+        context._rag_span = Span("db.query", parent.trace, parent, "sql", attributes)
+
+    def after(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+        query_span = getattr(context, "_rag_span", None)
+        if query_span is not None:
+            query_span.end()
+
+    def on_error(exception_context: Any) -> None:
+        query_span = getattr(exception_context.execution_context, "_rag_span", None)
+        if query_span is not None:
+            query_span.end(error=exception_context.original_exception)
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+    event.listen(engine, "handle_error", on_error)
+
+
+# --- Exporters ----------------------------------------------------------------------------
+
+
+class SpanExporter(ABC):
+    @abstractmethod
+    def export(self, spans: list[Span]) -> None:
+        ...
+
+    def shutdown(self) -> None:
+        pass
+
+
+class InMemoryExporter(SpanExporter):
+    """Keeps the most recent traces for ``GET /traces/recent``."""
+
+    def __init__(self, max_traces: int = 100) -> None:
+        self._traces: deque[list[dict[str, Any]]] = deque(maxlen=max(1, max_traces))
+        self._lock = threading.Lock()
+
+    def export(self, spans: list[Span]) -> None:
+        records = [span.to_dict() for span in sorted(spans, key=lambda s: s.start_ns)]
+        with self._lock:
+            self._traces.append(records)
+
+    def recent(self, limit: Optional[int] = None) -> list[list[dict[str, Any]]]:
+        with self._lock:
+            traces = list(self._traces)
+        return traces[::-1][:limit]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._traces.clear()
+
+
+class OtlpHttpExporter(SpanExporter):
+    """Posts spans as OTLP/HTTP JSON from a background thread.
+
+    Spans are queued (dropping the newest when ``max_queue`` is full, so a slow collector
+    cannot grow memory or block requests) and sent in batches of up to ``batch_size`` at
+    least every ``interval_seconds``.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        service_name: str = "rag-api",
+        batch_size: int = 512,
+        interval_seconds: float = 2.0,
+        max_queue: int = 10000,
+    ) -> None:
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.interval_seconds = interval_seconds
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rag-otlp-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, spans: list[Span]) -> None:
+        for item in spans:
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                logger.debug("OTLP export queue full; dropping span %s", item.name)
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=self.interval_seconds + 5)
+
+    def _run(self) -> None:
+        import httpx
+
+        with httpx.Client(timeout=5.0) as client:
+            while True:
+                stopping = self._stop.wait(self.interval_seconds)
+                while not self._queue.empty():
+                    batch = self._drain()
+                    try:
+                        client.post(self.endpoint, json=otlp_payload(batch, self.service_name)).raise_for_status()
+                    except httpx.HTTPError as exc:
+                        logger.warning("OTLP export of %d spans to %s failed: %s", len(batch), self.endpoint, exc)
+                        break
+                if stopping:
+                    return
+
+    def _drain(self) -> list[Span]:
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+
+def otlp_payload(spans: list[Span], service_name: str = "rag-api") -> dict[str, Any]:
+    """``ExportTraceServiceRequest`` in the OTLP/HTTP JSON encoding."""
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [_otlp_attribute("service.name", service_name)]},
+                "scopeSpans": [
+                    {
+                        "scope": {"name": __name__},
+                        "spans": [
+                            {
+                                "traceId": s.trace_id,
+                                "spanId": s.span_id,
+                                **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                                "name": s.name,
+                                # SPAN_KIND_SERVER for request roots, SPAN_KIND_INTERNAL otherwise.
+                                "kind": 2 if s.parent is None else 1,
+                                "startTimeUnixNano": str(s.start_ns),
+                                "endTimeUnixNano": str(s.end_ns),
+                                "attributes": [
+                                    _otlp_attribute(key, value)
+                                    for key, value in {**s.attributes, **({"rag.stage": s.stage} if s.stage else {})}.items()
+                                ],
+                                # STATUS_CODE_OK = 1, STATUS_CODE_ERROR = 2
+                                "status": {"code": 2 if s.status == "ERROR" else 1},
+                            }
+                            for s in spans
+                        ],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+def _otlp_attribute(key: str, value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+_exporter: Optional[SpanExporter] = None
+_exporter_configured = False
+_exporter_lock = threading.Lock()
+
+
+def get_exporter() -> Optional[SpanExporter]:
+    """The process-wide exporter selected by ``tracing_exporter`` (None when not exporting)."""
+    global _exporter, _exporter_configured
+    if not _exporter_configured:
+        with _exporter_lock:
+            if not _exporter_configured:
+                kind = (getattr(settings, "tracing_exporter", "") or "").lower()
+                if kind == "memory":
+                    _exporter = InMemoryExporter(int(getattr(settings, "tracing_memory_traces", 100)))
+                elif kind == "otlp":
+                    _exporter = OtlpHttpExporter(
+                        getattr(settings, "tracing_otlp_endpoint", "http://localhost:4318/v1/traces"),
+                        service_name=getattr(settings, "tracing_service_name", "rag-api"),
+                    )
+                elif kind:
+                    raise ValueError(f"Unknown tracing_exporter: {kind} (expected memory or otlp)")
+                _exporter_configured = True
+    return _exporter
+
+
+def shutdown_exporter() -> None:
+    global _exporter, _exporter_configured
+    with _exporter_lock:
+        if _exporter is not None:
+            _exporter.shutdown()
+        _exporter, _exporter_configured = None, False
+
+
+def _export(spans: list[Span]) -> None:
+    exporter = get_exporter()
+    if exporter is None:
+        return
+    try:
+        exporter.export(spans)
+    except Exception:  # noqa: BLE001 - tracing must never fail a request
+        logger.exception("Span export failed")
@@ -0,0 +1,195 @@
+"""Standalone ingestion worker.
+
+    python -m app.worker [--concurrency N] [--once]
+
+Claims jobs from ``ingestion_jobs`` (see ``app.services.job_queue``) and runs the ingestion
+pipeline for each on a thread pool, so ingestion throughput scales independently of the
+API replicas. Run as many worker processes as needed; SKIP LOCKED keeps them from
+contending for the same jobs.
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.entities import Document, IngestionJob
+from app.observability import metrics
+from app.services import job_queue
+from app.services.extraction_pool import shutdown_extraction_pool
+from app.services.ingestion import IngestionPipeline
+
+logger = logging.getLogger("rag-worker")
+
+
+class Worker:
+    def __init__(
+        self,
+        concurrency: int | None = None,
+        poll_interval: float | None = None,
+        session_factory: Callable[[], Session] = SessionLocal,
+        worker_id: str | None = None,
+    ) -> None:
+        self.concurrency = max(1, int(concurrency or getattr(settings, "ingest_worker_concurrency", 2)))
+        self.poll_interval = float(poll_interval or getattr(settings, "ingest_poll_interval_seconds", 1.0))
+        self.stats_interval = float(getattr(settings, "ingest_queue_stats_interval_seconds", 15.0))
+        self.session_factory = session_factory
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._active: set[uuid.UUID] = set()
+        self._active_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._next_housekeeping = 0.0
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+
+    def run(self, once: bool = False) -> None:
+        """Poll and process jobs until stopped; with ``once``, return when the queue is drained."""
+        logger.info("Ingestion worker %s starting with concurrency=%d", self.worker_id, self.concurrency)
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name="ingest-heartbeat", daemon=True)
+        heartbeat.start()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ingest") as pool:
+            while not self._stop.is_set():
+                self._wakeup.clear()
+                with self._active_lock:
+                    free = self.concurrency - len(self._active)
+                claimed: list[uuid.UUID] = []
+                if free > 0:
+                    with self.session_factory() as db:
+                        claimed = [job.id for job in job_queue.claim(db, self.worker_id, free)]
+                # Scans the whole jobs table, so not on every poll.
+                if time.monotonic() >= self._next_housekeeping:
+                    self._next_housekeeping = time.monotonic() + self.stats_interval
+                    self._housekeeping()
+                for job_id in claimed:
+                    with self._active_lock:
+                        self._active.add(job_id)
+                    pool.submit(self._run_job, job_id)
+                with self._active_lock:
+                    idle = not self._active
+                if once and idle and not claimed:
+                    break
+                # Woken early when a job finishes and frees a slot.
+                self._wakeup.wait(self.poll_interval)
+        self._stop.set()
+        heartbeat.join(timeout=1)
+        logger.info("Ingestion worker %s stopped", self.worker_id)
+
+    def start_background(self) -> threading.Thread:
+        """Run inside another process (e.g. the API with ``ingest_embedded_worker``)."""
+        thread = threading.Thread(target=self.run, name="ingest-worker", daemon=True)
+        thread.start()
+        return thread
+
+    def _run_job(self, job_id: uuid.UUID) -> None:
+        try:
+            with self.session_factory() as db:
+                job = db.get(IngestionJob, job_id)
+                if job is None:
+                    return
+                with metrics.timeit("ingest_ms"):
+                    error = self._process(db, job)
+                db.refresh(job)
+                if job.lease_owner != self.worker_id:
+                    logger.warning("Lost lease on job %s; leaving it to %s", job_id, job.lease_owner)
+                elif error is None:
+                    job_queue.complete(db, job)
+                else:
+                    job_queue.fail(db, job, error)
+        except Exception:  # noqa: BLE001 - a broken job must not take the worker down
+            logger.exception("Ingestion job %s crashed", job_id)
+        finally:
+            with self._active_lock:
+                self._active.discard(job_id)
+            self._wakeup.set()
+
+    def _process(self, db: Session, job: IngestionJob) -> str | None:
+        """Run the pipeline for ``job``; returns an error message, or None on success."""
+        document = db.get(Document, job.document_id)
+        if document is None:
+            return None  # Deleted while queued; nothing left to do.
+        pipeline = IngestionPipeline(db)
+        try:
+            if job.kind == job_queue.KIND_FILE:
+                # Extractors stream from the spooled file rather than loading it into memory.
+                pipeline.process_uploaded_file(document, Path(job.payload["path"]), job.payload.get("content_hash"))
+            elif job.kind == job_queue.KIND_URL:
+                pipeline.process_url(document)
+            else:
+                return f"Unknown job kind: {job.kind}"
+        except Exception as exc:  # noqa: BLE001
+            db.rollback()
+            return str(exc)
+        # The pipeline records failures on the document rather than raising.
+        db.refresh(document)
+        if document.status == "READY":
+            return None
+        return document.failure_reason or document.status
+
+    def _housekeeping(self) -> None:
+        try:
+            with self.session_factory() as db:
+                purged = job_queue.purge_finished(db)
+                if purged:
+                    logger.info("Purged %d finished ingestion jobs", purged)
+                job_queue.queue_stats(db)
+        except Exception:  # noqa: BLE001
+            logger.exception("Queue housekeeping failed")
+
+    def _heartbeat_loop(self) -> None:
+        interval = max(job_queue.lease_seconds() / 3, 1)
+        while not self._stop.wait(interval):
+            with self._active_lock:
+                active = list(self._active)
+            if not active:
+                continue
+            try:
+                with self.session_factory() as db:
+                    for job_id in active:
+                        if not job_queue.heartbeat(db, job_id, self.worker_id):
+                            logger.warning("Heartbeat for job %s rejected; lease was taken over", job_id)
+            except Exception:  # noqa: BLE001
+                logger.exception("Heartbeat failed")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the ingestion job worker.")
+    parser.add_argument("--concurrency", type=int, help="Jobs processed in parallel (default: ingest_worker_concurrency).")
+    parser.add_argument("--poll-interval", type=float, help="Seconds between polls when the queue is empty.")
+    parser.add_argument("--once", action="store_true", help="Exit once the queue is drained.")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics (queue depth, job outcomes) on this port.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    metrics_port = args.metrics_port or int(getattr(settings, "ingest_worker_metrics_port", 0) or 0)
+    if metrics_port:
+        from prometheus_client import start_http_server
+
+        start_http_server(metrics_port)
+
+    worker = Worker(concurrency=args.concurrency, poll_interval=args.poll_interval)
+    # Finish in-flight jobs on SIGTERM (e.g. a rolling deploy) instead of abandoning them.
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    signal.signal(signal.SIGINT, lambda *_: worker.stop())
+    try:
+        worker.run(once=args.once)
+    finally:
+        shutdown_extraction_pool()
+        metrics.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+"""Throughput, latency and recall benchmarks for retrieval, RAG queries and ingestion.
+
+``corpus`` generates deterministic synthetic knowledge bases, ``harness`` holds the timing,
+ground-truth and JSON result helpers, and ``run`` is the command line::
+
+    PYTHONPATH=backend python -m benchmarks.run load --chunks 100000
+    PYTHONPATH=backend python -m benchmarks.run search --kb-id <id> --output results.json
+    PYTHONPATH=backend python -m benchmarks.run compare baseline.json results.json
+"""
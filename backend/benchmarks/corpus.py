@@ -0,0 +1,183 @@
+"""Deterministic synthetic knowledge bases.
+
+Chunk ``j`` of a corpus is generated from ``(seed, j)`` alone, so any slice can be produced
+without the ones before it and two runs with the same parameters load identical text.
+Text is made of pseudo-words (never English stop words, so full-text search indexes all of
+them). Each chunk belongs to one topic and mixes words from that topic's vocabulary with
+words shared by all topics; word frequencies follow a Zipf law, as in natural text, so some
+terms are common across the KB and most are rare.
+
+Queries are a few distinct words sampled from one chunk, which is recorded as the query's
+source; vector and full-text search both have something to find.
+"""
+
+import json
+import logging
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.db.partitioning import ensure_partition
+from app.models.entities import Document, KnowledgeBase, Tenant
+from app.services import kb_versions
+from app.services.chunk_writer import ChunkWriter, chunk_hash
+from app.services.embeddings import EmbeddingService
+
+logger = logging.getLogger(__name__)
+
+SYLLABLES = ("ka", "lo", "mi", "ren", "tu", "sar", "vel", "dox", "pim", "qua", "zor", "bel", "nit", "gra", "hun", "fex")
+# Second element of the generator seed, keeping chunk and query streams independent.
+_CHUNK_STREAM, _QUERY_STREAM = 0, 1
+
+
+@dataclass(frozen=True)
+class Query:
+    text: str
+    source: int  # index of the chunk the words were taken from
+
+
+@dataclass(frozen=True)
+class SyntheticCorpus:
+    num_chunks: int
+    seed: int = 0
+    topics: int = 100
+    topic_vocabulary: int = 200
+    shared_vocabulary: int = 2000
+    words_per_chunk: int = 120
+    topic_share: float = 0.7
+    zipf_exponent: float = 1.1
+
+    def __post_init__(self) -> None:
+        ranks = np.arange(1, max(self.topic_vocabulary, self.shared_vocabulary) + 1, dtype=np.float64)
+        weights = ranks ** -self.zipf_exponent
+        # Cumulative distributions for inverse-CDF sampling; frozen dataclass, hence object.__setattr__.
+        object.__setattr__(self, "_topic_cdf", _cdf(weights[: self.topic_vocabulary]))
+        object.__setattr__(self, "_shared_cdf", _cdf(weights[: self.shared_vocabulary]))
+
+    @classmethod
+    def from_kb(cls, kb: KnowledgeBase) -> "SyntheticCorpus":
+        """The corpus a KB was loaded from; its parameters are stored in the KB description."""
+        try:
+            return cls(**json.loads(kb.description or "")["synthetic_corpus"])
+        except (ValueError, KeyError, TypeError):
+            raise ValueError(f"Knowledge base {kb.id} was not loaded from a synthetic corpus") from None
+
+    def describe(self) -> dict[str, object]:
+        return {
+            "num_chunks": self.num_chunks,
+            "seed": self.seed,
+            "topics": self.topics,
+            "topic_vocabulary": self.topic_vocabulary,
+            "shared_vocabulary": self.shared_vocabulary,
+            "words_per_chunk": self.words_per_chunk,
+            "topic_share": self.topic_share,
+            "zipf_exponent": self.zipf_exponent,
+        }
+
+    def chunk_text(self, j: int) -> str:
+        if not 0 <= j < self.num_chunks:
+            raise IndexError(f"chunk {j} outside corpus of {self.num_chunks}")
+        rng = np.random.default_rng([self.seed, _CHUNK_STREAM, j])
+        topic = int(rng.integers(self.topics))
+        from_topic = rng.random(self.words_per_chunk) < self.topic_share
+        topic_words = np.searchsorted(self._topic_cdf, rng.random(self.words_per_chunk))
+        shared_words = np.searchsorted(self._shared_cdf, rng.random(self.words_per_chunk))
+        # Word ids: shared vocabulary first, then one block per topic.
+        ids = np.where(from_topic, self.shared_vocabulary + topic * self.topic_vocabulary + topic_words, shared_words)
+        return " ".join(word(int(i)) for i in ids)
+
+    def chunks(self, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+        for j in range(start, self.num_chunks if stop is None else min(stop, self.num_chunks)):
+            yield self.chunk_text(j)
+
+    def queries(self, count: int, words: int = 4) -> list[Query]:
+        queries = []
+        for i in range(count):
+            rng = np.random.default_rng([self.seed, _QUERY_STREAM, i])
+            source = int(rng.integers(self.num_chunks))
+            vocabulary = list(dict.fromkeys(self.chunk_text(source).split()))
+            picked = rng.choice(len(vocabulary), size=min(words, len(vocabulary)), replace=False)
+            queries.append(Query(text=" ".join(vocabulary[p] for p in sorted(picked)), source=source))
+        return queries
+
+    def create_kb(self, db: Session, *, tenant_name: str, kb_name: str) -> KnowledgeBase:
+        """An empty KB (and its tenant, if new) that records this corpus' parameters."""
+        tenant = db.query(Tenant).filter(Tenant.name == tenant_name).first()
+        if tenant is None:
+            tenant = Tenant(name=tenant_name)
+            db.add(tenant)
+            db.flush()
+        kb = KnowledgeBase(tenant_id=tenant.id, name=kb_name, description=json.dumps({"synthetic_corpus": self.describe()}))
+        db.add(kb)
+        db.flush()
+        ensure_partition(db, tenant.id, kb.id)
+        db.commit()
+        return kb
+
+    def load(
+        self,
+        db: Session,
+        embedder: EmbeddingService,
+        *,
+        tenant_name: str,
+        kb_name: str,
+        chunks_per_document: int = 1000,
+        batch_size: int = 1000,
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> KnowledgeBase:
+        """Write the corpus into a new KB, ``chunks_per_document`` chunks per READY document.
+
+        Every chunk's metadata carries its index as ``seq``, which the benchmarks use to match
+        search results against ground truth.
+        """
+        kb = self.create_kb(db, tenant_name=tenant_name, kb_name=kb_name)
+        writer = ChunkWriter(db)
+        model = embedder.model_name
+        for doc_start in range(0, self.num_chunks, chunks_per_document):
+            doc_stop = min(doc_start + chunks_per_document, self.num_chunks)
+            document = Document(
+                tenant_id=kb.tenant_id,
+                kb_id=kb.id,
+                filename=f"synthetic-{doc_start // chunks_per_document:06d}.txt",
+                status="READY",
+                doc_metadata={"synthetic": {"seed": self.seed, "first_chunk": doc_start}},
+            )
+            db.add(document)
+            db.flush()
+            for start in range(doc_start, doc_stop, batch_size):
+                stop = min(start + batch_size, doc_stop)
+                contents = list(self.chunks(start, stop))
+                writer.write(
+                    document,
+                    contents,
+                    embedder.embed_array(contents),
+                    metadata=[{"seq": j} for j in range(start, stop)],
+                    hashes=[chunk_hash(content, model) for content in contents],
+                    ordinals=range(start - doc_start, stop - doc_start),
+                )
+                db.commit()
+                if progress:
+                    progress(stop)
+        kb_versions.bump(db, kb.id)
+        db.commit()
+        logger.info("Loaded %d synthetic chunks into KB %s", self.num_chunks, kb.id)
+        return kb
+
+
+def word(i: int) -> str:
+    """The ``i``-th pseudo-word: ``i`` in base 16 spelled with syllables, at least two of them."""
+    digits = []
+    n = i + len(SYLLABLES)
+    while n:
+        n, digit = divmod(n, len(SYLLABLES))
+        digits.append(SYLLABLES[digit])
+    return "".join(reversed(digits))
+
+
+def _cdf(weights: np.ndarray) -> np.ndarray:
+    cdf = np.cumsum(weights)
+    cdf /= cdf[-1]
+    cdf[-1] = 1.0
+    return cdf
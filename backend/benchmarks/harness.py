@@ -0,0 +1,236 @@
+"""Timing, ground truth and result files shared by the benchmarks."""
+
+import json
+import platform
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional, Sequence
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import make_url, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.entities import Chunk
+
+# Stages that run a model, and stages that are database work; `total` covers both and more.
+MODEL_STAGES = ("embed", "rerank", "llm")
+DB_STAGES = ("search", "write")
+# Settings that change what the numbers mean, recorded with every result.
+RECORDED_SETTINGS = (
+    "database_url",
+    "embedding_model_name",
+    "embedding_backend",
+    "embedding_device",
+    "embedding_batching_enabled",
+    "embedding_cache_memory_mb",
+    "reranker_model_name",
+    "reranker_backend",
+    "reranker_batch_size",
+    "reranker_budget_ms",
+    "onnx_quantize",
+    "vector_dimension",
+    "normalize_embeddings",
+    "hnsw_ef_search",
+    "ivfflat_probes",
+    "hybrid_candidate_multiplier",
+    "chunk_partition_strategy",
+    "llm_provider",
+    "retrieval_cache_backend",
+    "answer_cache_enabled",
+)
+# Metrics `compare` checks, and whether a larger value is better.
+COMPARED_METRICS = {
+    "qps": True,
+    "chunks_per_second": True,
+    "recall_at_k": True,
+    "source_hit_rate": True,
+    "latency.p50_ms": False,
+    "latency.p95_ms": False,
+    "latency.p99_ms": False,
+}
+
+
+class Recorder:
+    """Per-stage durations of every operation, safe to share between worker threads."""
+
+    def __init__(self) -> None:
+        self._samples: dict[str, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(stage, []).append(seconds)
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def samples(self, stage: str) -> list[float]:
+        with self._lock:
+            return list(self._samples.get(stage, ()))
+
+    def summary(self, wall_seconds: float, total_stage: str = "total") -> dict[str, Any]:
+        """QPS over ``wall_seconds``, latency percentiles, and model vs database time."""
+        with self._lock:
+            samples = {stage: list(values) for stage, values in self._samples.items()}
+        operations = len(samples.get(total_stage, ()))
+        stages = {stage: latency_summary(values) for stage, values in samples.items() if stage != total_stage}
+        model = sum(sum(values) for stage, values in samples.items() if stage in MODEL_STAGES)
+        db = sum(sum(values) for stage, values in samples.items() if stage in DB_STAGES)
+        return {
+            "operations": operations,
+            "wall_seconds": round(wall_seconds, 3),
+            "qps": round(operations / wall_seconds, 2) if wall_seconds > 0 else None,
+            "latency": latency_summary(samples.get(total_stage, [])),
+            "stages": stages,
+            "model_seconds": round(model, 3),
+            "db_seconds": round(db, 3),
+        }
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """Linear-interpolated ``q``-th percentile (0-100), None for no values."""
+    if not len(values):
+        return None
+    return float(np.percentile(np.asarray(values, dtype=np.float64), q))
+
+
+def latency_summary(seconds: Sequence[float]) -> dict[str, Any]:
+    values = np.asarray(seconds, dtype=np.float64) * 1000
+    if not len(values):
+        return {"count": 0}
+    return {
+        "count": int(len(values)),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def stored_vectors(db: Session, tenant_id: UUID, kb_id: UUID, batch_size: int = 10_000) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """(``seq`` ids, embedding matrix) blocks of every chunk in the KB, streamed from the database."""
+    seq = Chunk.chunk_metadata["seq"].as_integer()
+    statement = (
+        select(seq, Chunk.embedding)
+        .where(Chunk.tenant_id == tenant_id, Chunk.kb_id == kb_id, Chunk.embedding.is_not(None), seq.is_not(None))
+        .execution_options(yield_per=batch_size)
+    )
+    for rows in db.execute(statement).partitions():
+        yield (
+            np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)),
+            np.stack([np.asarray(row[1], dtype=np.float32) for row in rows]),
+        )
+
+
+def exact_top_k(queries: np.ndarray, blocks: Iterable[tuple[np.ndarray, np.ndarray]], k: int) -> np.ndarray:
+    """Ids of each query's ``k`` nearest vectors by cosine similarity, best first.
+
+    Brute force over ``blocks`` of (ids, vectors), keeping only a running top ``k`` per
+    query, so memory does not grow with the corpus. Rows with fewer than ``k`` vectors are
+    padded with -1.
+    """
+    queries = _unit(np.asarray(queries, dtype=np.float32))
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_ids = np.full((len(queries), k), -1, dtype=np.int64)
+    for ids, vectors in blocks:
+        scores = queries @ _unit(vectors).T
+        merged_scores = np.concatenate([best_scores, scores], axis=1)
+        merged_ids = np.concatenate([best_ids, np.broadcast_to(ids, scores.shape)], axis=1)
+        keep = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(merged_scores, keep, axis=1)
+        best_ids = np.take_along_axis(merged_ids, keep, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return np.take_along_axis(best_ids, order, axis=1)
+
+
+def recall_at_k(retrieved: Sequence[Sequence[int]], truth: np.ndarray, k: int) -> Optional[float]:
+    """Mean fraction of each query's exact top ``k`` found in its first ``k`` results."""
+    if not len(retrieved):
+        return None
+    found = 0
+    expected = 0
+    for results, exact in zip(retrieved, truth):
+        wanted = {int(i) for i in exact[:k] if i >= 0}
+        found += len(wanted & {int(i) for i in list(results)[:k]})
+        expected += len(wanted)
+    return round(found / expected, 4) if expected else None
+
+
+def environment() -> dict[str, Any]:
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git("rev-parse", "HEAD"),
+        "git_dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {name: _setting(name) for name in RECORDED_SETTINGS},
+    }
+
+
+def write_result(path: Optional[str], result: dict[str, Any]) -> None:
+    """Write ``result`` as JSON to ``path``, or stdout when no path is given."""
+    payload = json.dumps(result, indent=2, default=str)
+    if path:
+        Path(path).write_text(payload + "\n")
+    else:
+        print(payload)
+
+
+def compare(baseline: dict[str, Any], current: dict[str, Any], threshold: float = 0.1) -> list[dict[str, Any]]:
+    """Metrics of ``current`` worse than ``baseline`` by more than ``threshold`` (relative)."""
+    regressions = []
+    for name, base in baseline.get("results", {}).items():
+        now = current.get("results", {}).get(name)
+        if now is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            before, after = _lookup(base, metric), _lookup(now, metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append(
+                    {"benchmark": name, "metric": metric, "baseline": before, "current": after, "change": round(change, 4)}
+                )
+    return regressions
+
+
+def _lookup(result: dict[str, Any], dotted: str) -> Optional[float]:
+    value: Any = result
+    for part in dotted.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+def _setting(name: str) -> Any:
+    value = getattr(settings, name, None)
+    if name == "database_url" and value:
+        return make_url(value).render_as_string(hide_password=True)
+    return value
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", *args], cwd=Path(__file__).resolve().parent, capture_output=True, text=True, check=True, timeout=10
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
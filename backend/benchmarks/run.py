@@ -0,0 +1,382 @@
+"""Benchmark command line.
+
+Examples:
+    PYTHONPATH=backend python -m benchmarks.run load --chunks 1000000
+    PYTHONPATH=backend python -m benchmarks.run search --kb-id <id> --concurrency 8 --output search.json
+    PYTHONPATH=backend python -m benchmarks.run ingest --chunks 20000 --output ingest.json
+    PYTHONPATH=backend python -m benchmarks.run http --kb-id <id> --search-type hybrid --rerank --output http.json
+    PYTHONPATH=backend python -m benchmarks.run compare baseline.json search.json --threshold 0.1
+
+``--models stub`` (the default) swaps the embedding model, reranker and LLM for the
+deterministic stubs, so numbers reflect the database and the service code; pass
+``--models configured`` to include the configured models. ``compare`` exits non-zero when a
+metric regressed by more than the threshold.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Optional
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.entities import Document, KnowledgeBase
+from app.schemas.models import SearchType
+from app.services.embeddings import EmbeddingService
+from app.services.ingestion import IngestionPipeline
+from app.services.rag import RAGService
+from benchmarks.corpus import Query, SyntheticCorpus
+from benchmarks.harness import Recorder, compare, environment, exact_top_k, recall_at_k, stored_vectors, write_result
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Retrieval, RAG and ingestion benchmarks on synthetic corpora.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    load = sub.add_parser("load", help="Load a synthetic corpus into a new knowledge base.")
+    ingest = sub.add_parser("ingest", help="Time the ingestion pipeline on a synthetic corpus.")
+    for cmd, chunks, seed in ((load, 10_000, 0), (ingest, 2_000, 1)):
+        cmd.add_argument("--chunks", type=int, default=chunks, help=f"Corpus size in chunks (default: {chunks}).")
+        cmd.add_argument("--seed", type=int, default=seed)
+        cmd.add_argument("--topics", type=int, default=100)
+        cmd.add_argument("--words-per-chunk", type=int, default=120)
+        cmd.add_argument("--tenant", default="benchmark", help="Tenant name (created if missing).")
+        cmd.add_argument("--kb-name", default=None)
+    load.add_argument("--chunks-per-document", type=int, default=1000)
+    load.add_argument("--batch-size", type=int, default=1000, help="Chunks embedded and written per commit.")
+    ingest.add_argument("--chunks-per-document", type=int, default=200)
+    ingest.add_argument("--concurrency", type=int, default=1, help="Documents ingested in parallel.")
+
+    search = sub.add_parser("search", help="RAGService.search for each search type.")
+    http = sub.add_parser("http", help="POST /rag/query, in-process or against --base-url.")
+    for cmd in (search, http):
+        cmd.add_argument("--kb-id", required=True, help="A KB created by `load`.")
+        cmd.add_argument("--queries", type=int, default=200)
+        cmd.add_argument("--warmup", type=int, default=20, help="Untimed queries run first.")
+        cmd.add_argument("--top-k", type=int, default=10)
+        cmd.add_argument("--concurrency", type=int, default=1)
+        cmd.add_argument(
+            "--search-type", dest="search_types", action="append", choices=[t.value for t in SearchType],
+            help="Repeatable; all types by default.",
+        )
+        cmd.add_argument("--rerank", action="store_true", help="Rerank top_k * 5 candidates.")
+        cmd.add_argument("--ef-search", type=int)
+        cmd.add_argument("--probes", type=int)
+    search.add_argument("--no-recall", action="store_true", help="Skip the brute-force ground truth.")
+    http.add_argument("--base-url", help="Benchmark a running server instead of the app in-process.")
+    http.add_argument("--tenant-id", help="Tenant of --kb-id; looked up in the database if omitted.")
+
+    for cmd in (load, ingest, search, http):
+        cmd.add_argument(
+            "--models", choices=("stub", "configured"), default="stub",
+            help="stub: deterministic embeddings, reranker and LLM (default); configured: settings.toml models.",
+        )
+        cmd.add_argument("--output", help="Result JSON path (default: stdout).")
+
+    cmp = sub.add_parser("compare", help="Report metrics that regressed between two result files.")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+    cmp.add_argument("--threshold", type=float, default=0.1, help="Relative change counted as a regression (default: 0.1).")
+    return parser
+
+
+def use_stub_models() -> None:
+    settings.set("embedding_backend", "stub")
+    settings.set("reranker_backend", "stub")
+    settings.set("llm_provider", "stub")
+
+
+def run_load(args: argparse.Namespace) -> dict[str, Any]:
+    corpus = _corpus(args)
+    start = time.perf_counter()
+    with SessionLocal() as db:
+        kb = corpus.load(
+            db,
+            EmbeddingService(),
+            tenant_name=args.tenant,
+            kb_name=args.kb_name or f"synthetic-{args.chunks}-{args.seed}",
+            chunks_per_document=args.chunks_per_document,
+            batch_size=args.batch_size,
+            progress=lambda done: print(f"{done}/{corpus.num_chunks} chunks", file=sys.stderr),
+        )
+        kb_id, tenant_id = str(kb.id), str(kb.tenant_id)
+    wall = time.perf_counter() - start
+    return {
+        "benchmark": "load",
+        "kb_id": kb_id,
+        "tenant_id": tenant_id,
+        "corpus": corpus.describe(),
+        "results": {"load": {"wall_seconds": round(wall, 3), "chunks_per_second": round(corpus.num_chunks / wall, 2)}},
+    }
+
+
+def run_search(args: argparse.Namespace) -> dict[str, Any]:
+    kb, corpus = _synthetic_kb(args.kb_id)
+    queries = corpus.queries(args.warmup + args.queries)
+    warmup, queries = queries[: args.warmup], queries[args.warmup :]
+    truth = None
+    if not args.no_recall:
+        with SessionLocal() as db:
+            vectors = EmbeddingService().embed_array([query.text for query in queries])
+            truth = exact_top_k(vectors, stored_vectors(db, kb.tenant_id, kb.id), args.top_k)
+
+    results = {}
+    for search_type in _search_types(args):
+        recorder = Recorder()
+        sessions = []
+        local = threading.local()
+
+        def service() -> RAGService:
+            if not hasattr(local, "service"):
+                local.service = RAGService(SessionLocal())
+                sessions.append(local.service.db)
+            return local.service
+
+        def one(query: Query, recorder: Recorder = recorder, search_type: SearchType = search_type) -> list[int]:
+            rag = service()
+            start = time.perf_counter()
+            query_vec = None
+            if search_type != SearchType.full_text:
+                with recorder.time("embed"):
+                    query_vec = rag.embedder.embed_query(query.text)
+            with recorder.time("search"):
+                try:
+                    sources = rag.search(
+                        kb.tenant_id,
+                        kb.id,
+                        query.text,
+                        args.top_k * 5 if args.rerank else args.top_k,
+                        search_type,
+                        query_vec=query_vec,
+                        ef_search=args.ef_search,
+                        probes=args.probes,
+                    )
+                finally:
+                    # Ends the transaction, like the per-request session in the API.
+                    rag.db.rollback()
+            retrieved = [_seq(source.metadata) for source in sources[: args.top_k]]
+            if args.rerank:
+                with recorder.time("rerank"):
+                    rag.rerank(query.text, sources, args.top_k)
+            recorder.add("total", time.perf_counter() - start)
+            return retrieved
+
+        try:
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                list(pool.map(lambda query: one(query, Recorder()), warmup))
+                start = time.perf_counter()
+                retrieved = list(pool.map(one, queries))
+                wall = time.perf_counter() - start
+        finally:
+            for session in sessions:
+                session.close()
+
+        summary = recorder.summary(wall)
+        # Recall against the exact nearest neighbours only means something for the dense side.
+        summary["recall_at_k"] = (
+            recall_at_k(retrieved, truth, args.top_k) if truth is not None and search_type != SearchType.full_text else None
+        )
+        summary["source_hit_rate"] = _source_hit_rate(queries, retrieved)
+        results[search_type.value] = summary
+
+    return {
+        "benchmark": "search",
+        "kb_id": str(kb.id),
+        "corpus": corpus.describe(),
+        "params": _params(args, "queries", "warmup", "top_k", "concurrency", "rerank", "ef_search", "probes"),
+        "results": results,
+    }
+
+
+class _TimedEmbeddingService(EmbeddingService):
+    """Records model time separately from the rest of the ingestion pipeline."""
+
+    def __init__(self, recorder: Recorder) -> None:
+        super().__init__()
+        self.recorder = recorder
+        self.seconds = 0.0
+
+    def embed_array(self, texts: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return super().embed_array(texts)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.seconds += elapsed
+            self.recorder.add("embed", elapsed)
+
+
+def run_ingest(args: argparse.Namespace) -> dict[str, Any]:
+    corpus = _corpus(args)
+    with SessionLocal() as db:
+        kb = corpus.create_kb(db, tenant_name=args.tenant, kb_name=args.kb_name or f"synthetic-ingest-{args.seed}")
+        tenant_id, kb_id = kb.tenant_id, kb.id
+
+    recorder = Recorder()
+    ranges = [(start, min(start + args.chunks_per_document, corpus.num_chunks)) for start in range(0, corpus.num_chunks, args.chunks_per_document)]
+
+    def one(bounds: tuple[int, int]) -> int:
+        start, stop = bounds
+        with SessionLocal() as db:
+            document = Document(tenant_id=tenant_id, kb_id=kb_id, filename=f"synthetic-{start:09d}.txt", status="PROCESSING")
+            db.add(document)
+            db.commit()
+            pipeline = IngestionPipeline(db)
+            pipeline.embedder = embedder = _TimedEmbeddingService(recorder)
+            began = time.perf_counter()
+            count = pipeline.process_document(document, corpus.chunks(start, stop))
+            elapsed = time.perf_counter() - began
+        recorder.add("write", elapsed - embedder.seconds)
+        recorder.add("total", elapsed)
+        return count
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        chunks = sum(pool.map(one, ranges))
+    wall = time.perf_counter() - start
+
+    summary = recorder.summary(wall)
+    summary["chunks_per_second"] = round(chunks / wall, 2) if wall > 0 else None
+    return {
+        "benchmark": "ingest",
+        "kb_id": str(kb_id),
+        "corpus": corpus.describe(),
+        "params": _params(args, "chunks_per_document", "concurrency"),
+        "results": {"ingest": summary},
+    }
+
+
+def run_http(args: argparse.Namespace) -> dict[str, Any]:
+    kb, corpus = _synthetic_kb(args.kb_id)
+    queries = corpus.queries(args.warmup + args.queries)
+    results = {}
+    for search_type in _search_types(args):
+        results[search_type.value] = asyncio.run(_http_search_type(args, kb, queries, search_type))
+    return {
+        "benchmark": "http",
+        "kb_id": str(kb.id),
+        "base_url": args.base_url,
+        "corpus": corpus.describe(),
+        "params": _params(args, "queries", "warmup", "top_k", "concurrency", "rerank", "ef_search", "probes"),
+        "results": results,
+    }
+
+
+async def _http_search_type(args: argparse.Namespace, kb: KnowledgeBase, queries: list[Query], search_type: SearchType) -> dict[str, Any]:
+    import httpx
+    from jose import jwt
+
+    token = jwt.encode(
+        {"tenant_id": args.tenant_id or str(kb.tenant_id), "exp": datetime.utcnow() + timedelta(hours=1)},
+        settings.JWT_SECRET,
+        algorithm=settings.JWT_ALGORITHM,
+    )
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60)
+    else:
+        from app.main import app
+
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=60)
+
+    recorder = Recorder()
+    retrieved: dict[int, list[int]] = {}
+
+    async def one(index: int, query: Query, recorder: Recorder) -> None:
+        body = {
+            "kb_id": str(kb.id),
+            "query": query.text,
+            "top_k": args.top_k,
+            "use_rerank": args.rerank,
+            "search_type": search_type.value,
+            "ef_search": args.ef_search,
+            "probes": args.probes,
+        }
+        start = time.perf_counter()
+        response = await client.post("/rag/query", json=body, headers={"Authorization": f"Bearer {token}"})
+        elapsed = time.perf_counter() - start
+        response.raise_for_status()
+        payload = response.json()
+        recorder.add("total", elapsed)
+        recorder.add("server", payload["latency_ms"] / 1000)
+        retrieved[index] = [_seq(source.get("metadata")) for source in payload["sources"]]
+
+    async def worker(items: list[tuple[int, Query]], recorder: Recorder) -> None:
+        for index, query in items:
+            await one(index, query, recorder)
+
+    async def run(items: list[tuple[int, Query]], recorder: Recorder) -> float:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(items[i :: args.concurrency], recorder) for i in range(args.concurrency)))
+        return time.perf_counter() - start
+
+    indexed = list(enumerate(queries))
+    async with client:
+        await run(indexed[: args.warmup], Recorder())
+        measured = indexed[args.warmup :]
+        wall = await run(measured, recorder)
+
+    summary = recorder.summary(wall)
+    summary["source_hit_rate"] = _source_hit_rate([query for _, query in measured], [retrieved[index] for index, _ in measured])
+    return summary
+
+
+def run_compare(args: argparse.Namespace) -> int:
+    baseline = json.loads(Path(args.baseline).read_text())
+    current = json.loads(Path(args.current).read_text())
+    regressions = compare(baseline, current, args.threshold)
+    print(json.dumps({"threshold": args.threshold, "regressions": regressions}, indent=2))
+    return 1 if regressions else 0
+
+
+def _corpus(args: argparse.Namespace) -> SyntheticCorpus:
+    return SyntheticCorpus(num_chunks=args.chunks, seed=args.seed, topics=args.topics, words_per_chunk=args.words_per_chunk)
+
+
+def _synthetic_kb(kb_id: str) -> tuple[KnowledgeBase, SyntheticCorpus]:
+    with SessionLocal() as db:
+        kb = db.get(KnowledgeBase, uuid.UUID(kb_id))
+        if kb is None:
+            raise SystemExit(f"Knowledge base {kb_id} not found")
+        db.expunge(kb)
+    return kb, SyntheticCorpus.from_kb(kb)
+
+
+def _search_types(args: argparse.Namespace) -> list[SearchType]:
+    return [SearchType(value) for value in (args.search_types or [t.value for t in SearchType])]
+
+
+def _params(args: argparse.Namespace, *names: str) -> dict[str, Any]:
+    return {"models": args.models, **{name: getattr(args, name) for name in names}}
+
+
+def _seq(metadata: Optional[dict[str, Any]]) -> int:
+    return int((metadata or {}).get("seq", -1))
+
+
+def _source_hit_rate(queries: list[Query], retrieved: list[list[int]]) -> Optional[float]:
+    """Fraction of queries whose source chunk is among the results."""
+    if not queries:
+        return None
+    return round(sum(query.source in results for query, results in zip(queries, retrieved)) / len(queries), 4)
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    if args.command == "compare":
+        sys.exit(run_compare(args))
+    if args.models == "stub":
+        use_stub_models()
+    runners = {"load": run_load, "search": run_search, "ingest": run_ingest, "http": run_http}
+    result = runners[args.command](args)
+    write_result(args.output, {**result, "environment": environment()})
+
+
+if __name__ == "__main__":
+    main()
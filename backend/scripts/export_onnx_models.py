@@ -0,0 +1,49 @@
+"""Export the configured embedding and reranker models for the onnx inference backend.
+
+Examples:
+    python backend/scripts/export_onnx_models.py
+    python backend/scripts/export_onnx_models.py --kind reranker --no-quantize
+    python backend/scripts/export_onnx_models.py --output-dir /models/onnx
+
+Run it where torch and sentence-transformers are installed (e.g. a build stage) and ship
+``onnx_model_dir`` to CPU-only API images, which then need only onnxruntime and transformers.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.core.config import settings  # noqa: E402
+from app.services import inference_backends  # noqa: E402
+from app.services.rerank import DEFAULT_RERANKER_MODEL  # noqa: E402
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Export models to ONNX for the onnx inference backend.")
+    parser.add_argument("--kind", choices=["embedding", "reranker", "all"], default="all")
+    parser.add_argument("--output-dir", help="Overrides onnx_model_dir.")
+    parser.add_argument("--no-quantize", action="store_true", help="Keep fp32 weights (onnx_quantize = false).")
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    if args.output_dir:
+        settings.set("onnx_model_dir", args.output_dir)
+    quantize = not args.no_quantize and bool(getattr(settings, "onnx_quantize", True))
+    models = {
+        "embedding": settings.EMBEDDING_MODEL_NAME,
+        "reranker": settings.RERANKER_MODEL_NAME or DEFAULT_RERANKER_MODEL,
+    }
+    for kind, model_name in models.items():
+        if args.kind not in (kind, "all"):
+            continue
+        directory = inference_backends.onnx_model_dir(kind, model_name, quantize)
+        inference_backends.export(kind, model_name, directory, quantize)
+        print(f"{kind}: {model_name} -> {directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Convert the chunks table to (or from) a partitioned layout and inspect partitions.
+
+Examples:
+    python backend/scripts/manage_chunk_partitions.py status
+    python backend/scripts/manage_chunk_partitions.py convert --strategy list --key kb_id
+    python backend/scripts/manage_chunk_partitions.py convert --strategy hash --key tenant_id --partitions 32
+    python backend/scripts/manage_chunk_partitions.py prune
+    python backend/scripts/manage_chunk_partitions.py revert
+
+convert/revert copy every chunk in one transaction and hold an exclusive lock on chunks
+while doing so: run them in a maintenance window, then set RAG_CHUNK_PARTITION_STRATEGY
+(and RAG_CHUNK_PARTITION_KEY) to match so new KBs get their partition and queries are routed.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import text  # noqa: E402
+
+from app.db import partitioning  # noqa: E402
+from app.db.session import engine  # noqa: E402
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Manage partitioning of the chunks table.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("status", help="Show the partition key and per-partition sizes.")
+
+    convert = sub.add_parser("convert", help="Rewrite chunks as a partitioned table, moving existing rows.")
+    convert.add_argument("--strategy", choices=partitioning.STRATEGIES, required=True)
+    convert.add_argument("--key", choices=partitioning.KEYS, default="kb_id")
+    convert.add_argument("--partitions", type=int, help="Hash partition count (default: chunk_hash_partitions).")
+
+    sub.add_parser("revert", help="Rewrite a partitioned chunks table back into a single table.")
+    sub.add_parser("prune", help="Drop list partitions of deleted knowledge bases or tenants.")
+
+    for cmd in sub.choices.values():
+        cmd.add_argument("--maintenance-work-mem", help="e.g. 2GB; speeds up index builds after the copy.")
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+
+    with engine.begin() as conn:
+        if args.maintenance_work_mem:
+            conn.execute(text("SELECT set_config('maintenance_work_mem', :value, true)"), {"value": args.maintenance_work_mem})
+        if args.command == "convert":
+            partitioning.convert(conn, args.strategy, args.key, hash_partitions=args.partitions)
+        elif args.command == "revert":
+            partitioning.revert(conn)
+        elif args.command == "prune":
+            print(json.dumps({"dropped": partitioning.prune(conn)}, indent=2))
+        print(json.dumps(partitioning.status(conn), default=str, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Create, rebuild and tune the pgvector ANN index on chunks.embedding.
+
+Examples:
+    python backend/scripts/manage_vector_index.py status
+    python backend/scripts/manage_vector_index.py create --method hnsw --m 16 --ef-construction 64
+    python backend/scripts/manage_vector_index.py rebuild --method ivfflat --lists 1000
+    python backend/scripts/manage_vector_index.py tune
+
+Builds run CONCURRENTLY by default so ingestion is not blocked; pass --blocking for a faster
+build on an idle database.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import text  # noqa: E402
+
+from app.db import vector_index  # noqa: E402
+from app.db.session import engine  # noqa: E402
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Manage the ANN index on chunks.embedding.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("status", help="Show the current index definition and size.")
+
+    for name, help_text in (("create", "Create the index if it is missing."), ("rebuild", "Rebuild or re-parameterise the index.")):
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument("--method", choices=vector_index.METHODS, default=None if name == "rebuild" else "hnsw")
+        cmd.add_argument("--m", type=int, help="HNSW max connections per layer.")
+        cmd.add_argument("--ef-construction", type=int, help="HNSW build-time candidate list size.")
+        cmd.add_argument("--lists", type=int, help="IVFFlat list count.")
+
+    sub.add_parser("tune", help="Rebuild IVFFlat with a list count sized to the table.")
+    sub.add_parser("drop", help="Drop the index.")
+
+    for cmd in sub.choices.values():
+        cmd.add_argument("--blocking", action="store_true", help="Build without CONCURRENTLY (locks writes).")
+        cmd.add_argument("--maintenance-work-mem", help="e.g. 2GB; keeps HNSW builds in memory.")
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    concurrently = not args.blocking
+    options = {
+        key: value
+        for key, value in {
+            "m": getattr(args, "m", None),
+            "ef_construction": getattr(args, "ef_construction", None),
+            "lists": getattr(args, "lists", None),
+        }.items()
+        if value
+    }
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if args.maintenance_work_mem:
+            conn.execute(text("SELECT set_config('maintenance_work_mem', :value, false)"), {"value": args.maintenance_work_mem})
+        if args.command == "create":
+            vector_index.create_index(conn, args.method, concurrently=concurrently, **options)
+        elif args.command == "rebuild":
+            vector_index.rebuild_index(conn, args.method, concurrently=concurrently, **options)
+        elif args.command == "tune":
+            print(f"lists: {vector_index.tune_ivfflat(conn, concurrently=concurrently)}")
+        elif args.command == "drop":
+            vector_index.drop_index(conn, concurrently=concurrently)
+        print(json.dumps(vector_index.index_status(conn), default=str, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Local stand-in for an OpenTelemetry Collector: receives OTLP/HTTP JSON traces and prints them.
+
+Example:
+    python backend/scripts/otlp_sink.py --port 4318 --output traces.jsonl
+    RAG_TRACING_EXPORTER=otlp uvicorn app.main:app --app-dir backend
+
+Each received trace is printed as an indented span tree with durations; ``--output`` also
+appends every span as one JSON line for later analysis. Only the JSON encoding is accepted,
+which is what ``tracing_exporter = "otlp"`` sends.
+"""
+
+import argparse
+import json
+import sys
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional, TextIO
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Print traces posted as OTLP/HTTP JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4318, help="Default: 4318, the OTLP/HTTP port.")
+    parser.add_argument("--output", help="Append received spans as JSON lines to this file.")
+    parser.add_argument("--quiet", action="store_true", help="Do not print span trees.")
+    return parser
+
+
+def flatten(payload: dict[str, Any]) -> list[dict[str, Any]]:
+    """Spans of an ExportTraceServiceRequest with attributes as a plain dict and durations in ms."""
+    spans = []
+    for resource_spans in payload.get("resourceSpans", []):
+        resource = _attributes(resource_spans.get("resource", {}).get("attributes", []))
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for span in scope_spans.get("spans", []):
+                start, end = int(span["startTimeUnixNano"]), int(span["endTimeUnixNano"])
+                spans.append(
+                    {
+                        "service": resource.get("service.name"),
+                        "trace_id": span["traceId"],
+                        "span_id": span["spanId"],
+                        "parent_id": span.get("parentSpanId"),
+                        "name": span["name"],
+                        "start_ns": start,
+                        "duration_ms": round((end - start) / 1e6, 3),
+                        "status": "ERROR" if span.get("status", {}).get("code") == 2 else "OK",
+                        "attributes": _attributes(span.get("attributes", [])),
+                    }
+                )
+    return spans
+
+
+def render(spans: list[dict[str, Any]]) -> str:
+    """Indented span trees, one per trace, children in start order."""
+    by_trace: dict[str, list[dict[str, Any]]] = defaultdict(list)
+    for span in spans:
+        by_trace[span["trace_id"]].append(span)
+    lines = []
+    for trace_id, trace_spans in by_trace.items():
+        ids = {span["span_id"] for span in trace_spans}
+        children: dict[Optional[str], list[dict[str, Any]]] = defaultdict(list)
+        for span in sorted(trace_spans, key=lambda s: s["start_ns"]):
+            # Spans whose parent is not in this batch (remote or already sent) are shown as roots.
+            children[span["parent_id"] if span["parent_id"] in ids else None].append(span)
+        lines.append(f"trace {trace_id}")
+
+        def walk(parent: Optional[str], depth: int) -> None:
+            for span in children.get(parent, []):
+                stage = span["attributes"].get("rag.stage")
+                flag = " ERROR" if span["status"] == "ERROR" else ""
+                lines.append(f"{'  ' * depth}{span['name']}{f' [{stage}]' if stage else ''} {span['duration_ms']:.1f} ms{flag}")
+                walk(span["span_id"], depth + 1)
+
+        walk(None, 1)
+    return "\n".join(lines)
+
+
+def make_handler(output: Optional[TextIO], quiet: bool) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:  # noqa: N802 - http.server naming
+            if self.path.rstrip("/") != "/v1/traces":
+                self.send_error(404)
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("content-length") or 0)))
+                spans = flatten(payload)
+            except (ValueError, KeyError, TypeError) as exc:
+                self.send_error(400, f"Invalid OTLP JSON: {exc}")
+                return
+            if output is not None:
+                for span in spans:
+                    output.write(json.dumps(span) + "\n")
+                output.flush()
+            if not quiet:
+                print(render(spans), flush=True)
+            body = b"{}"
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - signature from http.server
+            pass
+
+    return Handler
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    output = open(args.output, "a", encoding="utf-8") if args.output else None
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(output, args.quiet))
+    print(f"Receiving OTLP/HTTP JSON on http://{args.host}:{args.port}/v1/traces", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if output is not None:
+            output.close()
+
+
+def _attributes(attributes: list[dict[str, Any]]) -> dict[str, Any]:
+    values = {}
+    for attribute in attributes:
+        typed = attribute.get("value", {})
+        if "intValue" in typed:
+            values[attribute["key"]] = int(typed["intValue"])
+        elif typed:
+            values[attribute["key"]] = next(iter(typed.values()))
+    return values
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import uuid
+from unittest.mock import patch
+
+from app.schemas.models import RAGSource
+from app.services.answer_cache import AnswerCache, normalize_query
+
+TENANT = uuid.uuid4()
+KB = uuid.uuid4()
+PARAMS = (5, 128, True, "hybrid", None, None)
+SOURCES = [RAGSource(document_id="doc1", chunk_id="c1", content="content1")]
+
+
+def test_normalize_query_ignores_case_whitespace_and_edge_punctuation():
+    assert normalize_query("  What is   the refund POLICY? ") == "what is the refund policy"
+
+
+def test_exact_match_after_normalization():
+    cache = AnswerCache()
+    cache.put(TENANT, KB, 1, PARAMS, "What is the refund policy?", "30 days", SOURCES)
+
+    hit = cache.get(TENANT, KB, 1, PARAMS, "what is the  refund policy")
+    assert hit is not None and hit.answer == "30 days"
+    assert hit.sources == SOURCES
+    assert cache.get(TENANT, KB, 1, (3, 128, True, "hybrid", None, None), "what is the refund policy") is None
+    assert cache.get(uuid.uuid4(), KB, 1, PARAMS, "what is the refund policy") is None
+
+
+def test_semantic_match_respects_threshold():
+    cache = AnswerCache(similarity_threshold=0.95)
+    cache.put(TENANT, KB, 1, PARAMS, "refund policy", "30 days", SOURCES, query_vec=[1.0, 0.0])
+
+    assert cache.get(TENANT, KB, 1, PARAMS, "how do refunds work", query_vec=[0.99, 0.05]).answer == "30 days"
+    assert cache.get(TENANT, KB, 1, PARAMS, "shipping times", query_vec=[0.6, 0.8]) is None
+
+
+def test_newer_kb_version_invalidates_and_stale_put_is_dropped():
+    cache = AnswerCache()
+    cache.put(TENANT, KB, 1, PARAMS, "q", "old", SOURCES)
+
+    assert cache.get(TENANT, KB, 2, PARAMS, "q") is None
+    assert cache.stats()["entries"] == 0
+    # An answer computed from version 1 content arriving after version 2 was seen is not stored.
+    cache.put(TENANT, KB, 1, PARAMS, "q", "old", SOURCES)
+    assert cache.stats()["entries"] == 0
+
+    cache.put(TENANT, KB, 2, PARAMS, "q", "new", SOURCES)
+    cache.invalidate(TENANT, KB)
+    assert cache.get(TENANT, KB, 2, PARAMS, "q") is None
+
+
+def test_entries_expire_and_lru_is_evicted():
+    cache = AnswerCache(max_entries=2, ttl_seconds=10)
+    with patch("app.services.answer_cache.time.monotonic", return_value=100.0):
+        cache.put(TENANT, KB, 1, PARAMS, "a", "A", SOURCES)
+        cache.put(TENANT, KB, 1, PARAMS, "b", "B", SOURCES)
+        assert cache.get(TENANT, KB, 1, PARAMS, "a") is not None
+        cache.put(TENANT, KB, 1, PARAMS, "c", "C", SOURCES)
+        assert cache.get(TENANT, KB, 1, PARAMS, "b") is None
+        assert cache.get(TENANT, KB, 1, PARAMS, "a") is not None
+
+    with patch("app.services.answer_cache.time.monotonic", return_value=111.0):
+        assert cache.get(TENANT, KB, 1, PARAMS, "a") is None
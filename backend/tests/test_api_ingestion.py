@@ -1,5 +1,12 @@
+import asyncio
 from unittest.mock import MagicMock, patch
 
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import UploadLimitMiddleware, app
 from app.services.ingestion import IngestionPipeline
 from app.models.entities import Document
 
@@ -17,15 +24,54 @@ def test_process_uploaded_file_handles_errors():
     file_bytes = b"some file content"
     error_message = "Unsupported file type: .xyz"
 
-    # Patch the _extract_text method to raise a specific error
-    with patch.object(pipeline, "_extract_text", side_effect=ValueError(error_message)) as mock_extract, \
+    # Patch the extraction generator to raise a specific error
+    with patch.object(pipeline, "_iter_text", side_effect=ValueError(error_message)) as mock_extract, \
          patch.object(pipeline, "mark_failed") as mock_mark_failed:
 
         pipeline.process_uploaded_file(mock_document, file_bytes)
 
-        # Assert that _extract_text was called
+        # Assert that extraction was started on the uploaded content
         mock_extract.assert_called_once_with(mock_document.filename, file_bytes)
 
         # Assert that mark_failed was called with the correct reason
         mock_mark_failed.assert_called_once_with(mock_document.id, error_message)
 
+
+def test_chunked_upload_is_cut_off_at_the_limit(monkeypatch):
+    monkeypatch.setattr(settings, "ingest_max_upload_bytes", 1000, raising=False)
+    boundary = "limit-test"
+
+    def body():
+        yield (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="big.txt"\r\n'
+            "Content-Type: text/plain\r\n\r\n"
+        ).encode()
+        for _ in range(100):
+            yield b"x" * 4096
+
+    # A generator body is sent chunked, without Content-Length.
+    with patch("app.api.routes.job_queue.spool_upload") as spool:
+        resp = TestClient(app).post("/ingest", content=body(), headers={"content-type": f"multipart/form-data; boundary={boundary}"})
+
+    assert resp.status_code == 413
+    spool.assert_not_called()
+
+
+def test_upload_limit_stops_reading_the_body(monkeypatch):
+    monkeypatch.setattr(settings, "ingest_max_upload_bytes", 1000, raising=False)
+    received = []
+
+    async def receive():
+        received.append(1)
+        return {"type": "http.request", "body": b"x" * 16384, "more_body": True}
+
+    async def read_everything(scope, receive, send):
+        while (await receive())["more_body"]:
+            pass
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(UploadLimitMiddleware(read_everything)({"type": "http", "path": "/ingest"}, receive, None))
+
+    assert exc_info.value.status_code == 413
+    # 64 KiB of multipart headroom on top of the limit: cut off at the fifth 16 KiB message.
+    assert len(received) == 5
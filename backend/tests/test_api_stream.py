@@ -0,0 +1,43 @@
+import uuid
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from app.api.deps import get_db
+from app.auth.deps import get_current_tenant
+from app.main import app
+
+
+def test_stream_uses_its_own_session_and_closes_it():
+    sessions = []
+    tenant_id, kb_id = uuid.uuid4(), uuid.uuid4()
+
+    def fake_session():
+        session = MagicMock()
+        sessions.append(session)
+        return session
+
+    class FakeRAG:
+        def __init__(self, db):
+            assert not db.close.called
+            self.db = db
+
+        async def astream_answer(self, *args, **kwargs):
+            assert not self.db.close.called
+            yield "sources", []
+            yield "token", "hi"
+
+    app.dependency_overrides[get_db] = lambda: MagicMock()
+    app.dependency_overrides[get_current_tenant] = lambda: str(tenant_id)
+    try:
+        with patch("app.api.routes.SessionLocal", side_effect=fake_session), \
+             patch("app.api.routes.RAGService", FakeRAG), \
+             patch("app.api.routes._authorize_kb", return_value=(tenant_id, 1)):
+            resp = TestClient(app).post("/rag/query/stream", json={"kb_id": str(kb_id), "query": "q"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert resp.status_code == 200
+    assert "event: token" in resp.text and "event: done" in resp.text
+    [session] = sessions
+    session.close.assert_called_once()
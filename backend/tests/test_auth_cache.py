@@ -0,0 +1,91 @@
+import time
+import uuid
+from unittest.mock import MagicMock, patch
+
+import pytest
+from jose import jwt
+
+from app.api.routes import _authorize_kb, _ensure_tenant
+from app.auth.cache import TTLCache
+from app.auth.deps import tenant_id_from_token, verify_token
+from app.core.config import settings
+from app.core.exceptions import NotFoundError, UnauthorizedError
+
+TENANT = uuid.uuid4()
+KB = uuid.uuid4()
+
+
+def _token(tenant_id: str, expires_in: float = 3600) -> str:
+    return jwt.encode({"tenant_id": tenant_id, "exp": int(time.time() + expires_in)}, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+
+
+@pytest.fixture
+def caches():
+    caches = {name: TTLCache(max_entries=100, ttl_seconds=60) for name in ("token", "tenant", "kb")}
+    with patch("app.auth.deps.get_token_cache", return_value=caches["token"]), \
+         patch("app.api.routes.get_tenant_cache", return_value=caches["tenant"]), \
+         patch("app.api.routes.get_kb_cache", return_value=caches["kb"]):
+        yield caches
+
+
+def test_ttl_cache_expires_and_evicts_least_recently_used():
+    cache = TTLCache(max_entries=2, ttl_seconds=10)
+    with patch("app.auth.cache.time.monotonic", return_value=100.0):
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.put("short", 3, ttl_seconds=1)
+        assert cache.get("a") is None
+        cache.put("c", 4, ttl_seconds=0)
+        assert cache.get("c") is None
+        assert cache.get("b") == 2
+
+    with patch("app.auth.cache.time.monotonic", return_value=105.0):
+        assert cache.get("short") is None
+        assert cache.get("b") == 2
+    with patch("app.auth.cache.time.monotonic", return_value=111.0):
+        assert cache.get("b") is None
+
+
+def test_verified_tokens_are_decoded_once(caches):
+    token = _token(str(TENANT))
+
+    with patch("app.auth.deps.jwt.decode", wraps=jwt.decode) as decode:
+        assert verify_token(token) == str(TENANT)
+        assert verify_token(token) == str(TENANT)
+    assert decode.call_count == 1
+    # Keyed by digest: the raw token is not kept.
+    assert token not in caches["token"]._entries
+
+
+def test_invalid_and_expired_tokens_are_not_cached(caches):
+    with pytest.raises(UnauthorizedError):
+        verify_token("not-a-token")
+    assert tenant_id_from_token(_token(str(TENANT), expires_in=-10)) is None
+    assert len(caches["token"]) == 0
+
+
+def test_known_tenants_need_no_query(caches):
+    db = MagicMock()
+    db.get.return_value = None
+
+    assert _ensure_tenant(db, str(TENANT)) == TENANT
+    assert _ensure_tenant(db, str(TENANT)) == TENANT
+
+    db.get.assert_called_once()
+    db.commit.assert_called_once()
+
+
+def test_kb_ownership_is_cached_until_invalidated(caches):
+    db = MagicMock()
+    version_query = db.query.return_value.filter.return_value.scalar
+    version_query.return_value = 3
+
+    assert _authorize_kb(db, str(TENANT), KB) == (TENANT, 3)
+    assert _authorize_kb(db, str(TENANT), KB) == (TENANT, 3)
+    assert version_query.call_count == 1
+
+    caches["kb"].pop((TENANT, KB))
+    version_query.return_value = None
+    with pytest.raises(NotFoundError):
+        _authorize_kb(db, str(TENANT), KB)
+    assert caches["kb"].get((TENANT, KB)) is None
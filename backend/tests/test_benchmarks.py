@@ -0,0 +1,133 @@
+import json
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from app.models.entities import Chunk, KnowledgeBase
+from app.schemas.models import SearchType
+from app.services import inference_backends
+from app.services.embeddings import EmbeddingService
+from app.services.model_registry import ModelRegistry
+from app.services.rag import RAGService
+from benchmarks.corpus import SyntheticCorpus, word
+from benchmarks.harness import Recorder, compare, exact_top_k, recall_at_k, stored_vectors
+
+
+def test_corpus_is_deterministic_and_random_access():
+    corpus = SyntheticCorpus(num_chunks=50, seed=3, words_per_chunk=30)
+
+    assert list(corpus.chunks(5, 8)) == [SyntheticCorpus(num_chunks=50, seed=3, words_per_chunk=30).chunk_text(j) for j in (5, 6, 7)]
+    assert len(corpus.chunk_text(0).split()) == 30
+    assert corpus.chunk_text(0) != SyntheticCorpus(num_chunks=50, seed=4, words_per_chunk=30).chunk_text(0)
+    with pytest.raises(IndexError):
+        corpus.chunk_text(50)
+
+
+def test_queries_are_drawn_from_their_source_chunk():
+    corpus = SyntheticCorpus(num_chunks=20, seed=1)
+    queries = corpus.queries(10, words=3)
+
+    assert queries == corpus.queries(10, words=3)
+    for query in queries:
+        words = query.text.split()
+        assert len(words) == len(set(words)) == 3
+        assert set(words) <= set(corpus.chunk_text(query.source).split())
+
+
+def test_pseudo_words_are_unique():
+    words = [word(i) for i in range(5000)]
+
+    assert len(set(words)) == len(words)
+
+
+def test_corpus_parameters_round_trip_through_the_kb():
+    corpus = SyntheticCorpus(num_chunks=1000, seed=9, topics=7)
+    kb = KnowledgeBase(description=json.dumps({"synthetic_corpus": corpus.describe()}))
+
+    assert SyntheticCorpus.from_kb(kb) == corpus
+    with pytest.raises(ValueError):
+        SyntheticCorpus.from_kb(KnowledgeBase(description="hand-made"))
+
+
+def test_exact_top_k_streams_blocks():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((100, 8)).astype(np.float32)
+    queries = rng.standard_normal((4, 8)).astype(np.float32)
+    ids = np.arange(100) + 1000
+    blocks = [(ids[i : i + 30], vectors[i : i + 30]) for i in range(0, 100, 30)]
+
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = ids[np.argsort(-(queries @ unit.T), axis=1)[:, :5]]
+    np.testing.assert_array_equal(exact_top_k(queries, blocks, 5), expected)
+
+
+def test_exact_top_k_pads_small_corpora():
+    truth = exact_top_k(np.ones((1, 2)), [(np.array([7]), np.ones((1, 2)))], 3)
+
+    assert truth.tolist() == [[7, -1, -1]]
+
+
+def test_recall_at_k():
+    truth = np.array([[1, 2, 3], [4, 5, -1]])
+
+    assert recall_at_k([[1, 2, 9], [5, 4]], truth, 3) == 0.8
+    assert recall_at_k([], truth, 3) is None
+
+
+def test_recorder_splits_model_and_database_time():
+    recorder = Recorder()
+    for embed, search in ((0.01, 0.02), (0.03, 0.04)):
+        recorder.add("embed", embed)
+        recorder.add("search", search)
+        recorder.add("total", embed + search)
+
+    summary = recorder.summary(wall_seconds=0.5)
+
+    assert summary["operations"] == 2
+    assert summary["qps"] == 4.0
+    assert summary["model_seconds"] == 0.04
+    assert summary["db_seconds"] == 0.06
+    assert summary["latency"]["p50_ms"] == 50.0
+    assert summary["stages"]["search"]["count"] == 2
+
+
+def test_compare_flags_only_regressions_beyond_threshold():
+    baseline = {"results": {"vector": {"qps": 100.0, "recall_at_k": 0.95, "latency": {"p95_ms": 10.0, "p99_ms": 20.0}}}}
+    current = {"results": {"vector": {"qps": 95.0, "recall_at_k": 0.80, "latency": {"p95_ms": 15.0, "p99_ms": 10.0}}}}
+
+    regressions = compare(baseline, current, threshold=0.1)
+
+    assert {r["metric"] for r in regressions} == {"recall_at_k", "latency.p95_ms"}
+    assert compare(baseline, {"results": {}}) == []
+
+
+def test_synthetic_kb_search_finds_query_sources(pg_session):
+    registry = ModelRegistry()
+    with patch("app.services.embeddings.model_registry", registry), \
+         patch("app.services.rerank.model_registry", registry), \
+         patch.object(inference_backends, "backend_for", return_value="stub"):
+        corpus = SyntheticCorpus(num_chunks=120, seed=5, words_per_chunk=40)
+        kb = corpus.load(pg_session, EmbeddingService(), tenant_name="bench", kb_name="kb", chunks_per_document=50, batch_size=40)
+        queries = corpus.queries(5)
+        rag = RAGService(pg_session)
+
+        assert pg_session.query(Chunk).filter(Chunk.kb_id == kb.id).count() == 120
+        assert kb.content_version == 1
+
+        vectors = rag.embedder.embed_array([query.text for query in queries])
+        truth = exact_top_k(vectors, stored_vectors(pg_session, kb.tenant_id, kb.id, batch_size=50), 5)
+        dense = [
+            [source.metadata["seq"] for source in rag.search(kb.tenant_id, kb.id, q.text, 5, SearchType.vector, query_vec=v.tolist())]
+            for q, v in zip(queries, vectors)
+        ]
+        # No ANN index in the test schema, so vector search is exact.
+        assert recall_at_k(dense, truth, 5) == 1.0
+
+        sparse = [
+            [source.metadata["seq"] for source in rag.search(kb.tenant_id, kb.id, q.text, 10, SearchType.full_text)]
+            for q in queries
+        ]
+        # Every query word occurs in its source chunk, so multi-word queries must match it.
+        assert all(sparse)
+        assert sum(query.source in seqs for query, seqs in zip(queries, sparse)) >= 4
@@ -0,0 +1,129 @@
+import uuid
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+from sqlalchemy import text
+
+from app.models.entities import Chunk, Document, KnowledgeBase, Tenant
+from app.services.chunk_writer import ChunkWriter, chunk_hash
+from app.services.ingestion import IngestionPipeline
+
+DIM = 384
+
+
+def _document(session) -> Document:
+    tenant = Tenant(name=f"tenant-{uuid.uuid4()}")
+    session.add(tenant)
+    session.flush()
+    kb = KnowledgeBase(tenant_id=tenant.id, name="kb")
+    session.add(kb)
+    session.flush()
+    document = Document(tenant_id=tenant.id, kb_id=kb.id, filename="doc.txt", status="PROCESSING")
+    session.add(document)
+    session.commit()
+    return document
+
+
+def _embeddings(n: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return rng.random((n, DIM), dtype=np.float32)
+
+
+def test_process_document_hands_embedding_matrix_to_writer():
+    pipeline = IngestionPipeline(db=MagicMock())
+    matrix = _embeddings(2)
+    document = Document(id=uuid.uuid4(), tenant_id=uuid.uuid4(), kb_id=uuid.uuid4(), filename="a.txt", status="PROCESSING")
+
+    with patch.object(pipeline.embedder, "embed_array", return_value=matrix), \
+         patch("app.services.ingestion.ChunkWriter") as MockWriter:
+        MockWriter.return_value.existing.return_value = {}
+        MockWriter.return_value.stored_embeddings.return_value = {}
+        pipeline.process_document(document, ["first", "second"])
+
+    model = pipeline.embedder.model_name
+    hashes = [chunk_hash("first", model), chunk_hash("second", model)]
+    MockWriter.return_value.write.assert_called_once()
+    args, kwargs = MockWriter.return_value.write.call_args
+    assert args[:2] == (document, ["first", "second"])
+    np.testing.assert_array_equal(args[2], matrix)
+    assert kwargs["hashes"] == hashes
+    assert len(set(kwargs["ids"])) == 2
+    assert document.status == "READY"
+
+
+def test_copy_writes_rows_in_order_and_replaces_on_retry(pg_session):
+    document = _document(pg_session)
+    contents = [f"paragraph {i} about invoice approval" for i in range(50)]
+    embeddings = _embeddings(len(contents))
+
+    with pg_session.begin():
+        assert ChunkWriter(pg_session).replace(document, contents, embeddings) == len(contents)
+
+    rows = pg_session.query(Chunk).filter(Chunk.document_id == document.id).order_by(Chunk.ordinal).all()
+    assert [row.content for row in rows] == contents
+    np.testing.assert_allclose(np.asarray(rows[7].embedding), embeddings[7], rtol=1e-6)
+    # content_tsv is generated by Postgres, not written by the loader.
+    assert pg_session.execute(
+        text("SELECT count(*) FROM chunks WHERE document_id = :d AND content_tsv @@ plainto_tsquery('english', 'invoice')"),
+        {"d": document.id},
+    ).scalar() == len(contents)
+    pg_session.commit()
+
+    with pg_session.begin():
+        ChunkWriter(pg_session).replace(document, contents[:3], embeddings[:3])
+    assert pg_session.query(Chunk).filter(Chunk.document_id == document.id).count() == 3
+
+
+def test_executemany_fallback_matches_copy(pg_session):
+    document = _document(pg_session)
+    contents = ["alpha chunk", "beta chunk"]
+    embeddings = _embeddings(2)
+    writer = ChunkWriter(pg_session)
+
+    with pg_session.begin():
+        writer._executemany(pg_session.connection(), writer._rows(document, contents, embeddings, [{"page": 1}, None]))
+
+    rows = pg_session.query(Chunk).filter(Chunk.document_id == document.id).order_by(Chunk.ordinal).all()
+    assert [row.content for row in rows] == contents
+    assert rows[0].chunk_metadata == {"page": 1}
+    np.testing.assert_allclose(np.asarray(rows[1].embedding), embeddings[1], rtol=1e-6)
+
+
+def test_existing_and_stored_embeddings_are_found_by_hash(pg_session):
+    document = _document(pg_session)
+    contents = ["same text", "same text", "other text"]
+    hashes = [chunk_hash(content, "m") for content in contents]
+    embeddings = _embeddings(3)
+    writer = ChunkWriter(pg_session)
+
+    with pg_session.begin():
+        writer.write(document, contents, embeddings, hashes=hashes)
+
+    existing = writer.existing(document)
+    assert sorted(len(rows) for rows in existing.values()) == [1, 2]
+    assert existing[hashes[2]][0][1] == 2
+    stored = writer.stored_embeddings(document, [hashes[2], chunk_hash("missing", "m")])
+    assert list(stored) == [hashes[2]]
+    np.testing.assert_allclose(stored[hashes[2]], embeddings[2], rtol=1e-6)
+
+    writer.delete_ids(document, [chunk_id for chunk_id, _ in existing[hashes[0]]])
+    pg_session.commit()
+    assert [row.content for row in pg_session.query(Chunk).filter(Chunk.document_id == document.id)] == ["other text"]
+
+
+def test_renumbered_rows_list_in_document_order(pg_session):
+    document = _document(pg_session)
+    writer = ChunkWriter(pg_session)
+    with pg_session.begin():
+        writer.write(document, ["kept", "dropped"], _embeddings(2))
+    ids = dict(pg_session.query(Chunk.content, Chunk.id).filter(Chunk.document_id == document.id))
+    pg_session.commit()
+
+    # A re-ingestion that prepends a chunk: the kept row moves behind it.
+    with pg_session.begin():
+        writer.write(document, ["new first"], _embeddings(1), ordinals=[0])
+        writer.renumber(document, [(ids["kept"], 1)])
+        writer.delete_ids(document, [ids["dropped"]])
+
+    rows = pg_session.query(Chunk).filter(Chunk.document_id == document.id).order_by(Chunk.ordinal).all()
+    assert [(row.content, row.ordinal) for row in rows] == [("new first", 0), ("kept", 1)]
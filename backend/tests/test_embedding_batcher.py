@@ -0,0 +1,68 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embeddings import EmbeddingService
+
+
+def test_batcher_coalesces_concurrent_calls_and_routes_results():
+    batches: list[list[str]] = []
+    gate = threading.Event()
+
+    def encode(texts):
+        gate.wait(1)
+        batches.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    batcher = EmbeddingBatcher(encode, max_batch_size=8, max_wait_ms=50)
+    futures = {text: batcher.submit(text) for text in ["a", "bb", "ccc", "dddd"]}
+    gate.set()
+
+    for text, future in futures.items():
+        assert future.result(timeout=2) == [float(len(text))]
+    assert sum(len(b) for b in batches) == 4
+    assert len(batches) < 4
+
+
+def test_batcher_respects_max_batch_size():
+    batches: list[int] = []
+    batcher = EmbeddingBatcher(lambda texts: batches.append(len(texts)) or [[0.0]] * len(texts), max_batch_size=2, max_wait_ms=20)
+    futures = [batcher.submit(str(i)) for i in range(5)]
+    for future in futures:
+        future.result(timeout=2)
+    assert max(batches) <= 2
+
+
+def test_batcher_propagates_encode_errors_to_each_caller():
+    def encode(texts):
+        raise RuntimeError("model exploded")
+
+    batcher = EmbeddingBatcher(encode, max_wait_ms=0)
+    with pytest.raises(RuntimeError, match="model exploded"):
+        batcher.embed("query", timeout=2)
+
+
+def test_batcher_fails_every_caller_when_vectors_are_missing():
+    gate = threading.Event()
+
+    def encode(texts):
+        gate.wait(1)
+        return [[0.0]] * (len(texts) - 1)
+
+    batcher = EmbeddingBatcher(encode, max_batch_size=8, max_wait_ms=50)
+    futures = [batcher.submit(text) for text in ("a", "b", "c")]
+    gate.set()
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match="vectors for"):
+            future.result(timeout=2)
+
+
+def test_embed_query_bypasses_batcher_when_disabled(monkeypatch):
+    service = EmbeddingService()
+    monkeypatch.setattr(service.settings, "embedding_batching_enabled", False, raising=False)
+    with patch.object(EmbeddingService, "embed_texts", return_value=[[0.5, 0.5]]) as mock_embed:
+        assert service.embed_query("hello") == [0.5, 0.5]
+    mock_embed.assert_called_once_with(["hello"])
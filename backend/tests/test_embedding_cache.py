@@ -0,0 +1,70 @@
+from unittest.mock import patch
+
+import numpy as np
+
+from app.services import embeddings
+from app.services.embedding_cache import ENTRY_OVERHEAD_BYTES, DiskTier, EmbeddingCache, MemoryTier, cache_key
+from app.services.embeddings import EmbeddingService
+
+
+def _vector(value: float) -> np.ndarray:
+    return np.full(4, value, dtype=np.float32)
+
+
+def test_key_covers_model_normalization_and_whitespace():
+    assert cache_key("m", True, "hello   world\n") == cache_key("m", True, "hello world")
+    assert cache_key("m", True, "hello world") != cache_key("m", False, "hello world")
+    assert cache_key("m", True, "hello world") != cache_key("other", True, "hello world")
+
+
+def test_memory_tier_evicts_least_recently_used_within_budget():
+    tier = MemoryTier(max_bytes=2 * (16 + ENTRY_OVERHEAD_BYTES))
+    tier.put("a", _vector(1))
+    tier.put("b", _vector(2))
+    assert tier.get("a") is not None  # "b" is now the least recently used
+    tier.put("c", _vector(3))
+
+    assert tier.get("b") is None
+    assert len(tier) == 2
+
+
+def test_disk_tier_is_shared_between_cache_instances(tmp_path):
+    path = tmp_path / "embeddings.sqlite"
+    writer = EmbeddingCache(MemoryTier(1 << 20), DiskTier(path, max_bytes=1 << 20))
+    writer.put_many([("k1", _vector(1))])
+
+    # A second process would open its own memory tier over the same file.
+    reader = EmbeddingCache(MemoryTier(1 << 20), DiskTier(path, max_bytes=1 << 20))
+    found = reader.get_many(["k1", "k2"])
+
+    assert list(found) == ["k1"]
+    np.testing.assert_array_equal(found["k1"], _vector(1))
+    assert reader.memory.get("k1") is not None
+
+
+def test_disk_tier_trims_oldest_rows(tmp_path):
+    tier = DiskTier(tmp_path / "embeddings.sqlite", max_bytes=10 * 16)
+    tier.put_many((f"k{i}", _vector(i)) for i in range(20))
+
+    assert tier.trim() > 0
+    remaining = tier.get_many([f"k{i}" for i in range(20)])
+    assert "k19" in remaining and "k0" not in remaining
+    assert len(remaining) * 16 <= 10 * 16
+
+
+def test_embed_array_encodes_only_cache_misses(monkeypatch):
+    cache = EmbeddingCache(MemoryTier(1 << 20))
+    monkeypatch.setattr(embeddings, "get_embedding_cache", lambda: cache)
+    service = EmbeddingService()
+
+    def fake_encode(texts):
+        return np.stack([_vector(len(text)) for text in texts])
+
+    with patch.object(EmbeddingService, "_encode", side_effect=fake_encode) as encode:
+        first = service.embed_array(["footer", "body text", "footer"])
+        second = service.embed_array(["footer", "new text"])
+
+    assert [call.args[0] for call in encode.call_args_list] == [["footer", "body text"], ["new text"]]
+    np.testing.assert_array_equal(first[0], first[2])
+    np.testing.assert_array_equal(second[0], first[0])
+    assert second.dtype == np.float32
@@ -0,0 +1,66 @@
+import asyncio
+import contextvars
+import threading
+
+import pytest
+
+from app.core.exceptions import ServiceUnavailableError
+from app.core.executors import BoundedExecutor
+
+request_id: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+
+def test_executor_runs_off_loop_and_propagates_context():
+    executor = BoundedExecutor("test", max_workers=2)
+
+    async def main():
+        request_id.set("req-1")
+        loop_thread = threading.get_ident()
+        return loop_thread, await executor.run(lambda: (threading.get_ident(), request_id.get()))
+
+    loop_thread, (worker_thread, seen_id) = asyncio.run(main())
+    assert worker_thread != loop_thread
+    assert seen_id == "req-1"
+    assert executor.stats() == {"workers": 2, "active": 0, "queued": 0, "max_queue": 0}
+    executor.shutdown()
+
+
+def test_executor_rejects_when_queue_is_full():
+    executor = BoundedExecutor("tiny", max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def main():
+        first = asyncio.ensure_future(executor.run(release.wait, 2))
+        await asyncio.sleep(0.05)  # first task now occupies the only worker
+        second = asyncio.ensure_future(executor.run(lambda: "queued"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(ServiceUnavailableError):
+            await executor.run(lambda: "rejected")
+        release.set()
+        return await first, await second
+
+    assert asyncio.run(main()) == (True, "queued")
+    executor.shutdown()
+
+
+def test_cancelled_queued_task_releases_its_queue_slot():
+    executor = BoundedExecutor("cancel", max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def main():
+        first = asyncio.ensure_future(executor.run(release.wait, 2))
+        await asyncio.sleep(0.05)
+        pending = asyncio.ensure_future(executor.run(lambda: "never"))
+        await asyncio.sleep(0.01)
+        assert executor.stats()["queued"] == 1
+        pending.cancel()
+        await asyncio.sleep(0.01)
+        assert executor.stats()["queued"] == 0
+        # The slot is free again rather than rejecting with 503.
+        queued_again = asyncio.ensure_future(executor.run(lambda: "ran"))
+        release.set()
+        return await first, await queued_again
+
+    assert asyncio.run(main()) == (True, "ran")
+    assert executor.stats()["queued"] == 0
+    executor.shutdown()
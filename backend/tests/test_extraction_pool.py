@@ -0,0 +1,59 @@
+import io
+import time
+
+import pptx
+import pytest
+
+from app.services import extractors
+from app.services.extraction_pool import ExtractionPool
+from app.services.extractors import ExtractionTimeout
+
+
+def _deck(path, slides: int) -> None:
+    prs = pptx.Presentation()
+    for i in range(slides):
+        slide = prs.slides.add_slide(prs.slide_layouts[5])
+        slide.shapes.add_textbox(1, 2, 3, 4).text_frame.text = f"Slide number {i}"
+    prs.save(path)
+
+
+def test_pool_parses_slide_ranges_in_document_order(tmp_path):
+    deck = tmp_path / "deck.pptx"
+    _deck(deck, 5)
+    pool = ExtractionPool(processes=2, units_per_task=2, timeout_seconds=60)
+    try:
+        blocks = list(pool.iter_blocks(".pptx", deck))
+    finally:
+        pool.shutdown()
+
+    assert blocks == [f"Slide number {i}" for i in range(5)]
+    with deck.open("rb") as handle:
+        assert blocks == list(extractors.iter_blocks(".pptx", handle))
+
+
+def test_pool_fails_file_past_its_deadline(tmp_path):
+    deck = tmp_path / "deck.pptx"
+    _deck(deck, 1)
+    pool = ExtractionPool(processes=1, timeout_seconds=0)
+    try:
+        with pytest.raises(ValueError, match="timed out"):
+            list(pool.iter_blocks(".pptx", deck))
+    finally:
+        pool.shutdown()
+
+
+def test_deadline_interrupts_running_task():
+    start = time.monotonic()
+    with pytest.raises(ExtractionTimeout):
+        with extractors._deadline(time.time() + 0.05):
+            while True:
+                pass
+    assert time.monotonic() - start < 5
+
+
+def test_extract_range_selects_slides(tmp_path):
+    f = io.BytesIO()
+    _deck(f, 4)
+
+    assert extractors.extract_range(".pptx", f.getvalue(), 1, 3) == ["Slide number 1", "Slide number 2"]
+    assert extractors.count_units(".pptx", f.getvalue()) == 4
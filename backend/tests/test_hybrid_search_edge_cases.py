@@ -2,11 +2,15 @@ import uuid
 from unittest.mock import MagicMock, patch
 
 import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
 
-from app.models.entities import Chunk
-from app.schemas.models import RAGSource, SearchType
+from app.models.entities import Chunk, Document, KnowledgeBase, Tenant
+from app.schemas.models import SearchType
 from app.services.rag import RAGService
 
+DIM = 384
+
 
 @pytest.fixture
 def mock_rag_service():
@@ -16,177 +20,135 @@ def mock_rag_service():
          patch('app.services.rag.LLMClient') as MockLLMClient:
 
         mock_embedder_instance = MockEmbeddingService.return_value
-        mock_embedder_instance.embed_texts.return_value = [[0.1] * 384] * 2  # Default embedding
-
-        mock_reranker_instance = MockRerankingService.return_value
-        mock_reranker_instance.model.predict.return_value = [0.9, 0.1] # Default rerank scores
-
-        mock_llm_instance = MockLLMClient.return_value
-        mock_llm_instance.generate.return_value = "Mocked LLM answer"
+        mock_embedder_instance.embed_query.return_value = [0.1] * DIM  # Default embedding
 
         service = RAGService(db)
         service.embedder = mock_embedder_instance
-        service.reranker = mock_reranker_instance
-        service.llm = mock_llm_instance
+        service.reranker = MockRerankingService.return_value
+        service.llm = MockLLMClient.return_value
         return service
 
 
-def create_mock_chunk(content: str, id: uuid.UUID, document_id: uuid.UUID) -> Chunk:
-    return Chunk(
-        id=id,
-        tenant_id=uuid.uuid4(),
-        kb_id=uuid.uuid4(),
-        document_id=document_id,
-        content=content,
-        embedding=[0.1] * 384, # Default embedding
-        chunk_metadata={},
-    )
+def _unit(index: int) -> list[float]:
+    vec = [0.0] * DIM
+    vec[index] = 1.0
+    return vec
+
+
+def _seed(session, contents_and_vectors: list[tuple[str, list[float]]]) -> tuple[uuid.UUID, uuid.UUID, list[uuid.UUID]]:
+    tenant = Tenant(name=f"tenant-{uuid.uuid4()}")
+    session.add(tenant)
+    session.flush()
+    kb = KnowledgeBase(tenant_id=tenant.id, name="kb")
+    session.add(kb)
+    session.flush()
+    document = Document(tenant_id=tenant.id, kb_id=kb.id, filename="doc.txt", status="READY")
+    session.add(document)
+    session.flush()
+    ids = []
+    for content, vector in contents_and_vectors:
+        chunk = Chunk(
+            tenant_id=tenant.id,
+            kb_id=kb.id,
+            document_id=document.id,
+            content=content,
+            embedding=vector,
+        )
+        session.add(chunk)
+        session.flush()
+        ids.append(chunk.id)
+    session.commit()
+    return tenant.id, kb.id, ids
+
+
+def test_hybrid_query_is_single_statement_with_bounded_candidates(mock_rag_service):
+    """Dense and sparse branches must LIMIT before ranking so they never rank the whole KB."""
+    mock_rag_service.db = Session()  # unbound: builds the statement without a connection
+    query = mock_rag_service._hybrid_query(uuid.uuid4(), uuid.uuid4(), "product code", 4, [0.1] * DIM)
+    sql = str(query.statement.compile(dialect=postgresql.dialect()))
+
+    assert sql.startswith("WITH dense_candidates AS")
+    for cte in ("dense AS", "sparse_candidates AS", "sparse AS", "fused AS"):
+        assert cte in sql
+    assert "row_number() OVER (ORDER BY dense_candidates.distance)" in sql
+    assert "row_number() OVER (ORDER BY sparse_candidates.score DESC)" in sql
+    assert "rank() OVER" not in sql
+    assert "plainto_tsquery('english'" in sql
+
+
+def test_hybrid_search_uses_one_round_trip(mock_rag_service):
+    chunks = [
+        Chunk(id=uuid.uuid4(), document_id=uuid.uuid4(), content="first", chunk_metadata={}),
+        Chunk(id=uuid.uuid4(), document_id=uuid.uuid4(), content="second", chunk_metadata={}),
+    ]
+    mock_rag_service.db.query.return_value.join.return_value.order_by.return_value.all.return_value = [
+        (chunks[0], 0.032),
+        (chunks[1], 0.016),
+    ]
+
+    results = mock_rag_service.search(uuid.uuid4(), uuid.uuid4(), "query", top_k=2, search_type=SearchType.hybrid)
 
+    assert mock_rag_service.db.query.call_count == 1
+    assert [r.chunk_id for r in results] == [str(chunks[0].id), str(chunks[1].id)]
 
-def test_hybrid_search_low_semantic_high_keyword(mock_rag_service):
+
+def test_hybrid_search_low_semantic_high_keyword(pg_session, mock_rag_service):
     """
     Test case: Query has low semantic similarity to chunks but high keyword overlap.
     Expected: Full-text search should bring these documents up, and RRF should combine.
     """
-    tenant_id = uuid.uuid4()
-    kb_id = uuid.uuid4()
-    query_text = "specific product code XYZ123"
-
-    # Mock chunks
-    doc_id_1 = uuid.uuid4()
-    doc_id_2 = uuid.uuid4()
-    chunk_id_1 = uuid.uuid4()
-    chunk_id_2 = uuid.uuid4()
-
-    mock_chunk_1 = create_mock_chunk(
-        "The quick brown fox jumps over the lazy dog. Product code is XYZ123.", chunk_id_1, doc_id_1
-    )
-    mock_chunk_2 = create_mock_chunk(
-        "Another document with general information. No product code mentioned.", chunk_id_2, doc_id_2
+    tenant_id, kb_id, ids = _seed(
+        pg_session,
+        [
+            ("The quick brown fox jumps over the lazy dog. Product code is XYZ123.", _unit(1)),
+            ("Another document with general information. No code mentioned.", _unit(0)),
+            ("A recipe for apple pie, with baking instructions.", _unit(2)),
+        ],
     )
+    mock_rag_service.db = pg_session
+    # Query vector is closest to the second chunk; only the first matches the keywords.
+    results = mock_rag_service._hybrid_search(tenant_id, kb_id, "product XYZ123", 1, query_vec=_unit(0))
 
-    # Mock database query results
-    # Simulate vector search ranking chunk_2 higher due to general semantic similarity,
-    # but full-text search ranking chunk_1 higher due to exact keyword match.
-    mock_vector_query_builder = MagicMock()
-    mock_fulltext_query_builder = MagicMock()
-    mock_combined_query_executor = MagicMock()
-    mock_chunk_fetcher = MagicMock()
-
-    mock_rag_service.db.query.side_effect = [
-        mock_vector_query_builder,
-        mock_fulltext_query_builder,
-        mock_combined_query_executor,
-        mock_chunk_fetcher,
-    ]
-    
-    # Configure mock_vector_query_builder chain
-    mock_vector_query_builder.filter.return_value.limit.return_value.subquery.return_value.select.return_value = MagicMock()
-
-    # Configure mock_fulltext_query_builder chain
-    mock_fulltext_query_builder.filter.return_value.filter.return_value.limit.return_value.subquery.return_value.select.return_value = MagicMock()
-
-    # Configure mock_combined_query_executor
-    # Ranks set to ensure chunk_id_1 wins with RRF: 1/(60+1) + 1/(60+10) > 1/(60+2) + 1/(60+10)
-    mock_combined_query_executor.all.return_value = [
-        (chunk_id_1, 1),  # Full-text (high keyword)
-        (chunk_id_2, 2),  # Vector (some semantic)
-        (chunk_id_1, 10), # Vector (low semantic for keyword)
-        (chunk_id_2, 10), # Full-text (low keyword for general)
-    ]
-    
-    # Configure mock_chunk_fetcher
-    mock_chunk_fetcher.filter.return_value.all.return_value = [mock_chunk_1, mock_chunk_2]
-
-    # Patch the direct call to cosine_distance
-    with patch('app.services.rag.Chunk.embedding', new_callable=MagicMock) as mock_embedding_attr, \
-         patch('app.services.rag.union_all', return_value=MagicMock(alias=MagicMock())) as mock_union_all: # Mock union_all
-
-        mock_distance_obj = MagicMock()
-        mock_distance_obj.label.return_value = "score" # mock the label method
-        mock_embedding_attr.cosine_distance.return_value = mock_distance_obj
+    assert len(results) == 1
+    assert results[0].chunk_id == str(ids[0])
 
-        # Explicitly mock func.ts_rank_cd and func.to_tsquery for the full-text query
-        with patch('app.services.rag.func.ts_rank_cd', return_value=MagicMock(label=MagicMock(return_value="score"))), \
-             patch('app.services.rag.func.to_tsquery', return_value="query_tsquery"):
 
-            results = mock_rag_service.search(tenant_id, kb_id, query_text, top_k=1, search_type=SearchType.hybrid)
-
-            # Expect chunk_1 to be the top result due to RRF combining strong full-text signal
-            assert len(results) == 1
-            assert results[0].chunk_id == str(mock_chunk_1.id)
-            assert results[0].content == mock_chunk_1.content
-
-
-def test_hybrid_search_semantically_rich_no_keywords(mock_rag_service):
+def test_hybrid_search_semantically_rich_no_keywords(pg_session, mock_rag_service):
     """
     Test case: Query is semantically rich but has no exact keyword overlap with top vector results.
     Expected: Vector search should prioritize these, and RRF should ensure they are ranked high.
     """
-    tenant_id = uuid.uuid4()
-    kb_id = uuid.uuid4()
-    query_text = "information about advanced machine learning techniques"
-
-    # Mock chunks
-    doc_id_1 = uuid.uuid4()
-    doc_id_2 = uuid.uuid4()
-    chunk_id_1 = uuid.uuid4()
-    chunk_id_2 = uuid.uuid4()
-
-    mock_chunk_1 = create_mock_chunk(
-        "This document discusses deep learning and neural networks.", chunk_id_1, doc_id_1
+    tenant_id, kb_id, ids = _seed(
+        pg_session,
+        [
+            ("This document discusses deep learning and neural networks.", _unit(0)),
+            ("A recipe for apple pie, with baking instructions.", _unit(1)),
+        ],
     )
-    mock_chunk_2 = create_mock_chunk(
-        "A recipe for apple pie, with baking instructions.", chunk_id_2, doc_id_2
+    mock_rag_service.db = pg_session
+    results = mock_rag_service._hybrid_search(tenant_id, kb_id, "advanced machine intelligence methods", 2, query_vec=_unit(0))
+
+    assert results[0].chunk_id == str(ids[0])
+    assert len(results) == 2
+
+
+def test_hybrid_search_fuses_both_signals(pg_session, mock_rag_service, monkeypatch):
+    """A chunk ranked well by both branches beats chunks that only one branch likes."""
+    fillers = [(f"unrelated filler paragraph {i}", [0.8] + [0.0] * i + [0.6] + [0.0] * (DIM - i - 2)) for i in range(8)]
+    tenant_id, kb_id, ids = _seed(
+        pg_session,
+        [
+            ("quarterly totals for the finance team", _unit(0)),  # dense #1, sparse miss
+            ("invoice approval workflow overview", [0.9, 0.1] + [0.0] * (DIM - 2)),  # dense #2, sparse #2
+            ("invoice workflow approval checklist and invoice workflow", _unit(DIM - 1)),  # dense last, sparse #1
+        ]
+        + fillers,
     )
-
-    # Mock database query results
-    # Simulate vector search ranking chunk_1 higher, but full-text search ranking chunk_2 higher due to some common words (e.g., "information").
-    mock_vector_query_builder = MagicMock()
-    mock_fulltext_query_builder = MagicMock()
-    mock_combined_query_executor = MagicMock()
-    mock_chunk_fetcher = MagicMock()
-
-    mock_rag_service.db.query.side_effect = [
-        mock_vector_query_builder,
-        mock_fulltext_query_builder,
-        mock_combined_query_executor,
-        mock_chunk_fetcher,
-    ]
-    
-    # Configure mock_vector_query_builder chain
-    mock_vector_query_builder.filter.return_value.limit.return_value.subquery.return_value.select.return_value = MagicMock()
-
-    # Configure mock_fulltext_query_builder chain
-    mock_fulltext_query_builder.filter.return_value.filter.return_value.limit.return_value.subquery.return_value.select.return_value = MagicMock()
-
-    # Configure mock_combined_query_executor
-    # Ranks set to ensure chunk_id_1 wins with RRF: 1/(60+1) + 1/(60+10) > 1/(60+2) + 1/(60+10)
-    mock_combined_query_executor.all.return_value = [
-        (chunk_id_1, 1),  # Vector (high semantic)
-        (chunk_id_2, 2),  # Full-text (some keyword)
-        (chunk_id_1, 10), # Full-text (low keyword for semantic)
-        (chunk_id_2, 10), # Vector (low semantic for general)
-    ]
-
-    # Configure mock_chunk_fetcher
-    mock_chunk_fetcher.filter.return_value.all.return_value = [mock_chunk_1, mock_chunk_2]
-
-    # Patch the direct call to cosine_distance
-    with patch('app.services.rag.Chunk.embedding', new_callable=MagicMock) as mock_embedding_attr, \
-         patch('app.services.rag.union_all', return_value=MagicMock(alias=MagicMock())) as mock_union_all: # Mock union_all
-
-        mock_distance_obj = MagicMock()
-        mock_distance_obj.label.return_value = "score" # mock the label method
-        mock_embedding_attr.cosine_distance.return_value = mock_distance_obj
-
-        # Explicitly mock func.ts_rank_cd and func.to_tsquery for the full-text query
-        with patch('app.services.rag.func.ts_rank_cd', return_value=MagicMock(label=MagicMock(return_value="score"))), \
-             patch('app.services.rag.func.to_tsquery', return_value="query_tsquery"):
-
-            results = mock_rag_service.search(tenant_id, kb_id, query_text, top_k=1, search_type=SearchType.hybrid)
-
-            # Expect chunk_1 to be the top result due to RRF combining strong vector signal
-            assert len(results) == 1
-            assert results[0].chunk_id == str(mock_chunk_1.id)
-            assert results[0].content == mock_chunk_1.content
+    mock_rag_service.db = pg_session
+    results = mock_rag_service._hybrid_search(tenant_id, kb_id, "invoice workflow", 3, query_vec=_unit(0))
+    assert results[0].chunk_id == str(ids[1])
+
+    # Zeroing the sparse weight leaves the pure dense winner in first place.
+    monkeypatch.setattr("app.services.rag.settings.hybrid_sparse_weight", 0.0)
+    results = mock_rag_service._hybrid_search(tenant_id, kb_id, "invoice workflow", 3, query_vec=_unit(0))
+    assert results[0].chunk_id == str(ids[0])
@@ -0,0 +1,43 @@
+"""Importing the API or the worker must stay cheap: model, parser and URL-fetch libraries load on first use."""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+HEAVY_MODULES = {"torch", "sentence_transformers", "transformers", "onnxruntime", "bs4", "requests", "pypdf", "docx", "pptx"}
+# Generous for CI runners; a regression that pulls in torch costs several seconds.
+IMPORT_BUDGET_SECONDS = float(os.getenv("RAG_IMPORT_BUDGET_SECONDS", "3"))
+
+
+def _import_times(module: str) -> dict[str, int]:
+    """Cumulative import time in microseconds per module, from ``python -X importtime``."""
+    env = {**os.environ, "SKIP_DB_INIT": "1", "PYTHONPATH": str(BACKEND_DIR)}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative_us)
+    return times
+
+
+@pytest.mark.parametrize("module", ["app.main", "app.worker"])
+def test_entry_points_import_without_heavy_dependencies(module):
+    times = _import_times(module)
+
+    loaded = {name.split(".")[0] for name in times}
+    assert not loaded & HEAVY_MODULES
+    assert times[module] < IMPORT_BUDGET_SECONDS * 1_000_000
@@ -0,0 +1,91 @@
+import os
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services import inference_backends
+from app.services.embeddings import EmbeddingService
+from app.services.model_registry import ModelRegistry
+from app.services.rerank import RerankingService
+
+
+def test_pool_ignores_padding_tokens():
+    hidden = np.array([[[1.0, 2.0], [3.0, 4.0], [100.0, 100.0]]], dtype=np.float32)
+    mask = np.array([[1, 1, 0]])
+
+    np.testing.assert_allclose(inference_backends.pool(hidden, mask, "mean"), [[2.0, 3.0]])
+    np.testing.assert_allclose(inference_backends.pool(hidden, mask, "max"), [[3.0, 4.0]])
+    np.testing.assert_allclose(inference_backends.pool(hidden, mask, "cls"), [[1.0, 2.0]])
+
+
+def test_unknown_backend_is_rejected():
+    with patch.object(inference_backends, "settings", MagicMock(embedding_backend="tensorrt")):
+        with pytest.raises(ValueError, match="embedding_backend"):
+            inference_backends.backend_for("embedding")
+
+
+def test_onnx_backend_is_loaded_and_registered_separately():
+    registry = ModelRegistry()
+    onnx_model = MagicMock(max_length=512)
+    onnx_model.get_sentence_embedding_dimension.return_value = settings.VECTOR_DIMENSION
+    with patch("app.services.embeddings.model_registry", registry), \
+         patch("app.services.rerank.model_registry", registry), \
+         patch.object(inference_backends, "backend_for", return_value="onnx"), \
+         patch.object(inference_backends, "load_onnx_model", return_value=onnx_model) as mock_load:
+        assert EmbeddingService().model is onnx_model
+        assert RerankingService().model is onnx_model
+
+    assert [call.args[0] for call in mock_load.call_args_list] == ["embedding", "reranker"]
+    assert {(entry["kind"], entry["device"]) for entry in registry.stats()} == {("embedding", "onnx"), ("reranker", "onnx")}
+
+
+def test_stub_encoder_is_deterministic_and_word_sensitive():
+    encoder = inference_backends.StubEncoder(384)
+    vectors = encoder.encode(["invoice approval process", "Invoice approval PROCESS", "holiday rota for support"])
+
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-5)
+    np.testing.assert_allclose(vectors[0], vectors[1])
+    np.testing.assert_allclose(vectors, inference_backends.StubEncoder(384).encode(
+        ["invoice approval process", "Invoice approval PROCESS", "holiday rota for support"]
+    ))
+    similar = float(vectors[0] @ encoder.encode(["invoice approval"])[0])
+    unrelated = float(vectors[0] @ vectors[2])
+    assert similar > 0.7 > unrelated
+
+
+def test_stub_cross_encoder_scores_query_overlap():
+    scores = inference_backends.StubCrossEncoder().predict(
+        [("invoice approval", "the invoice approval flow"), ("invoice approval", "an invoice"), ("invoice", "holidays")]
+    )
+
+    np.testing.assert_allclose(scores, [1.0, 0.5, 0.0])
+
+
+@pytest.mark.skipif(not os.getenv("RAG_TEST_ONNX_PARITY"), reason="RAG_TEST_ONNX_PARITY not set (downloads and exports models)")
+def test_onnx_int8_matches_torch_within_tolerance(tmp_path):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("sentence_transformers")
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.cross_encoder import CrossEncoder
+
+    texts = [
+        "How do I reset my password?",
+        "Invoices are approved by the finance team within five business days.",
+        "The quarterly report covers revenue, churn and hiring plans for the next year. " * 8,
+    ]
+    embedding_model = EmbeddingService().model_name
+    directory = inference_backends.export("embedding", embedding_model, tmp_path / "embedding")
+    onnx_vectors = inference_backends.OnnxEncoder(directory).encode(texts, normalize_embeddings=True)
+    torch_vectors = SentenceTransformer(embedding_model, device="cpu").encode(texts, normalize_embeddings=True)
+    cosine = (onnx_vectors * torch_vectors).sum(axis=1)
+    assert cosine.min() > 0.98
+
+    reranker_model = RerankingService().model_name
+    directory = inference_backends.export("reranker", reranker_model, tmp_path / "reranker")
+    pairs = [["what is the invoice approval process", text] for text in texts]
+    onnx_scores = inference_backends.OnnxCrossEncoder(directory).predict(pairs)
+    torch_scores = CrossEncoder(reranker_model, device="cpu").predict(pairs)
+    assert np.argmax(onnx_scores) == np.argmax(torch_scores)
+    np.testing.assert_allclose(onnx_scores, torch_scores, atol=0.05)
@@ -1,13 +1,17 @@
 import uuid
 import io
 import pptx
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
+import numpy as np
 import pytest
 
 from app.api.routes import _parse_metadata
+from app.services import ingestion
+from app.services.chunk_writer import chunk_hash
 from app.services.ingestion import IngestionPipeline
 from app.core.exceptions import ValidationError
+from app.models.entities import Document
 
 
 class DummyDB:
@@ -33,6 +37,17 @@ def test_extract_text_plain_text():
     assert "this is a test." in extracted
 
 
+def test_extract_text_reads_spooled_path_and_handle(tmp_path):
+    pipeline = IngestionPipeline(db=DummyDB())
+    spooled = tmp_path / "upload.txt"
+    spooled.write_bytes("Hello from disk".encode("utf-8"))
+
+    assert pipeline._extract_text("notes.txt", spooled) == "Hello from disk"
+    with spooled.open("rb") as handle:
+        assert pipeline._extract_text("notes.txt", handle) == "Hello from disk"
+        assert not handle.closed
+
+
 def test_extract_text_html_strips_scripts():
     pipeline = IngestionPipeline(db=DummyDB())
     html = b"""
@@ -44,7 +59,7 @@ def test_extract_text_html_strips_scripts():
     assert "bad" not in extracted
 
 
-def test_extract_text_pptx():
+def test_extract_text_pptx(tmp_path):
     pipeline = IngestionPipeline(db=DummyDB())
     prs = pptx.Presentation()
     slide = prs.slides.add_slide(prs.slide_layouts[5])
@@ -58,6 +73,10 @@ def test_extract_text_pptx():
     extracted = pipeline._extract_text("sample.pptx", f.read())
     assert "This is a test presentation." in extracted
 
+    spooled = tmp_path / "upload.pptx"
+    spooled.write_bytes(f.getvalue())
+    assert "This is a test presentation." in pipeline._extract_text("sample.pptx", spooled)
+
 
 @patch("requests.get")
 def test_extract_text_from_url(mock_get):
@@ -83,3 +102,126 @@ def test_parse_metadata_valid_and_invalid():
     assert _parse_metadata("") is None
     with pytest.raises(ValidationError):
         _parse_metadata("not-json")
+
+
+def test_word_chunks_carry_overlap_across_segments():
+    pipeline = IngestionPipeline(db=DummyDB())
+    words = [f"w{i}" for i in range(1, 60)]
+    pages = [" ".join(words[i : i + 7]) for i in range(0, len(words), 7)]
+
+    streamed = list(pipeline._iter_chunks(iter(pages), max_words=10, overlap=3))
+
+    assert streamed == pipeline._chunk_text(" ".join(words), max_words=10, overlap=3)
+    assert all(a.split()[-3:] == b.split()[:3] for a, b in zip(streamed, streamed[1:]))
+
+
+def test_plain_text_reader_never_splits_words(monkeypatch):
+    monkeypatch.setattr(ingestion, "TEXT_READ_CHARS", 7)
+    pipeline = IngestionPipeline(db=DummyDB())
+    text = "alpha beta gamma delta epsilon zeta eta theta"
+
+    segments = list(pipeline._iter_text("notes.txt", text.encode("utf-8")))
+
+    assert len(segments) > 1
+    assert [word for segment in segments for word in segment.split()] == text.split()
+
+
+def test_process_document_embeds_and_commits_in_batches(monkeypatch):
+    monkeypatch.setattr(ingestion.settings, "ingest_embed_batch_size", 4, raising=False)
+    db = MagicMock()
+    pipeline = IngestionPipeline(db=db)
+    document = Document(id=uuid.uuid4(), tenant_id=uuid.uuid4(), kb_id=uuid.uuid4(), doc_metadata={})
+    pipeline.embedder = MagicMock()
+    pipeline.embedder.embed_array.side_effect = lambda batch: np.zeros((len(batch), 3), dtype=np.float32)
+    consumed: list[str] = []
+
+    def chunks():
+        for i in range(10):
+            consumed.append(f"chunk {i}")
+            yield f"chunk {i}"
+
+    with patch("app.services.ingestion.ChunkWriter") as writer_cls:
+        writer = writer_cls.return_value
+        writer.existing.return_value = {}
+        writer.stored_embeddings.side_effect = lambda doc, hashes: {}
+        writer.write.side_effect = lambda doc, batch, embeddings, **kwargs: len(batch)
+
+        written = pipeline.process_document(document, chunks(), content_hash="abc")
+
+    assert written == 10
+    assert [len(call.args[0]) for call in pipeline.embedder.embed_array.call_args_list] == [4, 4, 2]
+    # One commit per batch, then the READY status update.
+    assert db.commit.call_count == 4
+    assert document.status == "READY"
+    assert document.content_hash == "abc"
+
+
+def test_process_document_keeps_unchanged_chunks_and_reuses_embeddings():
+    db = MagicMock()
+    pipeline = IngestionPipeline(db=db)
+    document = Document(id=uuid.uuid4(), tenant_id=uuid.uuid4(), kb_id=uuid.uuid4(), doc_metadata={})
+    pipeline.embedder = MagicMock()
+    pipeline.embedder.model_name = "test-model"
+    pipeline.embedder.embed_array.side_effect = lambda batch: np.ones((len(batch), 3), dtype=np.float32)
+    kept, stale = uuid.uuid4(), uuid.uuid4()
+    stored = np.full(3, 7, dtype=np.float32)
+
+    with patch("app.services.ingestion.ChunkWriter") as writer_cls:
+        writer = writer_cls.return_value
+        writer.existing.return_value = {chunk_hash("unchanged text", "test-model"): [(kept, 4)], "old-hash": [(stale, 0)]}
+        writer.stored_embeddings.side_effect = lambda doc, hashes: {
+            h: stored for h in hashes if h == chunk_hash("text from another document", "test-model")
+        }
+
+        total = pipeline.process_document(
+            document, iter(["unchanged text", "text from another document", "brand new text"])
+        )
+
+    assert total == 3
+    pipeline.embedder.embed_array.assert_called_once_with(["brand new text"])
+    _, contents, embeddings = writer.write.call_args.args
+    assert contents == ["text from another document", "brand new text"]
+    np.testing.assert_array_equal(embeddings, np.stack([stored, np.ones(3, dtype=np.float32)]))
+    assert writer.write.call_args.kwargs["ordinals"] == [1, 2]
+    writer.delete_ids.assert_called_once_with(document, [stale])
+    # The kept row moved from position 4 to the front.
+    writer.renumber.assert_called_once_with(document, [(kept, 0)])
+    writer.delete.assert_not_called()
+
+
+def test_process_document_discards_only_its_own_chunks_on_failure(monkeypatch):
+    monkeypatch.setattr(ingestion.settings, "ingest_embed_batch_size", 2, raising=False)
+    db = MagicMock()
+    pipeline = IngestionPipeline(db=db)
+    document = Document(id=uuid.uuid4(), tenant_id=uuid.uuid4(), kb_id=uuid.uuid4(), status="PROCESSING", doc_metadata={})
+    pipeline.embedder = MagicMock()
+    pipeline.embedder.model_name = "test-model"
+    pipeline.embedder.embed_array.side_effect = [np.ones((2, 3), dtype=np.float32), RuntimeError("model crashed")]
+    kept = uuid.uuid4()
+
+    with patch("app.services.ingestion.ChunkWriter") as writer_cls, pytest.raises(RuntimeError):
+        writer = writer_cls.return_value
+        writer.existing.return_value = {chunk_hash("unchanged text", "test-model"): [(kept, 0)]}
+        writer.stored_embeddings.return_value = {}
+        pipeline.process_document(document, iter(["first", "second", "unchanged text", "third"]))
+
+    # Only the committed first batch is removed; the kept row of the last run stays.
+    inserted = writer.write.call_args.kwargs["ids"]
+    assert len(inserted) == 2
+    writer.delete_ids.assert_called_once_with(document, inserted)
+    writer.delete.assert_not_called()
+    db.rollback.assert_called_once()
+    assert document.status == "PROCESSING"
+
+
+def test_open_handles_are_parsed_in_process(monkeypatch):
+    pool = MagicMock()
+    pool.iter_blocks.return_value = iter([{"type": "p", "content": "From the pool"}])
+    monkeypatch.setattr(ingestion, "get_extraction_pool", lambda: pool)
+    pipeline = IngestionPipeline(db=DummyDB())
+    html = b"<html><body><p>Parsed here</p></body></html>"
+
+    assert pipeline._extract_text("page.html", io.BytesIO(html)) == "Parsed here"
+    pool.iter_blocks.assert_not_called()
+    assert pipeline._extract_text("page.html", html) == "From the pool"
+    pool.iter_blocks.assert_called_once_with(".html", html)
@@ -0,0 +1,235 @@
+import asyncio
+import io
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+from sqlalchemy import update
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.api import routes
+from app.core.exceptions import PayloadTooLargeError
+from app.models.entities import Chunk, Document, IngestionJob, KnowledgeBase, Tenant
+from app.schemas.models import URLIngestRequest
+from app.services import job_queue
+from app.services.embeddings import EmbeddingService
+from app.worker import Worker
+
+DIM = 384
+
+
+def _document(session, filename: str = "notes.txt") -> Document:
+    tenant = Tenant(name=f"tenant-{uuid.uuid4()}")
+    session.add(tenant)
+    session.flush()
+    kb = KnowledgeBase(tenant_id=tenant.id, name="kb")
+    session.add(kb)
+    session.flush()
+    document = Document(tenant_id=tenant.id, kb_id=kb.id, filename=filename, status="PROCESSING", doc_metadata={})
+    session.add(document)
+    session.commit()
+    return document
+
+
+def _fake_embeddings(texts):
+    return np.ones((len(list(texts)), DIM), dtype=np.float32)
+
+
+def test_backoff_is_jittered_and_capped(monkeypatch):
+    monkeypatch.setattr(job_queue.settings, "ingest_retry_base_seconds", 5, raising=False)
+    monkeypatch.setattr(job_queue.settings, "ingest_retry_max_seconds", 60, raising=False)
+    assert all(0 <= job_queue.backoff_seconds(1) <= 5 for _ in range(50))
+    assert all(0 <= job_queue.backoff_seconds(10) <= 60 for _ in range(50))
+
+
+class _RecordingReader(io.BytesIO):
+    def __init__(self, data: bytes) -> None:
+        super().__init__(data)
+        self.sizes: list[int] = []
+
+    def read(self, size=-1):
+        self.sizes.append(size)
+        return super().read(size)
+
+
+def test_spool_upload_copies_in_fixed_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue.settings, "ingest_spool_dir", str(tmp_path), raising=False)
+    monkeypatch.setattr(job_queue.settings, "ingest_spool_chunk_bytes", 1024, raising=False)
+    source = _RecordingReader(b"x" * 5000)
+
+    path = job_queue.spool_upload(source, ".txt", max_bytes=10_000)
+
+    assert path.read_bytes() == b"x" * 5000 and path.suffix == ".txt"
+    assert set(source.sizes) == {1024}
+
+
+def test_spool_upload_rejects_oversized_upload(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue.settings, "ingest_spool_dir", str(tmp_path), raising=False)
+    monkeypatch.setattr(job_queue.settings, "ingest_spool_chunk_bytes", 1024, raising=False)
+    source = _RecordingReader(b"x" * 50_000)
+
+    with pytest.raises(PayloadTooLargeError) as exc:
+        job_queue.spool_upload(source, ".txt", max_bytes=4096)
+
+    assert exc.value.status_code == 413
+    assert list(tmp_path.iterdir()) == []
+    # Stopped as soon as the limit was crossed instead of draining the upload.
+    assert len(source.sizes) == 5
+
+
+def test_claim_skips_rows_locked_by_another_worker(pg_session):
+    documents = [_document(pg_session) for _ in range(2)]
+    for document in documents:
+        job_queue.enqueue(pg_session, document, job_queue.KIND_URL)
+    pg_session.commit()
+
+    other, third = Session(pg_session.get_bind()), Session(pg_session.get_bind())
+    try:
+        first = job_queue.claim(pg_session, "worker-a", limit=1)
+        # worker-b holds a row lock on the remaining job; worker-c must skip it rather than wait.
+        locked = other.query(IngestionJob).filter(IngestionJob.status == job_queue.QUEUED).with_for_update().one().id
+        assert job_queue.claim(third, "worker-c", limit=5) == []
+        other.rollback()
+        second = [job.id for job in job_queue.claim(third, "worker-c", limit=5)]
+    finally:
+        other.close()
+        third.close()
+
+    assert len(first) == 1 and first[0].lease_owner == "worker-a" and first[0].attempts == 1
+    assert second == [locked]
+
+
+def test_expired_lease_is_reclaimed_and_heartbeat_rejected(pg_session):
+    document = _document(pg_session)
+    job = job_queue.enqueue(pg_session, document, job_queue.KIND_URL)
+    pg_session.commit()
+
+    [claimed] = job_queue.claim(pg_session, "worker-a")
+    assert job_queue.heartbeat(pg_session, claimed.id, "worker-a")
+    assert job_queue.claim(pg_session, "worker-b") == []
+
+    claimed.lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+    pg_session.commit()
+    [reclaimed] = job_queue.claim(pg_session, "worker-b")
+    assert reclaimed.id == job.id and reclaimed.attempts == 2
+    assert not job_queue.heartbeat(pg_session, job.id, "worker-a")
+
+
+def test_expired_lease_on_the_last_attempt_fails_the_job(pg_session, monkeypatch):
+    monkeypatch.setattr(job_queue.settings, "ingest_max_attempts", 1, raising=False)
+    document = _document(pg_session)
+    job = job_queue.enqueue(pg_session, document, job_queue.KIND_URL)
+    pg_session.commit()
+    [claimed] = job_queue.claim(pg_session, "worker-a")
+
+    claimed.lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+    pg_session.commit()
+    assert job_queue.claim(pg_session, "worker-b") == []
+
+    pg_session.expire_all()
+    job = pg_session.get(IngestionJob, job.id)
+    assert job.status == job_queue.FAILED and job.attempts == 1 and job.lease_owner is None
+    assert "worker-a" in job.last_error
+    assert pg_session.get(Document, document.id).status == "FAILED"
+
+
+def test_purge_deletes_only_old_succeeded_jobs(pg_session, monkeypatch):
+    monkeypatch.setattr(job_queue.settings, "ingest_job_retention_hours", 1, raising=False)
+    document = _document(pg_session)
+    old, recent, failed = (job_queue.enqueue(pg_session, document, job_queue.KIND_URL) for _ in range(3))
+    pg_session.flush()
+    long_ago = datetime.utcnow() - timedelta(hours=2)
+    for job, status in ((old, job_queue.SUCCEEDED), (recent, job_queue.SUCCEEDED), (failed, job_queue.FAILED)):
+        job.status = status
+    pg_session.commit()
+    for job in (old, failed):
+        pg_session.execute(update(IngestionJob).where(IngestionJob.id == job.id).values(updated_at=long_ago))
+    pg_session.commit()
+
+    assert job_queue.purge_finished(pg_session) == 1
+    assert {job.id for job in pg_session.query(IngestionJob)} == {recent.id, failed.id}
+
+
+def test_worker_refreshes_queue_stats_at_most_once_per_interval(monkeypatch):
+    monkeypatch.setattr(job_queue.settings, "ingest_queue_stats_interval_seconds", 3600, raising=False)
+    worker = Worker(concurrency=1, poll_interval=0.01, session_factory=MagicMock())
+    polls = iter(range(3))
+
+    def claim(db, worker_id, limit):
+        if next(polls, None) is None:
+            worker.stop()
+        return []
+
+    with patch.object(job_queue, "claim", side_effect=claim), \
+         patch.object(job_queue, "purge_finished", return_value=0) as purge, \
+         patch.object(job_queue, "queue_stats") as stats:
+        worker.run()
+
+    assert purge.call_count == 1 and stats.call_count == 1
+
+
+def test_failed_attempts_back_off_then_give_up(pg_session, monkeypatch):
+    monkeypatch.setattr(job_queue.settings, "ingest_max_attempts", 2, raising=False)
+    document = _document(pg_session)
+    job_queue.enqueue(pg_session, document, job_queue.KIND_URL)
+    pg_session.commit()
+
+    [job] = job_queue.claim(pg_session, "worker-a")
+    job_queue.fail(pg_session, job, "boom")
+    assert job.status == job_queue.QUEUED and job.run_after >= datetime.utcnow() - timedelta(seconds=1)
+
+    job.run_after = datetime.utcnow() - timedelta(seconds=1)
+    pg_session.commit()
+    [job] = job_queue.claim(pg_session, "worker-a")
+    job_queue.fail(pg_session, job, "boom again")
+    assert job.status == job_queue.FAILED and job.last_error == "boom again"
+    assert job_queue.queue_stats(pg_session)["counts"][job_queue.FAILED] == 1
+
+
+def test_worker_ingests_spooled_upload(pg_session, tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue.settings, "ingest_spool_dir", str(tmp_path), raising=False)
+    document = _document(pg_session)
+    with open(tmp_path / "upload.src", "wb") as source:
+        source.write(" ".join(f"word{i}" for i in range(500)).encode())
+    with open(tmp_path / "upload.src", "rb") as source:
+        spooled = job_queue.spool_upload(source, ".txt")
+    job_queue.enqueue(pg_session, document, job_queue.KIND_FILE, {"path": str(spooled)})
+    pg_session.commit()
+
+    worker = Worker(concurrency=2, poll_interval=0.05, session_factory=sessionmaker(bind=pg_session.get_bind()))
+    with patch.object(EmbeddingService, "embed_array", side_effect=_fake_embeddings):
+        worker.run(once=True)
+
+    pg_session.expire_all()
+    job = pg_session.query(IngestionJob).one()
+    assert job.status == job_queue.SUCCEEDED
+    assert pg_session.get(Document, document.id).status == "READY"
+    assert pg_session.query(Chunk).filter(Chunk.document_id == document.id).count() > 1
+    assert not spooled.exists()
+
+
+def test_worker_requeues_failed_document(pg_session):
+    document = _document(pg_session, filename="notes.xyz")
+    job_queue.enqueue(pg_session, document, job_queue.KIND_FILE, {"path": "/nonexistent/upload.xyz"})
+    pg_session.commit()
+
+    Worker(concurrency=1, poll_interval=0.05, session_factory=sessionmaker(bind=pg_session.get_bind())).run(once=True)
+
+    pg_session.expire_all()
+    job = pg_session.query(IngestionJob).one()
+    assert job.status == job_queue.QUEUED and job.attempts == 1
+    assert "upload.xyz" in job.last_error
+    assert pg_session.get(Document, document.id).status == "PROCESSING"
+
+
+def test_ingest_url_enqueues_instead_of_running_inline(pg_session):
+    document = _document(pg_session)
+    payload = URLIngestRequest(kb_id=str(document.kb_id), url="https://example.com/page")
+
+    created = asyncio.run(routes.ingest_url(payload=payload, db=pg_session, tenant_id=str(document.tenant_id)))
+
+    job = pg_session.query(IngestionJob).filter(IngestionJob.document_id == created.id).one()
+    assert job.kind == job_queue.KIND_URL and job.status == job_queue.QUEUED
+    assert created.status == "PROCESSING"
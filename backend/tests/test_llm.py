@@ -1,3 +1,10 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.services import llm
 from app.services.llm import LLMClient
 
 
@@ -7,3 +14,121 @@ def test_llm_stub_echoes_prompt_snippet(monkeypatch):
     reply = client.generate("Tell me something about context", max_tokens=32)
     assert "[stubbed llm reply]" in reply
     assert "Tell me something" in reply
+
+
+def _mock_openai_server(fail_first: int = 0):
+    """httpx transport that behaves like an OpenAI-compatible /chat/completions endpoint."""
+    calls = {"count": 0}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls["count"] += 1
+        assert request.url.path == "/v1/chat/completions"
+        assert request.headers["authorization"] == "Bearer test-key"
+        if calls["count"] <= fail_first:
+            return httpx.Response(429, headers={"retry-after": "0"}, json={"error": "slow down"})
+        body = json.loads(request.content)
+        if body.get("stream"):
+            chunks = [
+                {"choices": [{"delta": {"role": "assistant"}}]},
+                {"choices": [{"delta": {"content": "Hello"}}]},
+                {"choices": [{"delta": {"content": " world"}}]},
+            ]
+            stream = "".join(f"data: {json.dumps(c)}\n\n" for c in chunks) + "data: [DONE]\n\n"
+            return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=stream.encode())
+        return httpx.Response(200, json={"choices": [{"message": {"content": "Hello world"}}]})
+
+    return httpx.MockTransport(handler), calls
+
+
+@pytest.fixture
+def openai_settings(monkeypatch):
+    client = LLMClient()
+    monkeypatch.setattr(client.settings, "LLM_PROVIDER", "openai")
+    monkeypatch.setattr(client.settings, "LLM_API_KEY", "test-key", raising=False)
+    monkeypatch.setattr(client.settings, "llm_base_url", "http://mock-llm/v1")
+    monkeypatch.setattr(client.settings, "llm_retry_base_seconds", 0)
+    return client.settings
+
+
+def test_agenerate_retries_on_429(openai_settings):
+    transport, calls = _mock_openai_server(fail_first=2)
+
+    async def main():
+        async with httpx.AsyncClient(transport=transport) as http:
+            return await LLMClient(async_client=http).agenerate("question", max_tokens=16)
+
+    assert asyncio.run(main()) == "Hello world"
+    assert calls["count"] == 3
+
+
+def test_generate_sync_uses_shared_client(openai_settings):
+    transport, calls = _mock_openai_server()
+    with httpx.Client(transport=transport) as http:
+        assert LLMClient(sync_client=http).generate("question") == "Hello world"
+    assert calls["count"] == 1
+
+
+def test_astream_yields_deltas(openai_settings):
+    transport, _ = _mock_openai_server(fail_first=1)
+
+    async def main():
+        async with httpx.AsyncClient(transport=transport) as http:
+            return [delta async for delta in LLMClient(async_client=http).astream("question")]
+
+    assert asyncio.run(main()) == ["Hello", " world"]
+
+
+def test_astream_does_not_replay_deltas_after_a_mid_stream_error(openai_settings):
+    calls = {"count": 0}
+
+    async def body():
+        yield f"data: {json.dumps({'choices': [{'delta': {'content': 'Hel'}}]})}\n\n".encode()
+        raise httpx.ReadError("connection reset")
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls["count"] += 1
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=body())
+
+    deltas = []
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            async for delta in LLMClient(async_client=http).astream("question"):
+                deltas.append(delta)
+
+    with pytest.raises(RuntimeError, match="connection reset"):
+        asyncio.run(main())
+    assert deltas == ["Hel"]
+    assert calls["count"] == 1
+
+
+def test_agenerate_gives_up_after_max_retries(openai_settings, monkeypatch):
+    monkeypatch.setattr(openai_settings, "llm_max_retries", 1)
+    transport, calls = _mock_openai_server(fail_first=10)
+
+    async def main():
+        async with httpx.AsyncClient(transport=transport) as http:
+            return await LLMClient(async_client=http).agenerate("question")
+
+    with pytest.raises(RuntimeError, match="429"):
+        asyncio.run(main())
+    assert calls["count"] == 2
+
+
+def test_clients_of_closed_loops_are_evicted_and_closed():
+    async def current():
+        return llm.get_async_client()
+
+    async def replacement():
+        client = llm.get_async_client()
+        await asyncio.sleep(0)  # let the eviction close the old client
+        return client
+
+    try:
+        first = asyncio.run(current())
+        second = asyncio.run(replacement())
+        assert second is not first
+        assert first.is_closed
+        assert list(llm._async_clients.values()) == [second]
+    finally:
+        asyncio.run(llm.close_clients())
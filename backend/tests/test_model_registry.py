@@ -0,0 +1,102 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.deps import get_db
+from app.main import app
+from app.services.embeddings import EmbeddingService
+from app.services.model_registry import ModelRegistry
+
+
+def test_registry_loads_once_under_concurrent_first_use():
+    registry = ModelRegistry()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("embedding", "m", loader))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert len({id(r) for r in results}) == 1
+    stats = registry.stats()[0]
+    assert stats["loaded"] is True
+    assert stats["load_ms"] is not None
+
+
+def test_registry_keys_by_device_and_supports_unload():
+    registry = ModelRegistry()
+    loader = MagicMock(side_effect=lambda: object())
+
+    cpu = registry.get("reranker", "m", loader, device="cpu")
+    gpu = registry.get("reranker", "m", loader, device="cuda")
+    assert cpu is not gpu
+    assert loader.call_count == 2
+
+    assert registry.unload(kind="reranker") == 2
+    assert not registry.is_loaded("reranker", "m", device="cpu")
+    registry.get("reranker", "m", loader, device="cpu")
+    assert loader.call_count == 3
+
+
+def test_registry_retries_after_failed_load():
+    registry = ModelRegistry()
+    loader = MagicMock(side_effect=[RuntimeError("boom"), "model"])
+
+    with pytest.raises(RuntimeError):
+        registry.get("embedding", "m", loader)
+    assert registry.stats()[0]["last_error"] == "boom"
+    assert registry.get("embedding", "m", loader) == "model"
+
+
+def test_embedding_services_share_one_model():
+    registry = ModelRegistry()
+    with patch("app.services.embeddings.model_registry", registry), \
+         patch.object(EmbeddingService, "_load_model", return_value=MagicMock()) as mock_load:
+        first = EmbeddingService().model
+        second = EmbeddingService().model
+
+    assert first is second
+    mock_load.assert_called_once()
+
+
+def test_state_tracks_loading_and_failures_without_loading():
+    registry = ModelRegistry()
+    states = []
+
+    def loader():
+        states.append(registry.state("embedding", "m"))
+        return "model"
+
+    assert registry.state("embedding", "m") == "not_loaded"
+    registry.get("embedding", "m", loader)
+    assert states == ["loading"]
+    assert registry.state("embedding", "m") == "ready"
+
+    with pytest.raises(RuntimeError):
+        registry.get("reranker", "r", MagicMock(side_effect=RuntimeError("boom")))
+    assert registry.state("reranker", "r") == "failed"
+
+
+def test_readiness_reports_model_states_without_loading():
+    session = MagicMock()
+    app.dependency_overrides[get_db] = lambda: session
+    try:
+        with patch("app.api.routes.EmbeddingService.model_state", return_value="ready"), \
+             patch("app.api.routes.RerankingService.model_state", return_value="loading"):
+            resp = TestClient(app).get("/health/ready")
+    finally:
+        app.dependency_overrides.clear()
+    session.execute.assert_called_once()
+    assert resp.status_code == 503
+    assert resp.json() == {"status": "not_ready", "models": {"embedding": "ready", "reranker": "loading"}}
@@ -0,0 +1,125 @@
+import os
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.observability import RECENT_ERROR_LIMIT, LatencySeries, Metrics, QuantileSketch
+
+
+def _error(metrics: Metrics, path: str) -> None:
+    metrics.record_error(method="GET", path=path, status=500, error_code="internal", detail="boom", correlation_id=None)
+
+
+def test_sketch_quantiles_are_within_relative_accuracy():
+    rng = random.Random(0)
+    values = [rng.lognormvariate(3, 1.5) for _ in range(20000)]
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+
+    ordered = sorted(values)
+    for q in (0.5, 0.9, 0.95, 0.99):
+        exact = ordered[int(q * (len(ordered) - 1))]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.011)
+    assert sketch.count == len(values)
+
+
+def test_sketch_memory_does_not_grow_with_observations():
+    sketch = QuantileSketch(max_buckets=64)
+    for i in range(100000):
+        sketch.add(1 + i % 5000)
+
+    assert len(sketch.to_dict()["buckets"]) <= 64
+    # Collapsing folds the low end, so the tail stays accurate.
+    assert sketch.quantile(0.99) == pytest.approx(4950, rel=0.011)
+
+
+def test_sketch_zero_values_and_empty_sketch():
+    sketch = QuantileSketch()
+    assert sketch.quantile(0.95) == 0.0
+
+    for value in (0, 0, 0, 10):
+        sketch.add(value)
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1.0) == pytest.approx(10, rel=0.01)
+
+
+def test_merged_sketches_match_a_single_sketch():
+    left, right, both = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for i in range(1, 1001):
+        (left if i % 2 else right).add(i)
+        both.add(i)
+
+    left.merge(QuantileSketch.from_dict(right.to_dict()))
+
+    assert left.count == both.count
+    assert [left.quantile(q) for q in (0.5, 0.95)] == [both.quantile(q) for q in (0.5, 0.95)]
+    with pytest.raises(ValueError):
+        left.merge(QuantileSketch(relative_accuracy=0.05))
+
+
+def test_snapshot_reports_per_name_series():
+    metrics = Metrics()
+    for value in range(1, 101):
+        metrics.observe_latency("http_total_ms", value)
+    metrics.observe_latency("rag_total_ms", 500)
+    metrics.inc("rag_queries")
+
+    snapshot = metrics.snapshot()
+
+    assert snapshot["counts"] == {"http_total_ms_count": 100, "rag_total_ms_count": 1, "rag_queries": 1}
+    http = snapshot["latency"]["http_total_ms"]
+    assert http["count"] == 100 and http["avg_ms"] == 50.5 and http["max_ms"] == 100
+    assert http["p95_ms"] == pytest.approx(95, rel=0.02)
+    assert snapshot["latency"]["rag_total_ms"]["p50_ms"] == pytest.approx(500, rel=0.01)
+    assert snapshot["latency_avg_ms"] == pytest.approx(5550 / 101)
+    assert "processes" not in snapshot
+
+
+def test_recent_errors_are_a_ring_buffer():
+    metrics = Metrics()
+    for i in range(RECENT_ERROR_LIMIT + 10):
+        _error(metrics, f"/r/{i}")
+
+    errors = metrics.recent_errors()
+
+    assert len(errors) == RECENT_ERROR_LIMIT
+    assert errors[0]["path"] == "/r/10" and errors[-1]["path"] == f"/r/{RECENT_ERROR_LIMIT + 9}"
+    assert metrics.snapshot()["error_recent_count"] == RECENT_ERROR_LIMIT
+
+
+def test_multiprocess_snapshot_combines_flushed_processes(tmp_path):
+    worker = Metrics(multiprocess_dir=str(tmp_path), flush_interval=3600)
+    worker.observe_latency("http_total_ms", 10)
+    worker.inc("rag_queries")
+    _error(worker, "/worker")
+    worker.flush()
+    # Another process' file, as written by its own flush().
+    (tmp_path / "metrics-999999.json").write_text((tmp_path / f"metrics-{os.getpid()}.json").read_text())
+    (tmp_path / "metrics-broken.json").write_text("{")
+
+    snapshot = worker.snapshot()
+
+    assert snapshot["processes"] == 2
+    assert snapshot["counts"]["rag_queries"] == 2
+    assert snapshot["latency"]["http_total_ms"]["count"] == 2
+    assert [error["path"] for error in worker.recent_errors()] == ["/worker", "/worker"]
+
+
+def test_series_round_trip():
+    series = LatencySeries()
+    for value in (1, 2, 3):
+        series.add(value)
+
+    restored = LatencySeries.from_dict(series.to_dict())
+
+    assert restored.summary() == series.summary()
+
+
+def test_settings_include_the_metrics_snapshot():
+    resp = TestClient(app).get("/settings")
+
+    assert resp.status_code == 200
+    assert {"counts", "latency", "latency_p95_ms"} <= set(resp.json()["metrics"])
@@ -0,0 +1,163 @@
+import uuid
+from unittest.mock import MagicMock
+
+from sqlalchemy import event, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from app.db import partitioning, vector_index
+from app.models.entities import Chunk, Document, KnowledgeBase, Tenant
+from app.schemas.models import SearchType
+from app.services.rag import RAGService
+
+DIM = 384
+
+
+def _unit(index: int) -> list[float]:
+    vec = [0.0] * DIM
+    vec[index] = 1.0
+    return vec
+
+
+def test_partition_names_fit_postgres_identifiers():
+    kb_id = uuid.uuid4()
+    name = partitioning.partition_name("kb_id", kb_id)
+    assert name == f"chunks_kb_{kb_id.hex}"
+    assert len(partitioning._child_index_name(vector_index.INDEX_NAME + "_new", name)) <= 63
+
+
+def test_chunk_source_routes_to_list_partition(monkeypatch):
+    monkeypatch.setattr(partitioning.settings, "chunk_partition_strategy", "", raising=False)
+    assert partitioning.chunk_source(MagicMock(), uuid.uuid4(), uuid.uuid4()) is Chunk
+
+    monkeypatch.setattr(partitioning.settings, "chunk_partition_strategy", "list", raising=False)
+    monkeypatch.setattr(partitioning.settings, "chunk_partition_key", "kb_id", raising=False)
+    kb_id = uuid.uuid4()
+    db = MagicMock()
+    db.execute.return_value.scalar.return_value = partitioning.partition_name("kb_id", kb_id)
+    chunks = partitioning.chunk_source(db, uuid.uuid4(), kb_id)
+
+    sql = str(Session().query(chunks).filter(chunks.kb_id == kb_id).statement.compile(dialect=postgresql.dialect()))
+    assert f"FROM {partitioning.partition_name('kb_id', kb_id)}" in sql
+    assert "FROM chunks \n" not in sql
+
+
+def _seed(session) -> list[tuple[uuid.UUID, uuid.UUID]]:
+    scopes = []
+    for t in range(2):
+        tenant = Tenant(name=f"tenant-{t}-{uuid.uuid4()}")
+        session.add(tenant)
+        session.flush()
+        for k in range(2):
+            kb = KnowledgeBase(tenant_id=tenant.id, name=f"kb-{k}")
+            session.add(kb)
+            session.flush()
+            document = Document(tenant_id=tenant.id, kb_id=kb.id, filename="doc.txt", status="READY")
+            session.add(document)
+            session.flush()
+            for i in range(5):
+                content = f"tenant {t} kb {k} paragraph {i} about invoices"
+                session.add(
+                    Chunk(
+                        tenant_id=tenant.id,
+                        kb_id=kb.id,
+                        document_id=document.id,
+                        content=content,
+                        embedding=_unit(i),
+                    )
+                )
+            scopes.append((tenant.id, kb.id))
+    session.commit()
+    return scopes
+
+
+def _scanned_relations(session, statement: str, parameters) -> set[str]:
+    plan = session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+    relations: set[str] = set()
+
+    def walk(node):
+        if "Relation Name" in node:
+            relations.add(node["Relation Name"])
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    return relations
+
+
+def test_list_partitioning_moves_rows_and_routes_queries(pg_session, monkeypatch):
+    scopes = _seed(pg_session)
+    with pg_session.get_bind().begin() as conn:
+        created = partitioning.convert(conn, "list", "kb_id")
+    assert partitioning.DEFAULT_PARTITION in created
+    assert len(created) == len(scopes) + 1
+
+    monkeypatch.setattr(partitioning.settings, "chunk_partition_strategy", "list", raising=False)
+    monkeypatch.setattr(partitioning.settings, "chunk_partition_key", "kb_id", raising=False)
+    tenant_id, kb_id = scopes[1]
+    partition = partitioning.partition_name("kb_id", kb_id)
+    assert pg_session.execute(text(f"SELECT count(*) FROM {partition}")).scalar() == 5
+    assert pg_session.execute(text(f"SELECT count(*) FROM {partitioning.DEFAULT_PARTITION}")).scalar() == 0
+
+    statements: list[str] = []
+    engine = pg_session.get_bind()
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        service = RAGService(pg_session)
+        for search_type in (SearchType.vector, SearchType.hybrid):
+            results = service.search(tenant_id, kb_id, "invoices", 3, search_type, query_vec=_unit(2))
+            assert len(results) == 3
+            assert all(r.content.startswith("tenant 0 kb 1") for r in results)
+        assert service.search(tenant_id, kb_id, "invoices", 3, SearchType.full_text)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    queries = [s for s in statements if "ORDER BY" in s]
+    assert queries and all(partition in s and " chunks " not in s for s in queries)
+
+    # New KBs get their own partition in the same transaction as the KB row.
+    kb = KnowledgeBase(tenant_id=tenant_id, name="fresh")
+    pg_session.add(kb)
+    pg_session.flush()
+    assert partitioning.ensure_partition(pg_session, tenant_id, kb.id) == partitioning.partition_name("kb_id", kb.id)
+    pg_session.commit()
+    assert partitioning.partition_name("kb_id", kb.id) in partitioning.partitions(pg_session.connection())
+    pg_session.close()
+
+    with pg_session.get_bind().begin() as conn:
+        partitioning.revert(conn)
+        assert not partitioning.is_partitioned(conn)
+        assert conn.execute(text("SELECT count(*) FROM chunks")).scalar() == 5 * len(scopes)
+
+
+def test_hash_partitioning_prunes_to_one_partition(pg_session):
+    scopes = _seed(pg_session)
+    with pg_session.get_bind().begin() as conn:
+        created = partitioning.convert(conn, "hash", "tenant_id", hash_partitions=4)
+    assert len(created) == 4
+
+    tenant_id, kb_id = scopes[0]
+    query = pg_session.query(Chunk).filter(Chunk.tenant_id == tenant_id, Chunk.kb_id == kb_id)
+    compiled = query.statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    relations = _scanned_relations(pg_session, str(compiled).replace("%", "%%"), None)
+    assert len(relations) == 1 and relations <= set(created)
+    assert len(query.all()) == 5
+
+
+def test_concurrent_ann_index_on_partitioned_table(pg_session):
+    _seed(pg_session)
+    engine = pg_session.get_bind()
+    with engine.begin() as conn:
+        partitions = partitioning.convert(conn, "hash", "kb_id", hash_partitions=2)
+    pg_session.close()
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        vector_index.drop_index(conn)
+        vector_index.create_index(conn, "hnsw", concurrently=True)
+        status = vector_index.index_status(conn)
+        assert status["valid"]
+        children = conn.execute(
+            text("SELECT count(*) FROM pg_inherits WHERE inhparent = to_regclass(:name)"),
+            {"name": vector_index.INDEX_NAME},
+        ).scalar()
+        assert children == len(partitions)
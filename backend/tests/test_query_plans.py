@@ -0,0 +1,157 @@
+"""EXPLAIN-based regression tests: hot tenant/kb scoped queries must not fall back to sequential scans.
+
+Runs only against Postgres (RAG_TEST_DATABASE_URL); see the pg_session fixture in conftest.py.
+"""
+
+import asyncio
+import json
+import random
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, insert, text
+
+from app.api import routes
+from app.db import vector_index
+from app.models.entities import Chunk, Document, KnowledgeBase, Tenant
+from app.schemas.models import SearchType
+from app.services.rag import RAGService
+
+DIM = 384
+TENANTS = 20
+KBS_PER_TENANT = 3
+DOCS_PER_KB = 6
+CHUNKS_PER_DOC = 10
+
+
+@pytest.fixture
+def seeded(pg_session):
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    tenants, kbs, docs, chunks = [], [], [], []
+    for t in range(TENANTS):
+        tenant_id = uuid.uuid4()
+        tenants.append({"id": tenant_id, "name": f"tenant-{t}", "created_at": now})
+        for k in range(KBS_PER_TENANT):
+            kb_id = uuid.uuid4()
+            kbs.append({"id": kb_id, "tenant_id": tenant_id, "name": f"kb-{k}", "created_at": now})
+            for d in range(DOCS_PER_KB):
+                doc_id = uuid.uuid4()
+                docs.append(
+                    {
+                        "id": doc_id,
+                        "tenant_id": tenant_id,
+                        "kb_id": kb_id,
+                        "filename": f"doc-{d}.txt",
+                        "status": "READY",
+                        "doc_metadata": {"idempotency_key": f"key-{t}-{k}-{d}"},
+                        "created_at": now - timedelta(minutes=d),
+                    }
+                )
+                for c in range(CHUNKS_PER_DOC):
+                    chunks.append(
+                        {
+                            "id": uuid.uuid4(),
+                            "tenant_id": tenant_id,
+                            "kb_id": kb_id,
+                            "document_id": doc_id,
+                            "content": f"chunk {c} about topic {rng.randint(0, 500)}",
+                            "embedding": [rng.random() for _ in range(DIM)],
+                            "created_at": now + timedelta(seconds=c),
+                        }
+                    )
+    pg_session.execute(insert(Tenant), tenants)
+    pg_session.execute(insert(KnowledgeBase), kbs)
+    pg_session.execute(insert(Document), docs)
+    pg_session.execute(insert(Chunk), chunks)
+    pg_session.commit()
+
+    with pg_session.get_bind().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        vector_index.create_index(conn, "hnsw", concurrently=False)
+        conn.execute(text("ANALYZE"))
+
+    target = docs[len(docs) // 2]
+    return pg_session, target
+
+
+def _capture_selects(session, fn):
+    captured: list[tuple[str, object]] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            captured.append((statement, parameters))
+
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return captured
+
+
+def _seq_scans(session, statement: str, parameters) -> list[str]:
+    conn = session.connection()
+    # Test-sized tables are cheap to scan, so let the planner pick a seq scan only when no
+    # index can serve the query at all; that is the regression we care about.
+    conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+    plan = plan if isinstance(plan, list) else json.loads(plan)
+    found: list[str] = []
+
+    def walk(node):
+        if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") in {"chunks", "documents", "knowledge_bases"}:
+            found.append(node["Relation Name"])
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    return found
+
+
+def _assert_no_seq_scans(session, captured):
+    assert captured, "expected the code under test to issue queries"
+    for statement, parameters in captured:
+        assert _seq_scans(session, statement, parameters) == [], statement
+
+
+def test_route_queries_use_indexes(seeded):
+    session, doc = seeded
+    tenant_id, kb_id, doc_id = str(doc["tenant_id"]), str(doc["kb_id"]), str(doc["id"])
+
+    calls = [
+        lambda: asyncio.run(routes.list_kb(db=session, tenant_id=tenant_id)),
+        lambda: asyncio.run(routes.list_documents(kb_id=kb_id, db=session, tenant_id=tenant_id)),
+        lambda: asyncio.run(routes.list_documents(kb_id=None, db=session, tenant_id=tenant_id)),
+        lambda: asyncio.run(routes.list_document_chunks(document_id=doc_id, db=session, tenant_id=tenant_id)),
+    ]
+    for call in calls:
+        _assert_no_seq_scans(session, _capture_selects(session, call))
+
+
+def test_idempotency_lookup_uses_partial_index(seeded):
+    session, doc = seeded
+    query = (
+        session.query(Document)
+        .filter(
+            Document.tenant_id == doc["tenant_id"],
+            Document.kb_id == doc["kb_id"],
+            Document.doc_metadata["idempotency_key"].astext == doc["doc_metadata"]["idempotency_key"],
+        )
+        .order_by(Document.created_at.desc())
+    )
+    _assert_no_seq_scans(session, _capture_selects(session, query.first))
+
+
+@pytest.mark.parametrize("search_type", [SearchType.vector, SearchType.full_text, SearchType.hybrid])
+def test_retrieval_queries_use_indexes(seeded, search_type):
+    session, doc = seeded
+    service = RAGService(session)
+    query_vec = [0.5] * DIM
+
+    captured = _capture_selects(
+        session,
+        lambda: service.search(doc["tenant_id"], doc["kb_id"], "topic", 10, search_type, query_vec=query_vec),
+    )
+    _assert_no_seq_scans(session, captured)
@@ -1,7 +1,9 @@
+import asyncio
 from unittest.mock import MagicMock, patch, PropertyMock
 
 import pytest
 
+from app.services.answer_cache import AnswerCache
 from app.services.rag import RAGService
 from app.services.rerank import RerankingService
 from app.schemas.models import RAGSource, SearchType
@@ -24,6 +26,60 @@ def test_reranking_service_sorts_indices():
         mock_model.return_value.predict.assert_called_once()
 
 
+def test_reranking_service_batches_by_length_and_selects_top_k():
+    reranker = RerankingService()
+    contents = ["a" * 40, "b", "c" * 20, "d" * 5, "e" * 30]
+    batches = []
+
+    def predict(pairs, **kwargs):
+        batches.append([passage for _, passage in pairs])
+        return [float(len(passage)) for _, passage in pairs]
+
+    with patch('app.services.rerank.RerankingService.model', new_callable=PropertyMock) as mock_model, \
+         patch.object(RerankingService, "batch_size", new_callable=PropertyMock, return_value=2):
+        mock_model.return_value.predict.side_effect = predict
+        top = reranker.score_and_sort("q", contents, top_k=2)
+
+    assert [[len(passage) for passage in batch] for batch in batches] == [[1, 5], [20, 30], [40]]
+    assert top == [0, 4]
+
+
+def test_reranking_service_budget_keeps_unscored_in_retrieval_order():
+    reranker = RerankingService()
+    contents = ["long passage three", "x", "long passage one", "y"]
+
+    with patch('app.services.rerank.RerankingService.model', new_callable=PropertyMock) as mock_model, \
+         patch.object(RerankingService, "batch_size", new_callable=PropertyMock, return_value=2), \
+         patch("app.services.rerank.time.perf_counter", side_effect=[0.0, 1.0]):
+        mock_model.return_value.predict.return_value = [0.1, 0.9]
+        order = reranker.score_and_sort("q", contents, budget_ms=100)
+
+    mock_model.return_value.predict.assert_called_once()
+    # The short passages were scored; the long ones keep their retrieval positions.
+    assert order == [0, 3, 2, 1]
+
+
+def test_reranking_budget_scores_in_retrieval_rank_windows():
+    reranker = RerankingService()
+    # Later candidates are shorter; without rank windows they would be scored first.
+    contents = ["p" * (100 - i) for i in range(12)]
+    batches = []
+
+    def predict(pairs, **kwargs):
+        batches.append(len(pairs))
+        return [1.0] * len(pairs)
+
+    with patch('app.services.rerank.RerankingService.model', new_callable=PropertyMock) as mock_model, \
+         patch.object(RerankingService, "batch_size", new_callable=PropertyMock, return_value=1), \
+         patch("app.services.rerank.time.perf_counter", side_effect=[0.0, 0.0, 0.0, 0.0, 1.0]):
+        mock_model.return_value.predict.side_effect = predict
+        order = reranker.score_and_sort("q", contents, budget_ms=100)
+
+    # The first window (ranks 0-3) was scored, shortest first; everything else kept its rank.
+    assert batches == [1, 1, 1, 1]
+    assert order == list(range(12))
+
+
 def test_rag_service_with_rerank():
     """
     Tests that the RAGService calls the reranker and uses its output
@@ -113,3 +169,69 @@ def test_rag_service_without_rerank():
         expected_prompt = f"Answer the question using the context.\n\nContext:\n{expected_context}\n\nQuestion: {query}\nAnswer:"
         mock_llm_generate.assert_called_once_with(expected_prompt, max_tokens=128)
         assert answer == "The answer."
+
+
+def test_rag_service_aanswer_runs_stages_off_loop():
+    """The async path should embed once, pass the vector to search, rerank and call the LLM."""
+    rag_service = RAGService(db=MagicMock())
+    sources = [
+        RAGSource(document_id="doc1", chunk_id="c1", content="content1"),
+        RAGSource(document_id="doc2", chunk_id="c2", content="content2"),
+    ]
+
+    async def fake_embed(text):
+        return [0.1, 0.2]
+
+    with patch.object(rag_service.embedder, "aembed_query", side_effect=fake_embed), \
+         patch.object(rag_service, "search", return_value=sources) as mock_search, \
+         patch.object(rag_service, "rerank", return_value=sources[::-1]) as mock_rerank, \
+         patch.object(rag_service.llm, "agenerate", return_value="async answer") as mock_generate:
+        answer, final_sources = asyncio.run(
+            rag_service.aanswer("t", "kb", "question", top_k=2, use_rerank=True, search_type=SearchType.hybrid)
+        )
+
+    mock_search.assert_called_once_with(
+        "t", "kb", "question", 10, SearchType.hybrid, query_vec=[0.1, 0.2], ef_search=None, probes=None
+    )
+    mock_rerank.assert_called_once_with("question", sources, 2)
+    mock_generate.assert_called_once_with(rag_service._build_prompt("question", sources[::-1]), max_tokens=128)
+    assert answer == "async answer"
+    assert final_sources == sources[::-1]
+
+
+def test_rag_service_astream_answer_emits_sources_then_tokens():
+    rag_service = RAGService(db=MagicMock())
+    sources = [RAGSource(document_id="doc1", chunk_id="c1", content="content1")]
+
+    async def fake_stream(prompt, max_tokens):
+        for delta in ["Hel", "lo"]:
+            yield delta
+
+    async def collect():
+        return [event async for event in rag_service.astream_answer("t", "kb", "q", top_k=1, use_rerank=False)]
+
+    with patch.object(rag_service, "_aretrieve", return_value=sources), \
+         patch.object(rag_service.llm, "astream", side_effect=fake_stream):
+        events = asyncio.run(collect())
+
+    assert events == [("sources", sources), ("token", "Hel"), ("token", "lo")]
+
+
+def test_rag_service_aanswer_serves_cached_answer_for_same_kb_version():
+    rag_service = RAGService(db=MagicMock())
+    sources = [RAGSource(document_id="doc1", chunk_id="c1", content="content1")]
+
+    async def fake_embed(text):
+        return [0.1, 0.2]
+
+    with patch("app.services.rag.get_answer_cache", return_value=AnswerCache()), \
+         patch.object(rag_service.embedder, "aembed_query", side_effect=fake_embed), \
+         patch.object(rag_service, "search", return_value=sources), \
+         patch.object(rag_service, "rerank", return_value=sources), \
+         patch.object(rag_service.llm, "agenerate", return_value="async answer") as mock_generate:
+        first = asyncio.run(rag_service.aanswer("t", "kb", "Question?", top_k=1, kb_version=3))
+        second = asyncio.run(rag_service.aanswer("t", "kb", "question", top_k=1, kb_version=3))
+        third = asyncio.run(rag_service.aanswer("t", "kb", "question", top_k=1, kb_version=4))
+
+    assert first == second == third == ("async answer", sources)
+    assert mock_generate.call_count == 2
@@ -0,0 +1,111 @@
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+from app import main
+from app.models.entities import RateLimitBucket
+from app.services.rate_limit import MemoryRateLimiter, PostgresRateLimiter, RateLimitRule, decide, route_class
+
+
+def test_gcra_allows_a_burst_then_one_request_per_interval():
+    rule = RateLimitRule(limit=60, burst=3)  # one per second, three at once
+    tat, decisions = 0.0, []
+    for now in (100.0, 100.0, 100.0, 100.0, 101.0, 101.0):
+        decision, tat = decide(tat, now, rule)
+        decisions.append((decision.allowed, decision.remaining))
+
+    assert decisions == [(True, 2), (True, 1), (True, 0), (False, 0), (True, 0), (False, 0)]
+    denied, unchanged = decide(tat, 101.25, rule)
+    assert denied.retry_after == pytest.approx(0.75)
+    assert unchanged == tat
+
+
+def test_burst_defaults_to_the_full_limit():
+    rule = RateLimitRule(limit=5)
+    tat = 0.0
+    for _ in range(5):
+        decision, tat = decide(tat, 10.0, rule)
+        assert decision.allowed
+
+    assert not decide(tat, 10.0, rule)[0].allowed
+    assert decide(tat, 22.0, rule)[0].allowed
+
+
+@pytest.mark.parametrize(
+    "path,expected",
+    [
+        ("/rag/query", "query"),
+        ("/rag/query/stream", "query"),
+        ("/ingest", "ingest"),
+        ("/ingest_url", "ingest"),
+        ("/kb", "default"),
+        ("/healthz", None),
+        ("/metrics/summary", None),
+        ("/ui/assets/app.js", None),
+    ],
+)
+def test_route_classes(path, expected):
+    assert route_class(path) == expected
+
+
+def test_memory_limiter_keys_are_independent_and_idle_keys_are_evicted():
+    rule = RateLimitRule(limit=1)
+    with patch("app.services.rate_limit.time.monotonic", return_value=1000.0):
+        limiter = MemoryRateLimiter(max_keys=10, sweep_interval=60)
+        assert limiter.check("query:tenant:a", rule).allowed
+        assert not limiter.check("query:tenant:a", rule).allowed
+        assert limiter.check("query:tenant:b", rule).allowed
+        assert limiter.check("ingest:tenant:a", rule).allowed
+        assert len(limiter) == 3
+
+    # Every bucket has refilled by the next sweep, so no state is left.
+    with patch("app.services.rate_limit.time.monotonic", return_value=2000.0):
+        assert limiter.check("query:tenant:a", rule).allowed
+    assert len(limiter) == 1
+
+
+def test_memory_limiter_is_bounded():
+    limiter = MemoryRateLimiter(max_keys=2)
+    rule = RateLimitRule(limit=10)
+    for key in ("a", "b", "c"):
+        limiter.check(key, rule)
+
+    assert len(limiter) == 2
+
+
+def test_postgres_limiter_is_shared_and_purged(pg_session):
+    factory = sessionmaker(bind=pg_session.get_bind())
+    first = PostgresRateLimiter(factory, purge_interval=0)
+    second = PostgresRateLimiter(factory, purge_interval=0)
+    rule = RateLimitRule(limit=2, period=3600)
+
+    assert first.check("query:tenant:a", rule).remaining == 1
+    assert second.check("query:tenant:a", rule).remaining == 0
+    denied = first.check("query:tenant:a", rule)
+    assert not denied.allowed
+    assert 1700 < denied.retry_after <= 1800
+    assert second.check("query:tenant:b", rule).allowed
+
+    assert first.purge() == 0
+    pg_session.query(RateLimitBucket).filter(RateLimitBucket.key == "query:tenant:b").update({"tat": 0.0})
+    pg_session.commit()
+    assert first.purge() == 1
+    assert [key for (key,) in pg_session.query(RateLimitBucket.key)] == ["query:tenant:a"]
+
+
+def test_rate_limited_requests_get_429_with_retry_after(monkeypatch):
+    client = TestClient(main.app)
+    monkeypatch.setattr(main.settings, "rate_limit_enabled", True, raising=False)
+    monkeypatch.setattr(main.settings, "rate_limit_per_minute", 2, raising=False)
+    monkeypatch.setattr(main.settings, "rate_limit_burst", 0, raising=False)
+    with patch("app.main.get_rate_limiter", return_value=MemoryRateLimiter()):
+        responses = [client.get("/settings") for _ in range(3)]
+        health = client.get("/healthz")
+
+    assert [resp.status_code for resp in responses] == [200, 200, 429]
+    assert [resp.headers["X-RateLimit-Remaining"] for resp in responses] == ["1", "0", "0"]
+    assert responses[2].headers["Retry-After"] == "30"
+    assert responses[2].json()["detail"] == "Rate limit exceeded"
+    assert "X-RateLimit-Limit" not in health.headers
@@ -0,0 +1,88 @@
+import asyncio
+import uuid
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy.orm import sessionmaker
+
+from app.models.entities import KnowledgeBase, RetrievalCacheEntry, Tenant
+from app.schemas.models import RAGSource
+from app.services.rag import RAGService
+from app.services.retrieval_cache import MemoryRetrievalCache, PostgresRetrievalCache, retrieval_key
+
+TENANT = uuid.uuid4()
+KB = uuid.uuid4()
+SOURCES = [
+    RAGSource(document_id="doc1", chunk_id="c1", content="content1", chunk_metadata={"page": 1}),
+    RAGSource(document_id="doc2", chunk_id="c2", content="content2"),
+]
+
+
+def test_key_covers_version_and_search_parameters():
+    key = retrieval_key(TENANT, KB, 1, "refund  policy", "hybrid", 25)
+    assert key == retrieval_key(TENANT, KB, 1, " refund policy", "hybrid", 25)
+    assert key != retrieval_key(TENANT, KB, 2, "refund policy", "hybrid", 25)
+    assert key != retrieval_key(TENANT, KB, 1, "refund policy", "vector", 25)
+    assert key != retrieval_key(TENANT, KB, 1, "refund policy", "hybrid", 25, ef_search=100)
+
+
+def test_memory_cache_expires_and_evicts_least_recently_used():
+    cache = MemoryRetrievalCache(max_entries=2, ttl_seconds=10)
+    with patch("app.services.retrieval_cache.time.monotonic", return_value=100.0):
+        cache.put("a", KB, 1, SOURCES)
+        cache.put("b", KB, 1, SOURCES)
+        assert cache.get("a") == SOURCES
+        cache.put("c", KB, 1, SOURCES)
+        assert cache.get("b") is None
+        assert len(cache) == 2
+
+    with patch("app.services.retrieval_cache.time.monotonic", return_value=111.0):
+        assert cache.get("a") is None
+
+
+def test_aanswer_reuses_cached_candidates_until_kb_version_changes():
+    rag_service = RAGService(db=MagicMock())
+
+    async def fake_embed(text):
+        return [0.1, 0.2]
+
+    with patch("app.services.rag.get_answer_cache", return_value=None), \
+         patch("app.services.rag.get_retrieval_cache", return_value=MemoryRetrievalCache()), \
+         patch.object(rag_service.embedder, "aembed_query", side_effect=fake_embed) as mock_embed, \
+         patch.object(rag_service, "search", return_value=SOURCES) as mock_search, \
+         patch.object(rag_service.llm, "agenerate", return_value="answer"):
+        for version in (1, 1, 2):
+            _, sources = asyncio.run(rag_service.aanswer("t", "kb", "question", top_k=2, use_rerank=False, kb_version=version))
+            assert sources == SOURCES
+
+    assert mock_search.call_count == 2
+    assert mock_embed.call_count == 2
+
+
+def test_postgres_cache_is_shared_and_purges_superseded_rows(pg_session):
+    tenant = Tenant(name=f"tenant-{uuid.uuid4()}")
+    pg_session.add(tenant)
+    pg_session.flush()
+    kb = KnowledgeBase(tenant_id=tenant.id, name="kb", content_version=1)
+    pg_session.add(kb)
+    pg_session.commit()
+    factory = sessionmaker(bind=pg_session.get_bind())
+    writer = PostgresRetrievalCache(factory, purge_interval=0)
+    reader = PostgresRetrievalCache(factory)
+
+    writer.put("v1", kb.id, 1, SOURCES)
+    writer.put("v1", kb.id, 1, SOURCES[:1])
+    assert reader.get("v1") == SOURCES[:1]
+    assert reader.get("missing") is None
+
+    writer.put("v0", kb.id, 0, SOURCES)
+    assert writer.purge() == 1
+    assert pg_session.query(RetrievalCacheEntry.key).all() == [("v1",)]
+
+
+def test_key_covers_the_embedding_backend():
+    with patch("app.services.inference_backends.backend_for", return_value="torch"):
+        torch_key = retrieval_key(TENANT, KB, 1, "refund policy", "vector", 25)
+    with patch("app.services.inference_backends.backend_for", return_value="stub"):
+        stub_key = retrieval_key(TENANT, KB, 1, "refund policy", "vector", 25)
+
+    assert torch_key != stub_key
@@ -1,5 +1,11 @@
 from unittest.mock import MagicMock, patch
+import re
 import uuid
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
 from app.models.entities import Chunk
 
 from app.services.rag import RAGService
@@ -12,13 +18,7 @@ def test_search_with_hybrid_search():
     """
     mock_db = MagicMock()
 
-    with patch('app.services.rag.EmbeddingService'), \
-         patch('app.services.rag.union_all') as mock_union_all, \
-         patch('app.services.rag.Chunk.embedding', new_callable=MagicMock) as mock_embedding:
-        
-        mock_distance = MagicMock()
-        mock_embedding.cosine_distance.return_value = mock_distance
-
+    with patch('app.services.rag.EmbeddingService'):
         rag_service = RAGService(db=mock_db)
 
         tenant_id = "a-tenant"
@@ -33,33 +33,42 @@ def test_search_with_hybrid_search():
             Chunk(id=uuid.uuid4(), document_id=uuid.uuid4(), content="chunk3", chunk_metadata={}),
         ]
 
-        # Mock ranked results
-        ranked_results = [
-            (mock_chunks[0].id, 1),
-            (mock_chunks[1].id, 2),
-            (mock_chunks[2].id, 1),
-            (mock_chunks[0].id, 2),
+        # RRF fusion happens in SQL (see test_hybrid_query_fuses_ranks_in_sql); one round trip.
+        mock_db.query.return_value.join.return_value.order_by.return_value.all.return_value = [
+            (mock_chunks[0], 0.0325),
+            (mock_chunks[2], 0.0164),
         ]
-        
-        # Mock the database queries
-        mock_db.query.return_value.all.return_value = ranked_results
-        mock_db.query.return_value.filter.return_value.all.return_value = mock_chunks
-
-        # Mock the combined query from union_all
-        mock_combined_query = MagicMock()
-        mock_union_all.return_value.alias.return_value = mock_combined_query
 
         results = rag_service.search(tenant_id, kb_id, query, top_k, SearchType.hybrid)
 
-        # Expected RRF scores and order
-        # chunk0: 1/(60+1) + 1/(60+2) = 0.0325
-        # chunk1: 1/(60+2) = 0.0161
-        # chunk2: 1/(60+1) = 0.0164
-        # Expected order: chunk0, chunk2
-
+        assert mock_db.query.call_count == 1
         assert len(results) == top_k
-        assert results[0].chunk_id == str(mock_chunks[0].id)
-        assert results[1].chunk_id == str(mock_chunks[2].id)
+
+
+def test_hybrid_query_fuses_ranks_in_sql(monkeypatch):
+    monkeypatch.setattr(settings, "hybrid_rrf_k", 30, raising=False)
+    monkeypatch.setattr(settings, "hybrid_dense_weight", 2.0, raising=False)
+    monkeypatch.setattr(settings, "hybrid_sparse_weight", 0.5, raising=False)
+    monkeypatch.setattr(settings, "hybrid_candidate_multiplier", 3, raising=False)
+    with patch('app.services.rag.EmbeddingService'):
+        rag_service = RAGService(db=Session())
+
+    statement = rag_service._hybrid_query(uuid.uuid4(), uuid.uuid4(), "answer", 5, [0.1] * 384).statement
+    compiled = statement.compile(dialect=postgresql.dialect())
+    sql = " ".join(str(compiled).split())
+    params = compiled.params
+
+    # Each branch ranks its own top candidates, by distance and by ts_rank_cd.
+    assert "row_number() OVER (ORDER BY dense_candidates.distance) AS rank" in sql
+    assert "row_number() OVER (ORDER BY sparse_candidates.score DESC) AS rank" in sql
+    limits = re.findall(r"LIMIT %\((\w+)\)s", sql)
+    assert [params[name] for name in limits] == [15, 15, 5]
+    # weight / (k + rank) per branch, summed per chunk and ordered by the fused score.
+    terms = re.findall(r"%\((\w+)\)s / CAST\(\(%\((\w+)\)s \+ (dense|sparse)\.rank\) AS NUMERIC\)", sql)
+    assert [(params[weight], params[k], branch) for weight, k, branch in terms] == [(2.0, 30, "dense"), (0.5, 30, "sparse")]
+    assert "UNION ALL" in sql
+    assert "sum(contributions.rrf) AS score FROM" in sql and "GROUP BY contributions.id ORDER BY score DESC" in sql
+    assert sql.endswith("JOIN fused ON chunks.id = fused.id ORDER BY fused.score DESC, chunks.id")
 
 
 def test_search_with_vector_search():
@@ -0,0 +1,154 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app import tracing
+from app.core.executors import BoundedExecutor
+from app.main import app
+from app.schemas.models import RAGSource, SearchType
+from app.services.rag import RAGService
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+
+@pytest.fixture
+def exporter():
+    exporter = tracing.InMemoryExporter(max_traces=10)
+    with patch.object(tracing, "get_exporter", return_value=exporter):
+        yield exporter
+
+
+def test_span_outside_a_trace_is_a_no_op(exporter):
+    with tracing.span("rag.search", stage="search") as span:
+        assert span is None
+
+    assert tracing.stage_timings() == {}
+    assert exporter.recent() == []
+
+
+def test_nested_spans_are_exported_with_stage_totals(exporter):
+    with tracing.start_trace("POST /rag/query") as root:
+        with tracing.span("embedding.query", stage="embedding"):
+            with tracing.span("embedding.embed", stage="embedding"):
+                pass
+        with tracing.span("rag.search", stage="search"):
+            with tracing.span("db.query", stage="sql"):
+                pass
+        timings = tracing.stage_timings()
+
+    [trace] = exporter.recent()
+    by_name = {span["name"]: span for span in trace}
+    assert set(by_name) == {"POST /rag/query", "embedding.query", "embedding.embed", "rag.search", "db.query"}
+    assert {span["trace_id"] for span in trace} == {root.trace_id}
+    assert by_name["db.query"]["parent_id"] == by_name["rag.search"]["span_id"]
+    assert by_name["POST /rag/query"]["parent_id"] is None
+    assert set(timings) == {"embedding", "search", "sql"}
+    # The nested encode is not added to the embedding stage a second time.
+    assert timings["embedding"] == pytest.approx(by_name["embedding.query"]["duration_ms"], abs=1e-3)
+
+
+def test_incoming_traceparent_is_continued():
+    with tracing.start_trace("GET /healthz", traceparent=f"00-{TRACE_ID}-00f067aa0ba902b7-01") as root:
+        pass
+    with tracing.start_trace("GET /healthz", traceparent="garbage") as fresh:
+        pass
+
+    assert root.trace_id == TRACE_ID
+    assert root.parent_id == "00f067aa0ba902b7"
+    assert fresh.trace_id != TRACE_ID and fresh.parent_id is None
+    assert root.traceparent == f"00-{TRACE_ID}-{root.span_id}-01"
+
+
+def test_failed_span_is_marked_as_error(exporter):
+    with pytest.raises(RuntimeError):
+        with tracing.start_trace("POST /rag/query"):
+            with tracing.span("llm.generate", stage="llm"):
+                raise RuntimeError("provider down")
+
+    statuses = {span["name"]: (span["status"], span["attributes"].get("error.type")) for span in exporter.recent()[0]}
+    assert statuses == {"POST /rag/query": ("ERROR", "RuntimeError"), "llm.generate": ("ERROR", "RuntimeError")}
+
+
+def test_spans_follow_work_into_executor_threads(exporter):
+    executor = BoundedExecutor("trace-test", max_workers=1)
+
+    def work():
+        with tracing.span("rag.search", stage="search"):
+            pass
+
+    async def main():
+        with tracing.start_trace("POST /rag/query"):
+            await executor.run(work)
+            return tracing.stage_timings()
+
+    timings = asyncio.run(main())
+    executor.shutdown()
+
+    assert "search" in timings
+    assert [span["name"] for span in exporter.recent()[0]] == ["POST /rag/query", "rag.search"]
+
+
+def test_sqlalchemy_statements_are_recorded_inside_traces(exporter):
+    engine = create_engine("sqlite://")
+    tracing.instrument_engine(engine)
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))  # untraced
+        with tracing.start_trace("job"):
+            conn.execute(text("SELECT  2"))
+
+    [trace] = exporter.recent()
+    [query] = [span for span in trace if span["name"] == "db.query"]
+    assert query["stage"] == "sql"
+    assert query["attributes"] == {"db.system": "sqlite", "db.statement": "SELECT 2"}
+
+
+def test_aanswer_reports_stage_timings(exporter):
+    rag_service = RAGService(db=MagicMock())
+    rag_service.llm.settings = MagicMock(LLM_PROVIDER="stub")
+    sources = [RAGSource(document_id="doc1", chunk_id="c1", content="content1")]
+
+    async def fake_embed(text):
+        return [0.1, 0.2]
+
+    async def main():
+        with tracing.span("rag.query", root=True):
+            await rag_service.aanswer("t", "kb", "question", top_k=1, use_rerank=False, search_type=SearchType.vector)
+            return tracing.stage_timings()
+
+    with patch.object(rag_service.embedder, "aembed_query", side_effect=fake_embed), \
+         patch.object(rag_service, "_vector_search", return_value=sources), \
+         patch("app.services.rag.apply_search_params"):
+        timings = asyncio.run(main())
+
+    assert {"search", "prompt", "llm"} <= set(timings)
+    names = [span["name"] for span in exporter.recent()[0]]
+    assert {"rag.query", "rag.answer", "rag.search", "rag.prompt", "llm.generate"} <= set(names)
+
+
+def test_otlp_payload_uses_the_json_encoding():
+    with patch.object(tracing, "get_exporter", return_value=None):
+        with tracing.start_trace("POST /rag/query", traceparent=f"00-{TRACE_ID}-00f067aa0ba902b7-01") as root:
+            with tracing.span("rag.rerank", stage="rerank", candidates=25):
+                pass
+
+    payload = tracing.otlp_payload(root.trace.spans, service_name="rag-test")
+    [resource_spans] = payload["resourceSpans"]
+    assert resource_spans["resource"]["attributes"] == [{"key": "service.name", "value": {"stringValue": "rag-test"}}]
+    rerank, request = resource_spans["scopeSpans"][0]["spans"]
+    assert request["kind"] == 2 and request["parentSpanId"] == "00f067aa0ba902b7"
+    assert rerank["kind"] == 1 and rerank["parentSpanId"] == root.span_id and rerank["traceId"] == TRACE_ID
+    assert {"key": "candidates", "value": {"intValue": "25"}} in rerank["attributes"]
+    assert {"key": "rag.stage", "value": {"stringValue": "rerank"}} in rerank["attributes"]
+    assert int(rerank["endTimeUnixNano"]) >= int(rerank["startTimeUnixNano"])
+    assert rerank["status"] == {"code": 1}
+
+
+def test_responses_carry_a_traceparent_continuing_the_caller_trace():
+    resp = TestClient(app).get("/healthz", headers={"traceparent": f"00-{TRACE_ID}-00f067aa0ba902b7-01"})
+
+    assert resp.headers["traceparent"].startswith(f"00-{TRACE_ID}-")
+    assert not resp.headers["traceparent"].endswith("00f067aa0ba902b7-01")
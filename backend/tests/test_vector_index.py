@@ -0,0 +1,56 @@
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.db import vector_index
+from app.models.entities import Chunk
+
+
+def test_operator_class_follows_normalization(monkeypatch):
+    monkeypatch.setattr(vector_index.settings, "normalize_embeddings", True)
+    assert vector_index.operator_class() == "vector_ip_ops"
+    expr = vector_index.embedding_distance(Chunk.embedding, [0.1, 0.2])
+    assert "<#>" in str(expr.compile(dialect=postgresql.dialect()))
+
+    monkeypatch.setattr(vector_index.settings, "normalize_embeddings", False)
+    assert vector_index.operator_class() == "vector_cosine_ops"
+    expr = vector_index.embedding_distance(Chunk.embedding, [0.1, 0.2])
+    assert "<=>" in str(expr.compile(dialect=postgresql.dialect()))
+
+
+def test_index_ddl_variants(monkeypatch):
+    monkeypatch.setattr(vector_index.settings, "normalize_embeddings", True)
+    hnsw = vector_index.index_ddl("hnsw", concurrently=True, m=24, ef_construction=100)
+    assert hnsw == (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chunks_embedding_ann ON chunks "
+        "USING hnsw (embedding vector_ip_ops) WITH (m = 24, ef_construction = 100)"
+    )
+    ivf = vector_index.index_ddl("ivfflat", lists=500)
+    assert "USING ivfflat" in ivf and "lists = 500" in ivf and "CONCURRENTLY" not in ivf
+    with pytest.raises(ValueError):
+        vector_index.index_ddl("flat")
+
+
+def test_suggested_ivfflat_lists():
+    assert vector_index.suggested_ivfflat_lists(500) == 1
+    assert vector_index.suggested_ivfflat_lists(200_000) == 200
+    assert vector_index.suggested_ivfflat_lists(4_000_000) == 2000
+
+
+def test_apply_search_params_is_transaction_local(monkeypatch):
+    monkeypatch.setattr(vector_index.settings, "hnsw_ef_search", 0)
+    monkeypatch.setattr(vector_index.settings, "ivfflat_probes", 0)
+    monkeypatch.setattr(vector_index.settings, "hnsw_iterative_scan", "")
+    db = MagicMock()
+
+    vector_index.apply_search_params(db)
+    db.execute.assert_not_called()
+
+    vector_index.apply_search_params(db, ef_search=80, probes=10)
+    statements = [str(call.args[0]) for call in db.execute.call_args_list]
+    assert statements == [
+        "SELECT set_config('hnsw.ef_search', :value, true)",
+        "SELECT set_config('ivfflat.probes', :value, true)",
+    ]
+    assert db.execute.call_args_list[0].args[1] == {"value": "80"}